@@ -2,19 +2,21 @@ from __future__ import annotations
 
 import os
 import json
-import time
+import secrets
 from pathlib import Path
 
 import streamlit as st
 from dotenv import load_dotenv
 
-from core.orchestrator import run_pipeline
-from core.executor import execute_commands
+from core.executor import reverify_episode
 from core.schemas import Patch
-from core.memory import init_db, save_episode
-from core.metrics import compute_sfc
-
-load_dotenv()
+from core.memory import init_db, query_episodes, get_store
+from core.cache import get_cache
+from core.jobs import DONE, QUEUED, get_job_manager, load_result
+from core.replay import get_replay_index
+from core.monitoring import get_monitor
+from core.tracing import stage_summary, to_chrome_trace
+from health_dashboard import compute_health_scores
 
 st.set_page_config(page_title="Matrix Assistant", page_icon="🟢", layout="wide")
 
@@ -111,6 +113,32 @@ draw();
 """
 
 
+# -----------------------------
+# Recursos do processo (cacheados: não rodam de novo a cada rerun do script)
+# -----------------------------
+@st.cache_resource(show_spinner=False)
+def _load_env() -> bool:
+    # .env lido uma vez por processo (alterou o .env? reinicie o app)
+    return load_dotenv()
+
+
+@st.cache_resource(show_spinner=False)
+def _init_workspace(workspace_root: str) -> str:
+    # makedirs + schema/migrações do DB uma vez por workspace; devolve o caminho do DB
+    os.makedirs(workspace_root, exist_ok=True)
+    db_path = os.path.join(workspace_root, "matrix_assistant.db")
+    init_db(db_path)
+    return db_path
+
+
+# resultados guardados na sessão; os mais antigos saem da memória e vão para o DB
+SESSION_HISTORY_MAX = 8
+# jobs acompanhados pela sessão (também na URL: ?jobs=id1,id2 — recarregar a página reconecta)
+SESSION_JOBS_MAX = 10
+# o Streamlit reexecuta o script a cada clique: o painel de saúde relê episódios novos no máximo a cada N s
+HEALTH_REFRESH_S = 30.0
+
+
 # -----------------------------
 # Util: carregar assets do modo ARGente (sem quebrar se não existirem)
 # -----------------------------
@@ -123,18 +151,22 @@ def _read_text_if_exists(path: Path) -> str | None:
     return None
 
 
+@st.cache_data(show_spinner=False)
+def _argente_assets() -> tuple[str | None, str | None]:
+    base = Path(__file__).parent / "ui_modes" / "argente"
+    return _read_text_if_exists(base / "argente.css"), _read_text_if_exists(base / "argente.html")
+
+
 def apply_argente_assets(enabled: bool) -> None:
     """
-    Se enabled=True, tenta carregar:
+    Se enabled=True, tenta carregar (lidos do disco uma vez, depois vêm do cache):
       ui_modes/argente/argente.css  (injetado via st.markdown)
       ui_modes/argente/argente.html (injetado via st.components.v1.html)
     """
     if not enabled:
         return
 
-    base = Path(__file__).parent / "ui_modes" / "argente"
-    css = _read_text_if_exists(base / "argente.css")
-    html = _read_text_if_exists(base / "argente.html")
+    css, html = _argente_assets()
 
     if css:
         st.markdown(f"<style>\n{css}\n</style>", unsafe_allow_html=True)
@@ -144,9 +176,290 @@ def apply_argente_assets(enabled: bool) -> None:
         st.components.v1.html(html, height=0)
 
 
+# -----------------------------
+# Util: resultados da sessão
+# -----------------------------
+def _commands_md(cmds, prefix: str = "") -> str:
+    return "\n".join(
+        f"- **[{prefix}{c.step_index}]** `{c.cmd}`\n"
+        f"  WHY: {c.why}\n"
+        f"  EXPECTS: `{c.expects_cmd}`"
+        for c in cmds
+    )
+
+
+def _result_view(result: dict) -> dict:
+    """
+    Tudo que a tela deriva do resultado, calculado uma vez quando ele chega
+    (não a cada rerun): JSONs formatados, Patch validado e a prévia dos comandos.
+    """
+    view = {
+        "plan_json": json.dumps(result["plan"], ensure_ascii=False, indent=2),
+        "patch_json": json.dumps(result["patch"], ensure_ascii=False, indent=2),
+        "audit_json": json.dumps(result["audit"], ensure_ascii=False, indent=2),
+        "cmds_user": [],
+        "cmds_sudo": [],
+    }
+    if not result["audit"]["blocked"]:
+        patch_obj = Patch.model_validate(result["patch"])
+        view["cmds_user"] = [
+            c
+            for c in patch_obj.commands
+            if c.privilege == "user" and not c.cmd.strip().startswith("sudo")
+        ]
+        view["cmds_sudo"] = [
+            c
+            for c in patch_obj.commands
+            if c.privilege == "sudo" or c.cmd.strip().startswith("sudo")
+        ]
+    view["preview_user_md"] = _commands_md(view["cmds_user"])
+    view["preview_sudo_md"] = _commands_md(view["cmds_sudo"], "S")
+    return view
+
+
+def _episode_data(entry: dict, **extra) -> dict:
+    result = entry["result"]
+    return {
+        "user_input": entry["user_input"],
+        "plan": result["plan"],
+        "patch": result["patch"],
+        "audit": result["audit"],
+        "model_used": result.get("model_used"),
+        "metrics": result["metrics"],
+        "trace": result.get("trace"),
+        "llm_calls": result.get("llm_calls"),
+        **extra,
+    }
+
+
+def _trace_panel(trace: dict, key: str) -> None:
+    with st.expander("Tempo por etapa (trace)"):
+        st.dataframe(
+            [{"etapa": name, **stats} for name, stats in stage_summary([trace]).items()],
+            use_container_width=True,
+        )
+        st.download_button(
+            "Baixar trace (Chrome/Perfetto)",
+            json.dumps(to_chrome_trace(trace), ensure_ascii=False),
+            file_name=f"trace_{key}.json",
+            mime="application/json",
+            key=f"trace_dl_{key}",
+        )
+
+
+def _remember_result(db_path: str, user_input: str, result: dict) -> dict:
+    """
+    Guarda o resultado no histórico da sessão (limitado a SESSION_HISTORY_MAX).
+    Os que saem e ainda não viraram episódio (nem executados nem bloqueados) são
+    gravados no DB em segundo plano: continuam no "Histórico de episódios".
+    """
+    entry = {
+        # fixa durante a vida da entrada (episode_id só chega depois de executar): base das keys dos widgets
+        "key": secrets.token_hex(4),
+        "user_input": user_input,
+        "result": result,
+        "view": _result_view(result),
+        "episode_id": None,
+        "exec": None,
+        "exec_job": None,
+        "exec_result": None,
+    }
+    history = st.session_state.history
+    history.append(entry)
+    while len(history) > SESSION_HISTORY_MAX:
+        old = history.pop(0)
+        if old["episode_id"] is None:
+            get_store(db_path).save_async(_episode_data(old))
+    return entry
+
+
+def _track_job(job_id: str) -> None:
+    jobs = st.session_state.jobs
+    jobs.append(job_id)
+    del jobs[:-SESSION_JOBS_MAX]
+    st.query_params["jobs"] = ",".join(jobs)
+
+
+def _collect_jobs(db_path: str) -> None:
+    """Traz para a sessão (uma vez cada) o resultado dos jobs acompanhados que terminaram."""
+    manager = get_job_manager(db_path)
+    seen = st.session_state.jobs_seen
+    for job_id in st.session_state.jobs:
+        job = None if job_id in seen else manager.get(job_id)
+        if job is None or job.active:
+            continue
+        seen.add(job_id)
+        if job.status != DONE:
+            continue  # falhas/cancelamentos continuam visíveis no painel de jobs
+        # job de outro processo: o DB só tem o resumo, o resto vem do episódio
+        result = load_result(get_store(db_path), job)
+        if result is None:
+            st.warning(f"Resultado de '{job.title[:80]}' não está mais disponível (gere de novo).")
+            continue
+        if job.kind == "pipeline":
+            entry = _remember_result(db_path, job.title, result)
+            entry["episode_id"] = result.get("episode_id")
+        elif job.kind == "exec":
+            for entry in st.session_state.history:
+                if entry["exec_job"] == job_id:
+                    entry["exec_result"] = result
+                    entry["exec_json"] = json.dumps(result["exec"], ensure_ascii=False, indent=2)
+                    entry["exec"] = result["exec"]
+                    entry["episode_id"] = result["episode_id"]
+
+
+def _render_jobs(db_path: str) -> None:
+    """Progresso/saída parcial dos jobs em andamento e erros dos que falharam."""
+    manager = get_job_manager(db_path)
+    for job_id in reversed(st.session_state.jobs):
+        job = manager.get(job_id)
+        if job is None or job.status == DONE:
+            continue
+        name = "PLANO + PATCH" if job.kind == "pipeline" else "Execução"
+        if not job.active:
+            st.error(f"{name} — {job.title[:80]}: {job.status}. {job.error or ''}")
+            continue
+        st.progress(job.progress, text=f"{name} — {job.title[:80]} ({job.stage or job.status})")
+        for stage in ("plan", "patch"):
+            if job.partial.get(stage):
+                st.code(job.partial[stage], language="json")
+        if job.partial.get("tail"):
+            st.code("\n".join(job.partial["tail"]), language="text")
+        # comandos em andamento não são interrompidos: execução só cancela na fila
+        if (job.kind == "pipeline" or job.status == QUEUED) and st.button("Cancelar", key=f"cancel_{job.id}"):
+            manager.cancel(job.id)
+
+
+@st.fragment(run_every=1.0)
+def jobs_poller(db_path: str) -> None:
+    # só este painel reexecuta a cada segundo; quando um job termina, um rerun completo mostra o resultado
+    _render_jobs(db_path)
+    manager = get_job_manager(db_path)
+    for job_id in st.session_state.jobs:
+        job = None if job_id in st.session_state.jobs_seen else manager.get(job_id)
+        if job is not None and not job.active:
+            st.rerun()
+
+
+@st.fragment
+def execution_panel(entry: dict, db_path: str, allow_sudo_exec: bool, verify_mode: str) -> None:
+    """
+    Autorização + execução. É um fragmento: marcar caixas e digitar as frases de
+    confirmação reexecuta só este painel, não o app inteiro. A execução em si é um job.
+    """
+    cmds_user = entry["view"]["cmds_user"]
+    cmds_sudo = entry["view"]["cmds_sudo"]
+    # cada entrada do histórico tem seus próprios widgets (sem isso o Streamlit reaproveita o estado entre elas)
+    k = entry.setdefault("key", secrets.token_hex(4))
+
+    st.subheader("Autorizar execução")
+    approve_user = st.checkbox("Aprovar comandos SEM sudo", value=True, key=f"approve_user_{k}")
+    approve_sudo = st.checkbox("Aprovar comandos COM sudo (exige auditoria e confirmação)", value=False,
+                               key=f"approve_sudo_{k}")
+
+    confirm = st.text_input("Confirmação (digite exatamente): EXECUTAR", value="", key=f"confirm_{k}")
+    sudo_phrase = st.text_input("Se aprovar sudo, digite exatamente: AUTORIZO_SUDO", value="", key=f"sudo_phrase_{k}")
+
+    exec_job = get_job_manager(db_path).get(entry["exec_job"]) if entry["exec_job"] else None
+    running = exec_job is not None and exec_job.active
+    if running:
+        st.caption("Execução em andamento (progresso e saída ao vivo acima).")
+
+    if st.button("Executar agora", disabled=running, key=f"execute_{k}"):
+        if confirm.strip() != "EXECUTAR":
+            st.error("Confirmação inválida. Digite EXECUTAR.")
+        elif not approve_user and not approve_sudo:
+            st.error("Nenhuma execução aprovada.")
+        elif approve_sudo and sudo_phrase.strip() != "AUTORIZO_SUDO":
+            st.error("SUDO não autorizado. Digite AUTORIZO_SUDO.")
+        else:
+            to_run = []
+            if approve_user:
+                to_run.extend(cmds_user)
+            if approve_sudo:
+                to_run.extend(cmds_sudo)
+
+            # roda em segundo plano: a sessão não congela e a execução sobrevive a reruns/recarregar
+            entry["exec_job"] = get_job_manager(db_path).submit_execution(
+                db_path,
+                to_run,
+                cwd=os.getcwd(),
+                episode=_episode_data(entry, had_sudo=bool(cmds_sudo)),
+                allow_sudo_exec=allow_sudo_exec,
+                verify=verify_mode,
+            )
+            _track_job(entry["exec_job"])
+            st.rerun()
+
+    done = entry["exec_result"]
+    if done:
+        st.subheader("Resultados")
+        st.code(entry["exec_json"], language="json")
+        st.markdown(
+            '<div class="matrix-hud">'
+            f'<span class="matrix-badge">SUCCESS={done["success"]}</span>'
+            f'<span class="matrix-badge">SFC={done["sfc"]:.2f}</span>'
+            "</div>",
+            unsafe_allow_html=True,
+        )
+        st.success(f"Episódio salvo no DB. id={done['episode_id']}")
+
+    trace = (done or {}).get("trace") or entry["result"].get("trace")
+    if trace:
+        _trace_panel(trace, str(entry["episode_id"] or id(entry)))
+
+    if entry["exec"]:
+        if st.button("Re-verificar expects (lote, sem reexecutar comandos)", key=f"reverify_{k}"):
+            with st.spinner("Verificando..."):
+                checks = reverify_episode(entry["exec"], cwd=os.getcwd())
+            st.code(
+                json.dumps([v.__dict__ for v in checks], ensure_ascii=False, indent=2),
+                language="json",
+            )
+
+
+@st.fragment
+def history_panel(db_path: str) -> None:
+    # fragmento: filtros e paginação não reexecutam o app inteiro
+    hcol1, hcol2, hcol3 = st.columns([2, 1, 1])
+    with hcol1:
+        hist_text = st.text_input("Buscar no objetivo/notas", key="hist_text")
+    with hcol2:
+        hist_model = st.text_input("Modelo", key="hist_model")
+    with hcol3:
+        hist_status = st.selectbox("Status", ["todos", "sucesso", "falha"], key="hist_status")
+    hist_filters = {
+        "text": hist_text or None,
+        "model_used": hist_model.strip() or None,
+        "success": {"todos": None, "sucesso": True, "falha": False}[hist_status],
+    }
+    # paginação por chave: a página atual começa antes do id guardado
+    if st.session_state.get("hist_filters") != hist_filters:
+        st.session_state.hist_filters = hist_filters
+        st.session_state.hist_before = None
+    rows = query_episodes(db_path, limit=20, before_id=st.session_state.get("hist_before"), **hist_filters)
+    if rows:
+        st.dataframe(rows, use_container_width=True)
+    else:
+        st.caption("Nenhum episódio encontrado.")
+    pcol1, pcol2 = st.columns([1, 1])
+    with pcol1:
+        if st.session_state.get("hist_before") and st.button("Mais recentes"):
+            st.session_state.hist_before = None
+            st.rerun(scope="fragment")
+    with pcol2:
+        if len(rows) == 20 and st.button("Mais antigos"):
+            st.session_state.hist_before = rows[-1]["id"]
+            st.rerun(scope="fragment")
+
+
 # -----------------------------
 # App
 # -----------------------------
+_load_env()
+
+# CSS e canvas sempre no mesmo lugar: num rerun completo o frontend reaproveita o iframe;
+# nos reruns de fragmento (as interações frequentes) eles nem são reenviados
 st.markdown(MATRIX_CSS, unsafe_allow_html=True)
 st.components.v1.html(MATRIX_CANVAS, height=0)
 
@@ -171,8 +484,35 @@ with st.sidebar:
         value=os.getenv("ALLOW_SUDO_EXEC", "0") == "1",
     )
 
-    db_path = os.path.join(workspace_root, "matrix_assistant.db")
+    # streaming: mostra PLANO/PATCH token a token (o botão Stop do Streamlit cancela a geração)
+    stream_mode = st.checkbox("Streaming (mostrar geração ao vivo)", value=True)
+
+    # cache de respostas do LLM (mesmo objetivo/modelo/schema => sem nova chamada)
+    use_cache = st.checkbox("Cache de respostas LLM", value=os.getenv("LLM_CACHE", "1") == "1")
+    bypass_cache = st.checkbox("Ignorar cache nesta geração (forçar nova chamada)", value=False)
+    # objetivo parecido com um episódio bem-sucedido: reaproveita PLANO+PATCH (reauditado) sem LLM
+    use_replay = st.checkbox("Reusar episódios bem-sucedidos (replay)", value=os.getenv("LLM_REPLAY", "1") == "1")
+
+    # expects logo após cada passo, ou uma passada final em lote (menos processos)
+    verify_mode = st.selectbox("Verificação (expects)", ["inline", "deferred"], index=0)
+
+    # init db (uma vez por workspace)
+    db_path = _init_workspace(workspace_root)
     st.caption(f"DB: {db_path}")
+    cache_path = os.path.join(workspace_root, "llm_cache.db")
+    if use_cache:
+        cs = get_cache(cache_path).stats()
+        st.caption(f"Cache LLM: hits={cs['hits']} misses={cs['misses']} entradas={cs['entries']}")
+
+    # amostrador em background (um por processo): ler o snapshot não bloqueia o rerun
+    monitor = get_monitor()
+    snap = monitor.snapshot()
+    if snap:
+        agg = monitor.aggregate(60)
+        st.caption(
+            f"Sistema: CPU {snap['cpu']:.0f}% (p95 1min {agg['cpu']['p95']:.0f}%) · "
+            f"RAM {snap['mem']:.0f}% · load {snap['load1']:.2f} · saúde {monitor.compute_health_score():.0f}"
+        )
 
 # aplica assets do ARGente (se existir)
 apply_argente_assets(argente_mode)
@@ -186,12 +526,12 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-# init db
-os.makedirs(workspace_root, exist_ok=True)
-init_db(db_path)
-
 if "history" not in st.session_state:
     st.session_state.history = []
+if "jobs" not in st.session_state:
+    # sessão nova (ou página recarregada): reconecta aos jobs listados na URL
+    st.session_state.jobs = [j for j in st.query_params.get("jobs", "").split(",") if j]
+    st.session_state.jobs_seen = set()
 
 objective = st.text_input(
     "O que você quer fazer no Ubuntu/Python?",
@@ -210,12 +550,39 @@ if run_btn:
     elif not objective.strip():
         st.error("Digite um objetivo.")
     else:
-        with st.spinner("Gerando PLANO + PATCH via API..."):
-            result = run_pipeline(base_url, api_key, model, objective.strip(), workspace_root)
-        st.session_state.last = result
-
-if "last" in st.session_state:
-    last = st.session_state.last
+        cache = get_cache(cache_path) if use_cache else None
+        replay = get_replay_index(db_path) if use_replay and not bypass_cache else None
+        # em segundo plano: vários objetivos em paralelo, e a geração sobrevive a reruns/recarregar
+        job_id = get_job_manager(db_path).submit_pipeline(
+            db_path, base_url, api_key, model, objective.strip(), workspace_root,
+            stream=stream_mode, cache=cache, bypass_cache=bypass_cache, replay=replay,
+        )
+        _track_job(job_id)
+
+_collect_jobs(db_path)
+if st.session_state.jobs:
+    with st.container():
+        manager = get_job_manager(db_path)
+        if any(job is not None and job.active for job in map(manager.get, st.session_state.jobs)):
+            jobs_poller(db_path)
+        else:
+            _render_jobs(db_path)
+
+if st.session_state.history:
+    history = st.session_state.history
+    # o mais recente primeiro; um resultado novo volta a seleção para ele
+    pick = st.selectbox(
+        "Resultado da sessão",
+        list(range(len(history) - 1, -1, -1)),
+        format_func=lambda i: f"{i + 1}. {history[i]['user_input'][:80]}",
+    ) if len(history) > 1 else 0
+    entry = history[pick]
+    last = entry["result"]
+    view = entry["view"]
+    if last.get("replayed_from"):
+        rf = last["replayed_from"]
+        st.info(f"Replay do episódio {rf['episode_id']} (similaridade {rf['score']:.2f}): \"{rf['user_input']}\". "
+                "Marque 'Ignorar cache' para forçar o LLM.")
     st.subheader("HUD")
 
     m = last["metrics"]
@@ -232,115 +599,66 @@ if "last" in st.session_state:
         "</div>",
         unsafe_allow_html=True,
     )
+    usage = last.get("usage") or {}
+    if usage.get("calls"):
+        st.caption(
+            f"LLM: {usage['calls']} chamadas ({usage['cache_hits']} do cache) · "
+            f"tokens {usage['prompt_tokens']} prompt + {usage['completion_tokens']} resposta · "
+            f"{usage['bytes_sent'] / 1024:.1f} KiB enviados / {usage['bytes_received'] / 1024:.1f} KiB recebidos · "
+            f"{usage['latency_s']:.2f} s"
+        )
 
     st.markdown("### PLANO (JSON)")
-    st.code(json.dumps(last["plan"], ensure_ascii=False, indent=2), language="json")
+    st.code(view["plan_json"], language="json")
 
     st.markdown("### PATCH (JSON)")
-    st.code(json.dumps(last["patch"], ensure_ascii=False, indent=2), language="json")
+    st.code(view["patch_json"], language="json")
 
     st.markdown("### Análise de Segurança (Gate)")
-    st.code(json.dumps(audit, ensure_ascii=False, indent=2), language="json")
+    st.code(view["audit_json"], language="json")
 
     if audit["blocked"]:
         st.error("Execução bloqueada pelo gate. Ajuste o objetivo/prompt e gere novamente.")
     else:
-        patch_obj = Patch.model_validate(last["patch"])
-
-        cmds_user = [
-            c
-            for c in patch_obj.commands
-            if c.privilege == "user" and not c.cmd.strip().startswith("sudo")
-        ]
-        cmds_sudo = [
-            c
-            for c in patch_obj.commands
-            if c.privilege == "sudo" or c.cmd.strip().startswith("sudo")
-        ]
-
         st.markdown("### Prévia de Execução (NÃO executado ainda)")
 
         st.write("**Comandos (user)**")
-        for c in cmds_user:
-            st.markdown(
-                f"- **[{c.step_index}]** `{c.cmd}`\n"
-                f"  WHY: {c.why}\n"
-                f"  EXPECTS: `{c.expects_cmd}`"
-            )
+        if view["preview_user_md"]:
+            st.markdown(view["preview_user_md"])
 
-        if cmds_sudo:
+        if view["cmds_sudo"]:
             st.warning("**Comandos com SUDO detectados — auditoria obrigatória**")
-            for c in cmds_sudo:
-                st.markdown(
-                    f"- **[S{c.step_index}]** `{c.cmd}`\n"
-                    f"  WHY: {c.why}\n"
-                    f"  EXPECTS: `{c.expects_cmd}`"
-                )
+            st.markdown(view["preview_sudo_md"])
 
         st.markdown('<div class="matrix-sep"></div>', unsafe_allow_html=True)
 
-        st.subheader("Autorizar execução")
-        approve_user = st.checkbox("Aprovar comandos SEM sudo", value=True)
-        approve_sudo = st.checkbox("Aprovar comandos COM sudo (exige auditoria e confirmação)", value=False)
-
-        confirm = st.text_input("Confirmação (digite exatamente): EXECUTAR", value="")
-        sudo_phrase = st.text_input("Se aprovar sudo, digite exatamente: AUTORIZO_SUDO", value="")
-
-        if st.button("Executar agora"):
-            if confirm.strip() != "EXECUTAR":
-                st.error("Confirmação inválida. Digite EXECUTAR.")
-            elif not approve_user and not approve_sudo:
-                st.error("Nenhuma execução aprovada.")
-            else:
-                to_run = []
-                if approve_user:
-                    to_run.extend(cmds_user)
-                if approve_sudo:
-                    if sudo_phrase.strip() != "AUTORIZO_SUDO":
-                        st.error("SUDO não autorizado. Digite AUTORIZO_SUDO.")
-                        st.stop()
-                    to_run.extend(cmds_sudo)
-
-                with st.spinner("Executando..."):
-                    results = execute_commands(to_run, cwd=os.getcwd(), allow_sudo_exec=allow_sudo_exec)
-
-                st.subheader("Resultados")
-                st.code(
-                    json.dumps([r.__dict__ for r in results], ensure_ascii=False, indent=2),
-                    language="json",
-                )
-
-                success = bool(results) and all((r.rc == 0 and r.expects_rc == 0) for r in results)
-                had_sudo = bool(cmds_sudo)
-
-                # métricas simples
-                SS_local = 100.0 if success else 50.0
-                IEC = 50.0
-                IRO_total = 5.0 if success else 50.0
-                sfc = compute_sfc(SS_local, IEC, IRO_total)
-
-                st.markdown(
-                    '<div class="matrix-hud">'
-                    f'<span class="matrix-badge">SUCCESS={success}</span>'
-                    f'<span class="matrix-badge">SFC={sfc:.2f}</span>'
-                    "</div>",
-                    unsafe_allow_html=True,
-                )
-
-                episode_id = save_episode(
-                    db_path,
-                    {
-                        "user_input": objective.strip(),
-                        "plan": last["plan"],
-                        "patch": last["patch"],
-                        "audit": audit,
-                        "exec": [r.__dict__ for r in results],
-                        "model_used": last.get("model_used"),
-                        "approved": True,
-                        "had_sudo": had_sudo,
-                        "success": success,
-                    },
-                )
-                st.success(f"Episódio salvo no DB. id={episode_id}")
+        execution_panel(entry, db_path, allow_sudo_exec, verify_mode)
+
+with st.expander("Saúde (episódios + sistema)"):
+    hs = compute_health_scores(db_path, monitor, refresh_interval_s=HEALTH_REFRESH_S)
+
+    def pct(x):
+        return "—" if x is None else f"{100 * x:.0f}%"
+
+    lat = hs["step_latency_s"]
+    st.markdown(
+        '<div class="matrix-hud">'
+        f'<span class="matrix-badge">Saúde={hs["health_score"] if hs["health_score"] is not None else "—"}</span>'
+        f'<span class="matrix-badge">Sucesso={pct(hs["success_rate"])}</span>'
+        f'<span class="matrix-badge">Bloqueados={pct(hs["blocked_rate"])}</span>'
+        f'<span class="matrix-badge">Sudo={pct(hs["sudo_rate"])}</span>'
+        f'<span class="matrix-badge">Passo p50/p95/p99={lat["p50"]}/{lat["p95"]}/{lat["p99"]} s</span>'
+        "</div>",
+        unsafe_allow_html=True,
+    )
+    if hs["model_failure_rate"]:
+        st.caption("Falha por modelo: " + " · ".join(f"{m}: {pct(r)}" for m, r in hs["model_failure_rate"].items()))
+    usage_rows = get_store(db_path).llm_usage(group_by="model")
+    if usage_rows:
+        st.caption("Uso do LLM por modelo")
+        st.dataframe(usage_rows, use_container_width=True)
+
+with st.expander("Histórico de episódios"):
+    history_panel(db_path)
 
 st.caption("Dica: para projetos, rode o app dentro do seu workspace para manter caminhos relativos.")
\ No newline at end of file
@@ -1,22 +1,228 @@
 from __future__ import annotations
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
 import requests
-from typing import Any, Dict, Optional
+from requests.adapters import HTTPAdapter
+
+DEFAULT_TEMPERATURE = 0.2
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+@dataclass
+class RetryPolicy:
+    max_retries: int = 3
+    backoff_base_s: float = 0.5
+    backoff_max_s: float = 20.0
+    retry_statuses: Tuple[int, ...] = RETRY_STATUSES
+
+    def backoff(self, attempt: int) -> float:
+        # exponencial com "full jitter": uniforme em [0, min(max, base*2^n)]
+        cap = min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt))
+        return random.uniform(0.0, cap)
+
+def _retry_after_s(r: requests.Response) -> Optional[float]:
+    # Retry-After pode vir em segundos ou como HTTP-date
+    v = r.headers.get("Retry-After")
+    if not v:
+        return None
+    try:
+        return max(0.0, float(v))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(v).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+@dataclass
+class TransferStats:
+    # bytes do corpo JSON enviado (última tentativa) e do corpo recebido; usage como veio do servidor
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    usage: Optional[Dict[str, Any]] = None
+
+def _body_size(r: requests.Response) -> int:
+    body = r.request.body if r.request is not None else None
+    return len(body) if body else 0
+
+class ChatStream:
+    """Iterador de tokens (delta.content) de uma resposta SSE `stream: true`.
+
+    Acumula o texto em `content` e o modelo informado pelo servidor em `model`.
+    Fechar o iterador (ou sair do loop) fecha a conexão, cancelando a geração.
+    `stats` é preenchido durante a leitura (usage vem no último chunk, se o servidor atender `stream_options`).
+    """
+
+    def __init__(self, response: requests.Response, model: str):
+        self.response = response
+        self.model = model
+        self.content = ""
+        self.finish_reason: Optional[str] = None
+        self.stats = TransferStats(bytes_sent=_body_size(response))
+        self._it = self._tokens()
+
+    def __iter__(self) -> Iterator[str]:
+        return self._it
+
+    def __next__(self) -> str:
+        return next(self._it)
+
+    def _events(self) -> Iterator[str]:
+        # SSE: linhas "data: ..." acumuladas até uma linha em branco
+        data = []
+        for raw in self.response.iter_lines():
+            self.stats.bytes_received += len(raw) + 1
+            line = raw.decode("utf-8", errors="replace") if isinstance(raw, bytes) else raw
+            if not line:
+                if data:
+                    yield "\n".join(data)
+                    data = []
+                continue
+            if line.startswith(":"):
+                continue
+            if line.startswith("data:"):
+                data.append(line[5:].lstrip(" "))
+        if data:
+            yield "\n".join(data)
+
+    def _tokens(self) -> Iterator[str]:
+        try:
+            for ev in self._events():
+                if ev.strip() == "[DONE]":
+                    break
+                chunk = json.loads(ev)
+                self.model = chunk.get("model") or self.model
+                if chunk.get("usage"):
+                    self.stats.usage = chunk["usage"]
+                for choice in chunk.get("choices") or []:
+                    if choice.get("finish_reason"):
+                        self.finish_reason = choice["finish_reason"]
+                    token = (choice.get("delta") or {}).get("content")
+                    if token:
+                        self.content += token
+                        yield token
+        finally:
+            self.response.close()
+
+    def close(self) -> None:
+        self._it.close()
+        # gerador que nunca começou não roda o finally: fecha a resposta aqui também
+        self.response.close()
+
+    def read(self) -> str:
+        # consome o restante do stream e devolve o texto completo
+        for _ in self._it:
+            pass
+        return self.content
+
+class LLMClient:
+    """Cliente OpenAI-compatible reutilizável: sessão com pool keep-alive + retry/backoff."""
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        connect_timeout_s: float = 10.0,
+        read_timeout_s: float = 120.0,
+        retry: Optional[RetryPolicy] = None,
+        pool_maxsize: int = 10,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.connect_timeout_s = connect_timeout_s
+        self.read_timeout_s = read_timeout_s
+        self.retry = retry or RetryPolicy()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    def _payload(self, model: str, messages, response_format: Optional[dict], temperature: float) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+        }
+        if response_format:
+            # OpenAI JSON schema style
+            payload["response_format"] = response_format
+        return payload
+
+    def _post(self, payload: Dict[str, Any], read_timeout_s: Optional[float] = None, stream: bool = False) -> requests.Response:
+        url = self.base_url + "/chat/completions"
+        timeout = (self.connect_timeout_s, read_timeout_s or self.read_timeout_s)
+        attempt = 0
+        while True:
+            try:
+                r = self.session.post(url, headers=self._headers(), json=payload, timeout=timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retry.max_retries:
+                    raise
+                time.sleep(self.retry.backoff(attempt))
+                attempt += 1
+                continue
+            if r.status_code in self.retry.retry_statuses and attempt < self.retry.max_retries:
+                wait = _retry_after_s(r)
+                if wait is None:
+                    wait = self.retry.backoff(attempt)
+                r.close()
+                time.sleep(min(wait, self.retry.backoff_max_s))
+                attempt += 1
+                continue
+            if not r.ok:
+                # com stream=True o corpo não foi lido: fecha antes do erro para devolver a conexão ao pool
+                r.close()
+                r.raise_for_status()
+            return r
+
+    def chat(self, model: str, messages, response_format: Optional[dict] = None, temperature: float = DEFAULT_TEMPERATURE, read_timeout_s: Optional[float] = None) -> Dict[str, Any]:
+        return self.chat_measured(model, messages, response_format, temperature, read_timeout_s)[0]
+
+    def chat_measured(self, model: str, messages, response_format: Optional[dict] = None, temperature: float = DEFAULT_TEMPERATURE, read_timeout_s: Optional[float] = None) -> Tuple[Dict[str, Any], TransferStats]:
+        # OpenAI-compatible: POST {base_url}/chat/completions
+        r = self._post(self._payload(model, messages, response_format, temperature), read_timeout_s=read_timeout_s)
+        data = r.json()
+        return data, TransferStats(bytes_sent=_body_size(r), bytes_received=len(r.content), usage=data.get("usage"))
+
+    def chat_stream(self, model: str, messages, response_format: Optional[dict] = None, temperature: float = DEFAULT_TEMPERATURE, read_timeout_s: Optional[float] = None) -> ChatStream:
+        payload = self._payload(model, messages, response_format, temperature)
+        payload["stream"] = True
+        # sem isso servidores OpenAI-compatible não mandam "usage" no stream (aí os tokens ficam estimados)
+        payload["stream_options"] = {"include_usage": True}
+        r = self._post(payload, read_timeout_s=read_timeout_s, stream=True)
+        return ChatStream(r, model)
+
+    def close(self) -> None:
+        self.session.close()
+
+# um cliente (e portanto um pool de conexões) por base_url/api_key, reaproveitado entre chamadas
+_clients: Dict[Tuple[str, str], LLMClient] = {}
+_clients_lock = threading.Lock()
+
+def get_client(base_url: str, api_key: str) -> LLMClient:
+    key = (base_url.rstrip("/"), api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = LLMClient(base_url, api_key)
+        return client
 
 def chat(base_url: str, api_key: str, model: str, messages, response_format: Optional[dict]=None, timeout_s: int=120) -> Dict[str, Any]:
-    # OpenAI-compatible: POST {base_url}/chat/completions
-    url = base_url.rstrip("/") + "/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
-    payload: Dict[str, Any] = {
-        "model": model,
-        "messages": messages,
-        "temperature": 0.2,
-    }
-    if response_format:
-        # OpenAI JSON schema style
-        payload["response_format"] = response_format
-    r = requests.post(url, headers=headers, json=payload, timeout=timeout_s)
-    r.raise_for_status()
-    return r.json()
+    return get_client(base_url, api_key).chat(model, messages, response_format=response_format, read_timeout_s=timeout_s)
+
+def chat_measured(base_url: str, api_key: str, model: str, messages, response_format: Optional[dict]=None, timeout_s: int=120) -> Tuple[Dict[str, Any], TransferStats]:
+    return get_client(base_url, api_key).chat_measured(model, messages, response_format=response_format, read_timeout_s=timeout_s)
+
+def chat_stream(base_url: str, api_key: str, model: str, messages, response_format: Optional[dict]=None, timeout_s: int=120) -> ChatStream:
+    return get_client(base_url, api_key).chat_stream(model, messages, response_format=response_format, read_timeout_s=timeout_s)
@@ -0,0 +1,58 @@
+from __future__ import annotations
+import hashlib
+import json
+import zlib
+from typing import Any, Tuple
+
+try:  # opcional: zstd comprime melhor e mais rápido; sem ele, zlib
+    import zstandard as _zstd
+except ImportError:  # pragma: no cover - depende do ambiente
+    _zstd = None
+
+BLOB_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS blobs (
+  hash TEXT PRIMARY KEY,
+  codec TEXT NOT NULL,
+  raw_size INTEGER NOT NULL,
+  data BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+CODEC_RAW = "raw"
+CODEC_ZLIB = "zlib"
+CODEC_ZSTD = "zstd"
+DEFAULT_CODEC = CODEC_ZSTD if _zstd is not None else CODEC_ZLIB
+
+# abaixo disso a compressão não compensa o cabeçalho
+MIN_COMPRESS_BYTES = 128
+
+def encode_payload(obj: Any, codec: str = DEFAULT_CODEC) -> Tuple[str, str, int, bytes]:
+    """JSON -> (hash sha256 da forma canônica, codec, tamanho original, bytes armazenados).
+
+    O hash sai do JSON com chaves ordenadas e separadores fixos: o mesmo conteúdo com outra ordem de
+    chaves cai no mesmo blob. O texto guardado mantém a ordem original (é a que a UI mostra).
+    """
+    canonical = json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    digest = hashlib.sha256(canonical).hexdigest()
+    raw = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    if len(raw) < MIN_COMPRESS_BYTES:
+        return digest, CODEC_RAW, len(raw), raw
+    if codec == CODEC_ZSTD and _zstd is not None:
+        data = _zstd.ZstdCompressor(level=6).compress(raw)
+    else:
+        codec = CODEC_ZLIB
+        data = zlib.compress(raw, 6)
+    if len(data) >= len(raw):
+        return digest, CODEC_RAW, len(raw), raw
+    return digest, codec, len(raw), data
+
+def decode_blob(codec: str, data: bytes) -> Any:
+    if codec == CODEC_ZLIB:
+        data = zlib.decompress(data)
+    elif codec == CODEC_ZSTD:
+        if _zstd is None:
+            raise RuntimeError("Blob comprimido com zstd, mas o pacote 'zstandard' não está instalado.")
+        data = _zstd.ZstdDecompressor().decompress(data)
+    elif codec != CODEC_RAW:
+        raise ValueError(f"Codec de blob desconhecido: {codec}")
+    return json.loads(bytes(data).decode("utf-8"))
@@ -0,0 +1,126 @@
+from __future__ import annotations
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+CACHE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+  key TEXT PRIMARY KEY,
+  value TEXT NOT NULL,
+  size INTEGER NOT NULL,
+  created_at REAL NOT NULL,
+  last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access);
+"""
+
+def make_key(base_url: str, model: str, messages, response_format: Optional[dict], temperature: float) -> str:
+    # chave endereçada por conteúdo: JSON canônico (chaves ordenadas) -> sha256
+    blob = json.dumps(
+        {
+            "base_url": base_url.rstrip("/"),
+            "model": model,
+            "messages": messages,
+            "response_format": response_format,
+            "temperature": temperature,
+        },
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """Cache persistente (SQLite) de respostas do LLM com TTL e despejo LRU por tamanho."""
+
+    def __init__(self, path: str, ttl_s: float = 7 * 24 * 3600, max_entries: int = 5000, max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        self._con.execute("PRAGMA busy_timeout=5000")
+        self._con.executescript(CACHE_SCHEMA_SQL)
+
+    def get(self, key: str, bypass: bool = False) -> Optional[Dict[str, Any]]:
+        if bypass:
+            self.bypassed += 1
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._con.execute("SELECT value, created_at FROM llm_cache WHERE key=?", (key,)).fetchone()
+            if row is None or (self.ttl_s and now - row[1] > self.ttl_s):
+                if row is not None:
+                    self._con.execute("DELETE FROM llm_cache WHERE key=?", (key,))
+                self.misses += 1
+                return None
+            self._con.execute("UPDATE llm_cache SET last_access=? WHERE key=?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        text = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._con.execute(
+                "INSERT OR REPLACE INTO llm_cache (key,value,size,created_at,last_access) VALUES (?,?,?,?,?)",
+                (key, text, len(text.encode("utf-8")), now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        n, total = self._con.execute("SELECT COUNT(*), COALESCE(SUM(size),0) FROM llm_cache").fetchone()
+        if n <= self.max_entries and total <= self.max_bytes:
+            return
+        # remove os menos usados recentemente até voltar aos limites
+        self._con.execute("BEGIN")
+        try:
+            for key, size in self._con.execute("SELECT key, size FROM llm_cache ORDER BY last_access").fetchall():
+                if n <= self.max_entries and total <= self.max_bytes:
+                    break
+                self._con.execute("DELETE FROM llm_cache WHERE key=?", (key,))
+                n -= 1
+                total -= size
+            self._con.execute("COMMIT")
+        except Exception:
+            self._con.execute("ROLLBACK")
+            raise
+
+    def clear(self) -> None:
+        with self._lock:
+            self._con.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n, total = self._con.execute("SELECT COUNT(*), COALESCE(SUM(size),0) FROM llm_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": n,
+            "bytes": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._con.close()
+
+# uma instância por arquivo, compartilhada entre sessões/threads
+_caches: Dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+def get_cache(path: str) -> ResponseCache:
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = ResponseCache(path)
+        return cache
@@ -1,7 +1,24 @@
 from __future__ import annotations
+import os
+import queue
+import re
+import secrets
+import selectors
+import signal
 import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
-from typing import List, Tuple, Optional
+from typing import Callable, Dict, List, Set, Tuple, Optional
+
+from .schemas import StepLimits
+from .tracing import bind, span
+
+# limite padrão de saída guardada por stream (metade início, metade fim)
+DEFAULT_MAX_OUTPUT_BYTES = 64 * 1024
+MAX_LINE_BYTES = 4096
 
 @dataclass
 class CmdResult:
@@ -14,49 +31,839 @@ class CmdResult:
     expects_rc: int
     expects_stdout: str
     expects_stderr: str
+    # contabilidade de recursos do comando (não do expects)
+    wall_s: float = 0.0
+    user_s: Optional[float] = None
+    sys_s: Optional[float] = None
+    max_rss_kb: Optional[int] = None
+
+@dataclass
+class StepUsage:
+    wall_s: float = 0.0
+    user_s: Optional[float] = None
+    sys_s: Optional[float] = None
+    max_rss_kb: Optional[int] = None
+
+@dataclass
+class VerifyResult:
+    step_index: int
+    expects_cmd: str
+    rc: int
+    stdout: str
+    stderr: str
+
+def _dec(b: bytes) -> str:
+    return bytes(b).decode("utf-8", errors="replace")
+
+class OutputBuffer:
+    """Buffer limitado de um stream: guarda os primeiros e os últimos bytes (anel) e descarta o meio.
+
+    Opcionalmente entrega cada linha a `on_line` conforme chega (linhas longas são cortadas).
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_OUTPUT_BYTES, on_line: Optional[Callable[[str], None]] = None):
+        self.head_bytes = max_bytes // 2
+        self.tail_bytes = max_bytes - self.head_bytes
+        self.on_line = on_line
+        self.total = 0
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._partial = bytearray()
+
+    @property
+    def truncated(self) -> int:
+        # bytes descartados do meio do stream
+        return max(0, self.total - len(self._head) - min(len(self._tail), self.tail_bytes))
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self.total += len(data)
+        if self.on_line is not None:
+            self._split_lines(data)
+        room = self.head_bytes - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        if data:
+            self._tail += data
+            # compacta só quando dobra: custo amortizado O(1) por byte
+            if len(self._tail) > 2 * self.tail_bytes:
+                del self._tail[:len(self._tail) - self.tail_bytes]
+
+    def _split_lines(self, data: bytes) -> None:
+        self._partial += data
+        start = 0
+        while True:
+            nl = self._partial.find(b"\n", start)
+            if nl < 0:
+                break
+            self.on_line(_dec(self._partial[start:nl]))
+            start = nl + 1
+        del self._partial[:start]
+        if len(self._partial) > MAX_LINE_BYTES:
+            self.on_line(_dec(self._partial))
+            self._partial.clear()
+
+    def flush(self) -> None:
+        # entrega a última linha (sem \n) ao callback
+        if self.on_line is not None and self._partial:
+            self.on_line(_dec(self._partial))
+        self._partial.clear()
+
+    def text(self) -> str:
+        tail = bytes(self._tail[-self.tail_bytes:]) if self.tail_bytes else b""
+        if self.truncated:
+            return _dec(self._head) + f"\n...[saída truncada: {self.truncated} bytes omitidos]...\n" + _dec(tail)
+        return _dec(self._head + tail)
+
+LineCallback = Optional[Callable[[str, str], None]]
+
+def _buffers(max_output_bytes: int, on_output: LineCallback) -> Tuple[OutputBuffer, OutputBuffer]:
+    # on_output(stream, line): stream é "stdout" ou "stderr"
+    if on_output is None:
+        return OutputBuffer(max_output_bytes), OutputBuffer(max_output_bytes)
+    return (OutputBuffer(max_output_bytes, lambda l: on_output("stdout", l)),
+            OutputBuffer(max_output_bytes, lambda l: on_output("stderr", l)))
+
+def _limits_prefix(limits: Optional[StepLimits]) -> str:
+    # ulimit (setrlimit) soft+hard; -v em KiB, -t em segundos de CPU
+    if limits is None:
+        return ""
+    parts = []
+    if limits.max_memory_mb:
+        parts.append(f"ulimit -v {int(limits.max_memory_mb) * 1024}")
+    if limits.max_cpu_s:
+        parts.append(f"ulimit -t {int(limits.max_cpu_s)}")
+    return "; ".join(parts) + "; " if parts else ""
 
-def run_shell(cmd: str, cwd: str, timeout_s: int = 60) -> Tuple[int,str,str]:
-    p = subprocess.run(
-        ["bash", "-lc", cmd],
+def run_shell(cmd: str, cwd: str, timeout_s: int = 60, on_output: LineCallback = None,
+              max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES) -> Tuple[int,str,str]:
+    return run_shell_measured(cmd, cwd, timeout_s, on_output, max_output_bytes)[:3]
+
+def run_shell_measured(cmd: str, cwd: str, timeout_s: float = 60, on_output: LineCallback = None,
+                       max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+                       limits: Optional[StepLimits] = None) -> Tuple[int, str, str, StepUsage]:
+    argv = ["bash", "-lc", _limits_prefix(limits) + cmd if limits else cmd]
+    return _spawn_measured(argv, cwd, None, timeout_s, on_output, max_output_bytes)
+
+def _spawn_measured(argv: List[str], cwd: str, env: Optional[Dict[str, str]], timeout_s: float,
+                    on_output: LineCallback, max_output_bytes: int) -> Tuple[int, str, str, StepUsage]:
+    # lê stdout/stderr incrementalmente em buffers limitados (não acumula saídas gigantes);
+    # o rusage vem do wait4 do bash (inclui os filhos que ele esperou)
+    t0 = time.monotonic()
+    p = subprocess.Popen(
+        argv,
         cwd=cwd,
-        capture_output=True,
-        text=True,
-        timeout=timeout_s
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+    out, err = _buffers(max_output_bytes, on_output)
+    deadline = t0 + timeout_s
+    with selectors.DefaultSelector() as sel:
+        sel.register(p.stdout, selectors.EVENT_READ, out)
+        sel.register(p.stderr, selectors.EVENT_READ, err)
+        while sel.get_map():
+            left = deadline - time.monotonic()
+            if left <= 0:
+                try:
+                    os.killpg(p.pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    pass
+                p.wait()
+                p.stdout.close()
+                p.stderr.close()
+                raise subprocess.TimeoutExpired(argv, timeout_s, out.text(), err.text())
+            for key, _ in sel.select(timeout=left):
+                chunk = os.read(key.fileobj.fileno(), 65536)
+                if chunk:
+                    key.data.write(chunk)
+                else:
+                    sel.unregister(key.fileobj)
+                    key.fileobj.close()
+    _, status, ru = os.wait4(p.pid, 0)
+    p.returncode = rc = os.waitstatus_to_exitcode(status)
+    usage = StepUsage(
+        wall_s=time.monotonic() - t0,
+        user_s=ru.ru_utime,
+        sys_s=ru.ru_stime,
+        max_rss_kb=int(ru.ru_maxrss),  # Linux: KiB
     )
-    return p.returncode, p.stdout, p.stderr
+    out.flush()
+    err.flush()
+    return rc, out.text(), err.text(), usage
 
-def execute_commands(commands, cwd: str, allow_sudo_exec: bool = False) -> List[CmdResult]:
-    results: List[CmdResult] = []
+def _ansi_c_quote(s: str) -> str:
+    # literal $'...' do bash: evita processo externo (base64 etc.) para transportar o comando
+    out = []
+    for ch in s:
+        o = ord(ch)
+        if ch == "\\":
+            out.append("\\\\")
+        elif ch == "'":
+            out.append("\\'")
+        elif ch == "\n":
+            out.append("\\n")
+        elif o < 0x20 or o == 0x7f:
+            out.append(f"\\x{o:02x}")
+        else:
+            out.append(ch)
+    return "$'" + "".join(out) + "'"
+
+class _Framer:
+    """Separa a saída do comando da sentinela que a encerra, repassando os bytes ao buffer.
+
+    Segura só o sufixo que ainda pode ser o início da sentinela (linhas saem sem atraso).
+    Com `trailer=N` (stdout) espera também N linhas após a sentinela (o rc).
+    """
+
+    def __init__(self, mark: bytes, sink: OutputBuffer, trailer: int = 0):
+        self.mark = mark
+        self.sink = sink
+        self.trailer = trailer
+        self.done = False
+        self.value: List[bytes] = []
+        self._pending = bytearray()
+        self._found = -1
+
+    def feed(self, chunk: bytes) -> None:
+        self._pending += chunk
+        if self._found < 0:
+            i = self._pending.find(self.mark)
+            if i < 0:
+                hold = self._held()
+                if len(self._pending) > hold:
+                    self.sink.write(bytes(self._pending[:len(self._pending) - hold]))
+                    del self._pending[:len(self._pending) - hold]
+                return
+            self.sink.write(bytes(self._pending[:i]))
+            del self._pending[:i + len(self.mark)]
+            self._found = 0
+        if not self.trailer:
+            self.done = True
+            return
+        if self._pending.count(b"\n") >= self.trailer:
+            self.value = bytes(self._pending).split(b"\n")[:self.trailer]
+            self.done = True
+
+    def _held(self) -> int:
+        # maior sufixo do pendente que ainda pode ser o começo da sentinela
+        for k in range(min(len(self.mark) - 1, len(self._pending)), 0, -1):
+            if self._pending.endswith(self.mark[:k]):
+                return k
+        return 0
+
+    def flush(self) -> None:
+        # sem sentinela (shell morreu/timeout): tudo que chegou é saída
+        if self._found < 0 and self._pending:
+            self.sink.write(bytes(self._pending))
+            self._pending.clear()
+
+# estado de shell que passa entre os passos: cwd + variáveis exportadas, gravado só com builtins
+# (sem fork): "$PWD" NUL seguido da saída do `export -p`
+def _state_dump(target: str) -> str:
+    return "{ printf '%s\\0' \"$PWD\"; export -p; } >" + target + " 2>/dev/null"
+
+# passo medido: comando e arquivo de estado chegam pelo ambiente (não ficam em $1/$2 para o comando,
+# e set --/shift no comando não mexem neles); grava o estado final se o shell não sair antes
+_STEP_SCRIPT = (
+    '__ma_cmd=$__MA_CMD __ma_state=$__MA_STATE; unset __MA_CMD __MA_STATE; set --; '
+    'eval "$__ma_cmd"; __ma_rc=$?; ' + _state_dump('"$__ma_state"') + '; exit $__ma_rc'
+)
+_ENV_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*\Z")
+# mantidas pelo próprio bash: não são copiadas de volta para a sessão
+_SHELL_ENV = frozenset(("_", "PWD", "OLDPWD", "SHLVL"))
+# uma entrada do `export -p`: valor entre "..." (bash 5.1-) ou $'...' (com caracteres de controle)
+_EXPORT_RE = re.compile(
+    rb"(?:declare -([A-Za-z-]+)|export) ([A-Za-z_][A-Za-z0-9_]*)"
+    rb"(?:=(\"(?:[^\"\\]|\\.)*\"|\$'(?:[^'\\]|\\.)*'|[^\n]*))?\n",
+    re.S,
+)
+_DQ_ESC = re.compile(rb'\\([\\"$`])')
+_ANSI_ESC = re.compile(rb"\\(?:([0-7]{1,3})|x([0-9A-Fa-f]{1,2})|(.))", re.S)
+_ANSI_CHARS = {b"a": b"\a", b"b": b"\b", b"e": b"\x1b", b"E": b"\x1b", b"f": b"\f", b"n": b"\n",
+               b"r": b"\r", b"t": b"\t", b"v": b"\v"}
+
+ShellState = Tuple[str, Dict[str, str]]
+
+def _unquote_ansi(m: "re.Match[bytes]") -> bytes:
+    if m.group(1):
+        return bytes([int(m.group(1), 8) & 0xFF])
+    if m.group(2):
+        return bytes([int(m.group(2), 16)])
+    return _ANSI_CHARS.get(m.group(3), m.group(3))
+
+def _parse_state(data: bytes) -> Optional[ShellState]:
+    cwd, sep, rest = data.partition(b"\0")
+    if not sep or not cwd:
+        return None
+    env = {}
+    pos = 0
+    while pos < len(rest):
+        m = _EXPORT_RE.match(rest, pos)
+        if m is None:
+            return None
+        pos = m.end()
+        flags, name, value = m.groups()
+        # sem valor (só `export X`) ou array: não vai para o ambiente dos processos
+        if value is None or (flags and (b"a" in flags or b"A" in flags)):
+            continue
+        if value.startswith(b'"'):
+            value = _DQ_ESC.sub(rb"\1", value[1:-1])
+        elif value.startswith(b"$'"):
+            value = _ANSI_ESC.sub(_unquote_ansi, value[2:-1])
+        env[name.decode("ascii")] = os.fsdecode(value)
+    return os.fsdecode(cwd), env
+
+def _read_state(path: str) -> Optional[ShellState]:
+    try:
+        with open(path, "rb") as f:
+            return _parse_state(f.read())
+    except OSError:
+        return None
+
+class ShellSession:
+    """Um processo bash de longa duração para uma sessão de execução.
+
+    Cada comando é enviado numa linha (eval de um literal $'...') seguida de sentinelas
+    únicas em stdout (com o rc) e em stderr. cwd/variáveis persistem entre os passos,
+    e o custo de subir o shell de login (profile etc.) é pago uma vez por sessão.
+
+    `run` roda dentro do processo da sessão (expects, verificações). `run_measured` (o comando
+    de cada passo) roda num bash filho direto deste processo, a partir do cwd e das variáveis
+    exportadas da sessão: o wait4 dá user/sys/max RSS só do passo e os rlimits valem só para ele.
+    No fim, o cwd e as variáveis exportadas do filho voltam para a sessão (com ou sem limites);
+    funções, variáveis não exportadas e opções de `set` definidas num passo não passam adiante.
+
+    O estado (cwd + exportadas) é gravado com builtins no fim de cada comando e fica em cache:
+    um passo medido não faz ida e volta extra à sessão, e o cd/export que o passo deixou é
+    aplicado na frente da próxima linha que a sessão rodar.
+    """
+
+    MARK = b"__MA_END_"
+
+    def __init__(self, cwd: str, login: bool = True):
+        self.cwd = cwd
+        self.login = login
+        self._proc: Optional[subprocess.Popen] = None
+        self._sel: Optional[selectors.BaseSelector] = None
+        # estado atual (já contando o que está em _pending); None = desconhecido
+        self._state: Optional[ShellState] = None
+        # cd/export/unset ainda não enviados ao processo: vão na frente da próxima linha
+        self._pending = ""
+        self._state_path: Optional[str] = None
+
+    def __enter__(self) -> "ShellSession":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self) -> None:
+        if self.alive:
+            return
+        with span("shell.start", login=self.login):
+            fd, self._state_path = tempfile.mkstemp(prefix="matrix_shell_")
+            os.close(fd)
+            self._state = None
+            self._pending = ""
+            self._proc = subprocess.Popen(
+                ["bash", "--login"] if self.login else ["bash", "--noprofile", "--norc"],
+                cwd=self.cwd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                start_new_session=True,  # grupo próprio: timeout mata o comando e seus filhos
+            )
+            self._sel = selectors.DefaultSelector()
+            self._sel.register(self._proc.stdout, selectors.EVENT_READ, "out")
+            self._sel.register(self._proc.stderr, selectors.EVENT_READ, "err")
+            # descarta o que o profile imprimir antes do primeiro comando
+            self.run(":", timeout_s=30)
+
+    def run(self, cmd: str, timeout_s: float = 60, on_output: LineCallback = None,
+            max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES) -> Tuple[int, str, str]:
+        if not self.alive:
+            self.start()
+            if self._proc is None:
+                # o próprio start estourou o timeout (profile lento/máquina saturada)
+                return 127, "", "Sessão de shell não iniciou a tempo."
+        mark = (self.MARK + secrets.token_hex(8).encode()).decode()
+        line = (
+            f"{self._pending}eval {_ansi_c_quote(cmd)} </dev/null; __ma_rc=$?; "
+            f"{_state_dump(_ansi_c_quote(self._state_path))}; "
+            f"printf '%s %d\\n' '{mark}' \"$__ma_rc\"; "
+            f"printf '%s\\n' '{mark}' >&2\n"
+        )
+        self._pending = ""
+        out, err = _buffers(max_output_bytes, on_output)
+        try:
+            self._proc.stdin.write(line.encode("utf-8"))
+            self._proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            self._kill()
+            return 127, "", "Sessão de shell encerrada inesperadamente."
+        mark_b = mark.encode()
+        framers = {
+            "out": _Framer(mark_b + b" ", out, trailer=1),
+            "err": _Framer(mark_b + b"\n", err),
+        }
+        rc = self._pump(framers, time.monotonic() + timeout_s)
+        for f in framers.values():
+            f.flush()
+        out.flush()
+        err.flush()
+        if rc is None:
+            return 124, out.text(), err.text() + f"\nTimeout: comando excedeu {timeout_s:g}s (sessão reiniciada)."
+        if self._proc is not None:
+            self._state = _read_state(self._state_path)
+        return rc, out.text(), err.text()
+
+    def state(self) -> Optional[ShellState]:
+        """(cwd, variáveis exportadas) atuais da sessão; None se o shell não subiu."""
+        if self._state is None:
+            self.run(":", timeout_s=30)
+        return self._state
+
+    def restore(self, state: ShellState) -> None:
+        """Volta a sessão para um estado salvo com `state()` (cwd + variáveis exportadas)."""
+        current = self.state()
+        if current is not None:
+            self._apply(current, state)
+
+    def _apply(self, old: ShellState, new: ShellState) -> None:
+        # só builtins (cd/export/unset), enfileirados para a próxima linha; nada muda se o estado é o mesmo
+        (old_cwd, old_env), (cwd, env) = old, new
+        parts = [] if cwd == old_cwd else ["cd -- " + _ansi_c_quote(cwd)]
+        names = [k for k in env if _ENV_NAME.match(k) and k not in _SHELL_ENV and old_env.get(k) != env[k]]
+        parts += [f"export {k}={_ansi_c_quote(env[k])}" for k in names]
+        gone = [k for k in old_env if k not in env and _ENV_NAME.match(k) and k not in _SHELL_ENV]
+        if gone:
+            parts.append("unset " + " ".join(gone))
+        if parts:
+            self._pending += "{ " + "; ".join(parts) + "; } 2>/dev/null; "
+        # as variáveis do próprio bash seguem as da sessão (o filho sobe SHLVL etc.)
+        merged = {k: v for k, v in env.items() if k not in _SHELL_ENV}
+        merged.update((k, old_env[k]) for k in _SHELL_ENV if k in old_env)
+        if "PWD" in merged:
+            merged["PWD"] = cwd
+        self._state = (cwd, merged)
+
+    def run_measured(self, cmd: str, timeout_s: float = 60, on_output: LineCallback = None,
+                     max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+                     limits: Optional[StepLimits] = None) -> Tuple[int, str, str, StepUsage]:
+        state = self.state()
+        if state is None:
+            return 127, "", "Sessão de shell não iniciou a tempo.", StepUsage()
+        cwd, env = state
+        # o filho grava o estado no mesmo arquivo da sessão; vazio = não gravou
+        os.truncate(self._state_path, 0)
+        env = dict(env, __MA_CMD=cmd, __MA_STATE=self._state_path)
+        # --noprofile: o ambiente do login já veio da sessão
+        argv = ["bash", "--noprofile", "--norc", "-c", _limits_prefix(limits) + _STEP_SCRIPT]
+        try:
+            rc, out, err, usage = _spawn_measured(argv, cwd, env, timeout_s, on_output, max_output_bytes)
+        except subprocess.TimeoutExpired as e:
+            return (124, e.output or "", (e.stderr or "") + f"\nTimeout: comando excedeu {timeout_s:g}s.",
+                    StepUsage(wall_s=timeout_s))
+        new = _read_state(self._state_path)
+        # sem estado gravado (exit/set -e no comando, limite estourado): a sessão fica como estava
+        if new is not None:
+            self._apply(state, new)
+        return rc, out, err, usage
+
+    def _pump(self, framers: Dict[str, _Framer], deadline: float) -> Optional[int]:
+        # lê os dois pipes até as duas sentinelas; None = timeout
+        while not all(f.done for f in framers.values()):
+            left = deadline - time.monotonic()
+            if left <= 0:
+                self._kill()
+                return None
+            for key, _ in self._sel.select(timeout=left):
+                chunk = os.read(key.fileobj.fileno(), 65536)
+                if not chunk:
+                    # shell morreu (exit/set -e no comando): rc do próprio processo
+                    code = self._proc.wait()
+                    self._kill()
+                    return code
+                framers[key.data].feed(chunk)
+        return int(framers["out"].value[0])
+
+    def _kill(self) -> None:
+        if self._proc is None:
+            return
+        try:
+            os.killpg(self._proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self._proc.wait()
+        self._close_pipes()
+
+    def _close_pipes(self) -> None:
+        if self._sel is not None:
+            self._sel.close()
+            self._sel = None
+        for f in (self._proc.stdin, self._proc.stdout, self._proc.stderr):
+            try:
+                f.close()
+            except OSError:
+                pass
+        self._proc = None
+        self._state = None
+        self._pending = ""
+        if self._state_path is not None:
+            try:
+                os.unlink(self._state_path)
+            except OSError:
+                pass
+            self._state_path = None
+
+    def close(self) -> None:
+        if self._proc is None:
+            return
+        try:
+            self._proc.stdin.write(b"exit 0\n")
+            self._proc.stdin.flush()
+            self._proc.wait(timeout=5)
+        except (BrokenPipeError, OSError, subprocess.TimeoutExpired):
+            self._kill()
+            return
+        self._close_pipes()
+
+StepCallback = Optional[Callable[[int, str, str], None]]
+
+RC_SUDO_SKIPPED = 126
+RC_CANCELLED = 125
+RC_NOT_VERIFIED = -1
+VERIFY_MODES = ("inline", "deferred")
+
+def _sudo_skipped(c) -> CmdResult:
+    # Não executar sudo por padrão
+    return CmdResult(
+        step_index=c.step_index,
+        cmd=c.cmd,
+        rc=RC_SUDO_SKIPPED,
+        stdout="",
+        stderr="SUDO não executado pelo app (modo seguro). Execute manualmente no terminal após auditoria.",
+        expects_cmd=c.expects_cmd,
+        expects_rc=RC_SUDO_SKIPPED,
+        expects_stdout="",
+        expects_stderr="SUDO expects não executado pelo app.",
+    )
+
+def _cancelled(c, failed_dep: int) -> CmdResult:
+    return CmdResult(
+        step_index=c.step_index,
+        cmd=c.cmd,
+        rc=RC_CANCELLED,
+        stdout="",
+        stderr=f"Cancelado: dependência falhou (passo {failed_dep}).",
+        expects_cmd=c.expects_cmd,
+        expects_rc=RC_CANCELLED,
+        expects_stdout="",
+        expects_stderr="",
+    )
+
+def _ok(r: CmdResult, verify_inline: bool = True) -> bool:
+    # no modo deferred o expects ainda não rodou: só o rc do comando decide
+    return r.rc == 0 and (r.expects_rc == 0 or (not verify_inline and r.expects_rc == RC_NOT_VERIFIED))
+
+def _is_dag(commands) -> bool:
+    return any(getattr(c, "depends_on", None) is not None or getattr(c, "parallel_group", None) for c in commands)
+
+def build_dependencies(commands) -> Dict[int, Set[int]]:
+    """Dependências por step_index.
+
+    - depends_on explícito: exatamente esses passos (os que não estão nesta execução são ignorados);
+    - parallel_group: todos os passos anteriores que não são do mesmo grupo (membros rodam juntos);
+    - sem nada: todos os passos anteriores (barreira, como na execução sequencial).
+    """
+    deps: Dict[int, Set[int]] = {}
+    seen: List = []
+    present = {c.step_index for c in commands}
     for c in commands:
-        cmd = c.cmd
-        if cmd.strip().startswith("sudo") and not allow_sudo_exec:
-            # Não executar sudo por padrão
-            results.append(CmdResult(
-                step_index=c.step_index,
-                cmd=cmd,
-                rc=126,
-                stdout="",
-                stderr="SUDO não executado pelo app (modo seguro). Execute manualmente no terminal após auditoria.",
-                expects_cmd=c.expects_cmd,
-                expects_rc=126,
-                expects_stdout="",
-                expects_stderr="SUDO expects não executado pelo app.",
-            ))
-            break
-
-        rc, out, err = run_shell(cmd, cwd=cwd)
-        erc, eout, eerr = run_shell(c.expects_cmd, cwd=cwd)
-        results.append(CmdResult(
-            step_index=c.step_index,
-            cmd=cmd,
-            rc=rc,
-            stdout=out,
-            stderr=err,
-            expects_cmd=c.expects_cmd,
-            expects_rc=erc,
-            expects_stdout=eout,
-            expects_stderr=eerr
-        ))
-        if rc != 0 or erc != 0:
-            break
+        depends_on = getattr(c, "depends_on", None)
+        group = getattr(c, "parallel_group", None)
+        if depends_on is not None:
+            deps[c.step_index] = {d for d in depends_on if d in present and d != c.step_index}
+        elif group:
+            deps[c.step_index] = {p.step_index for p in seen if getattr(p, "parallel_group", None) != group}
+        else:
+            deps[c.step_index] = {p.step_index for p in seen}
+        seen.append(c)
+    return deps
+
+def execute_commands(commands, cwd: str, allow_sudo_exec: bool = False, persistent: bool = True, timeout_s: int = 60,
+                     on_output: StepCallback = None, max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+                     max_workers: int = 4, verify: str = "inline", verify_mode: str = "batch",
+                     default_limits: Optional[StepLimits] = None) -> List[CmdResult]:
+    # on_output(step_index, stream, line): stream é "stdout"/"stderr" (comando) ou "expects_stdout"/"expects_stderr"
+    # verify="inline": expects logo após cada comando; "deferred": uma passada final (verify_mode) para todos,
+    # cada expects a partir do cwd/variáveis exportadas que o próprio passo deixou (como no inline)
+    # limites: Command.limits sobrepõe default_limits campo a campo; timeout_s/max_output_bytes são o padrão final
+    if verify not in VERIFY_MODES:
+        raise ValueError(f"verify inválido: {verify} (use {', '.join(VERIFY_MODES)})")
+    inline = verify == "inline"
+    # deferred + sessão: estado (cwd, exportadas) depois de cada comando, para a verificação final
+    states: Optional[Dict[int, ShellState]] = None if inline or not persistent else {}
+    commands = list(commands)
+    dag = _is_dag(commands)
+    with span("execute", steps=len(commands), dag=dag, verify=verify) as sp:
+        if dag:
+            results = _execute_dag(commands, cwd, allow_sudo_exec, persistent, timeout_s, on_output, max_output_bytes, max_workers,
+                                   inline, default_limits, states)
+        else:
+            results = _execute_sequential(commands, cwd, allow_sudo_exec, persistent, timeout_s, on_output, max_output_bytes,
+                                          inline, default_limits, states)
+        if not inline:
+            pending = [r for r in results if r.expects_rc == RC_NOT_VERIFIED]
+            checks = verify_expects([(r.step_index, r.expects_cmd) for r in pending], cwd, mode=verify_mode,
+                                    max_workers=max_workers, timeout_s=timeout_s, max_output_bytes=max_output_bytes,
+                                    states=states)
+            for r, v in zip(pending, checks):
+                r.expects_rc, r.expects_stdout, r.expects_stderr = v.rc, v.stdout, v.stderr
+        sp.set(ran=len(results))
     return results
+
+def _execute_sequential(commands, cwd: str, allow_sudo_exec: bool, persistent: bool, timeout_s: int,
+                        on_output: StepCallback, max_output_bytes: int, verify_inline: bool,
+                        default_limits: Optional[StepLimits] = None,
+                        states: Optional[Dict[int, ShellState]] = None) -> List[CmdResult]:
+    results: List[CmdResult] = []
+    # persistent=True: um bash por execução (estado entre passos); False: um bash -lc por comando
+    session = ShellSession(cwd) if persistent else None
+    try:
+        for c in commands:
+            if c.cmd.strip().startswith("sudo") and not allow_sudo_exec:
+                results.append(_sudo_skipped(c))
+                break
+            r = _run_step(c, session, cwd, timeout_s, on_output, max_output_bytes, verify_inline, default_limits, states)
+            results.append(r)
+            if not _ok(r, verify_inline):
+                break
+    finally:
+        if session:
+            session.close()
+    return results
+
+def effective_limits(c, default_limits: Optional[StepLimits] = None) -> Optional[StepLimits]:
+    own = getattr(c, "limits", None)
+    if own is None or default_limits is None:
+        return own or default_limits
+    return default_limits.model_copy(update=own.model_dump(exclude_none=True))
+
+def _run_step(c, session: Optional[ShellSession], cwd: str, timeout_s: float,
+              on_output: StepCallback, max_output_bytes: int, verify_inline: bool = True,
+              default_limits: Optional[StepLimits] = None,
+              states: Optional[Dict[int, ShellState]] = None) -> CmdResult:
+    limits = effective_limits(c, default_limits)
+    step_timeout = (limits.timeout_s if limits and limits.timeout_s else timeout_s)
+    step_output = (limits.max_output_bytes if limits and limits.max_output_bytes else max_output_bytes)
+
+    def shell(cmd: str, prefix: str = "", lim: Optional[StepLimits] = None) -> Tuple[int, str, str, StepUsage]:
+        cb = (lambda stream, line: on_output(c.step_index, prefix + stream, line)) if on_output else None
+        if session and prefix:
+            # expects dentro da sessão (vê o cwd/variáveis deixados pelo comando), num subshell
+            return (*session.run(_check_line(cmd), timeout_s=step_timeout, on_output=cb, max_output_bytes=step_output),
+                    StepUsage())
+        if session:
+            return session.run_measured(cmd, timeout_s=step_timeout, on_output=cb, max_output_bytes=step_output, limits=lim)
+        try:
+            return run_shell_measured(cmd, cwd=cwd, timeout_s=step_timeout, on_output=cb, max_output_bytes=step_output, limits=lim)
+        except subprocess.TimeoutExpired as e:
+            return 124, e.output or "", (e.stderr or "") + f"\nTimeout: comando excedeu {step_timeout:g}s.", StepUsage(wall_s=step_timeout)
+
+    # limites de memória/CPU valem para o comando; o expects (leitura) roda só com timeout
+    with span("exec.step", step=c.step_index):
+        with span("exec.cmd", step=c.step_index) as sp:
+            rc, out, err, usage = shell(c.cmd, lim=limits)
+            sp.set(rc=rc)
+        if verify_inline:
+            with span("exec.expects", step=c.step_index) as sp:
+                erc, eout, eerr, _ = shell(c.expects_cmd, "expects_")
+                sp.set(rc=erc)
+        else:
+            erc, eout, eerr = RC_NOT_VERIFIED, "", ""
+            if session and states is not None:
+                # já está em cache (gravado pelo próprio passo): não custa uma ida à sessão
+                states[c.step_index] = session.state()
+    return CmdResult(
+        step_index=c.step_index,
+        cmd=c.cmd,
+        rc=rc,
+        stdout=out,
+        stderr=err,
+        expects_cmd=c.expects_cmd,
+        expects_rc=erc,
+        expects_stdout=eout,
+        expects_stderr=eerr,
+        wall_s=round(usage.wall_s, 4),
+        user_s=usage.user_s,
+        sys_s=usage.sys_s,
+        max_rss_kb=usage.max_rss_kb,
+    )
+
+def _execute_dag(commands, cwd: str, allow_sudo_exec: bool, persistent: bool, timeout_s: int,
+                 on_output: StepCallback, max_output_bytes: int, max_workers: int,
+                 verify_inline: bool = True, default_limits: Optional[StepLimits] = None,
+                 states: Optional[Dict[int, ShellState]] = None) -> List[CmdResult]:
+    """Executa o DAG de passos num pool limitado; falha cancela só os dependentes.
+
+    Cada worker tem sua própria ShellSession, mas cada passo começa do estado inicial dela
+    (cwd = `cwd`, variáveis exportadas do login): nada que um passo faça (cd/export) chega a
+    outro passo, qualquer que seja a thread que rode os dois. O expects do passo vê o estado
+    deixado pelo próprio comando. O callback on_output é sempre chamado na thread de quem
+    chamou (as linhas passam por uma fila).
+    """
+    deps = build_dependencies(commands)
+    by_step = {c.step_index: c for c in commands}
+    results: Dict[int, CmdResult] = {}
+    lines: "queue.Queue[Tuple[int, str, str]]" = queue.Queue()
+    local = threading.local()
+    sessions: List[ShellSession] = []
+    sessions_lock = threading.Lock()
+
+    def worker(c) -> CmdResult:
+        session = None
+        if persistent:
+            session = getattr(local, "session", None)
+            if session is None:
+                session = local.session = ShellSession(cwd)
+                with sessions_lock:
+                    sessions.append(session)
+                local.initial = session.state()
+            elif local.initial is not None:
+                session.restore(local.initial)
+        cb = (lambda i, stream, line: lines.put((i, stream, line))) if on_output else None
+        return _run_step(c, session, cwd, timeout_s, cb, max_output_bytes, verify_inline, default_limits, states)
+
+    def drain() -> None:
+        while True:
+            try:
+                item = lines.get_nowait()
+            except queue.Empty:
+                return
+            on_output(*item)
+
+    waiting = [c.step_index for c in commands]
+    running: Dict[Future, int] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            while waiting or running:
+                progressed = True
+                while progressed:
+                    progressed = False
+                    for s in list(waiting):
+                        if not deps[s] <= results.keys():
+                            continue
+                        waiting.remove(s)
+                        progressed = True
+                        c = by_step[s]
+                        failed = next((d for d in sorted(deps[s]) if not _ok(results[d], verify_inline)), None)
+                        if failed is not None:
+                            results[s] = _cancelled(c, failed)
+                        elif c.cmd.strip().startswith("sudo") and not allow_sudo_exec:
+                            results[s] = _sudo_skipped(c)
+                        else:
+                            running[pool.submit(bind(worker), c)] = s
+                if not running:
+                    # sobrou passo sem dependências satisfazíveis (ciclo/ordem inválida)
+                    for s in waiting:
+                        c = by_step[s]
+                        results[s] = _cancelled(c, min(d for d in deps[s] if d not in results))
+                    waiting = []
+                    continue
+                done, _ = wait(list(running), timeout=0.1, return_when=FIRST_COMPLETED)
+                if on_output:
+                    drain()
+                for fut in done:
+                    results[running.pop(fut)] = fut.result()
+    finally:
+        if on_output:
+            drain()
+        for session in sessions:
+            session.close()
+    # resultados na ordem dos passos (não na ordem de conclusão)
+    return [results[c.step_index] for c in commands]
+
+def _check_line(expects_cmd: str) -> str:
+    # cada verificação num subshell: não altera cwd/env da sessão nem das outras verificações
+    return "(eval " + _ansi_c_quote(expects_cmd) + ")"
+
+def verify_expects(checks: List[Tuple[int, str]], cwd: str, mode: str = "batch", max_workers: int = 4,
+                   timeout_s: float = 60, max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+                   states: Optional[Dict[int, ShellState]] = None) -> List[VerifyResult]:
+    """Roda uma lista de expects_cmd (somente leitura) e devolve rc/stdout/stderr de cada um.
+
+    mode="batch": todas numa única sessão bash (um spawn só), em sequência;
+    mode="concurrent": distribuídas entre até max_workers sessões em paralelo.
+    states: estado (cwd, exportadas) deixado por cada passo; a verificação do passo parte dele
+    (sem estado para o passo: a sessão fica no `cwd`/ambiente de login).
+    """
+    if not checks:
+        return []
+    if mode not in ("batch", "concurrent"):
+        raise ValueError(f"mode inválido: {mode} (use batch ou concurrent)")
+    with span("verify", mode=mode, checks=len(checks)):
+        if mode == "batch":
+            return _verify_batch(checks, cwd, timeout_s, max_output_bytes, states or {})
+        return _verify_concurrent(checks, cwd, max_workers, timeout_s, max_output_bytes, states or {})
+
+def _check_in_state(session: ShellSession, initial: Optional[ShellState], state: Optional[ShellState]) -> None:
+    # cd/export enfileirados: vão na mesma linha da verificação
+    target = state or initial
+    if target is not None:
+        session.restore(target)
+
+def _verify_batch(checks: List[Tuple[int, str]], cwd: str, timeout_s: float, max_output_bytes: int,
+                  states: Dict[int, ShellState]) -> List[VerifyResult]:
+    with ShellSession(cwd) as session:
+        initial = session.state() if states else None
+        out = []
+        for step_index, expects_cmd in checks:
+            _check_in_state(session, initial, states.get(step_index))
+            rc, so, se = session.run(_check_line(expects_cmd), timeout_s=timeout_s, max_output_bytes=max_output_bytes)
+            out.append(VerifyResult(step_index, expects_cmd, rc, so, se))
+        return out
+
+def _verify_concurrent(checks: List[Tuple[int, str]], cwd: str, max_workers: int, timeout_s: float,
+                       max_output_bytes: int, states: Dict[int, ShellState]) -> List[VerifyResult]:
+    local = threading.local()
+    sessions: List[ShellSession] = []
+    sessions_lock = threading.Lock()
+
+    def check(item: Tuple[int, str]) -> VerifyResult:
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = ShellSession(cwd)
+            with sessions_lock:
+                sessions.append(session)
+            local.initial = session.state() if states else None
+        _check_in_state(session, local.initial, states.get(item[0]))
+        rc, so, se = session.run(_check_line(item[1]), timeout_s=timeout_s, max_output_bytes=max_output_bytes)
+        return VerifyResult(item[0], item[1], rc, so, se)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(checks)))) as pool:
+            return list(pool.map(bind(check), checks))
+    finally:
+        for session in sessions:
+            session.close()
+
+def reverify_episode(exec_records: List[Dict], cwd: str, mode: str = "batch", max_workers: int = 4,
+                     timeout_s: float = 60) -> List[VerifyResult]:
+    # "re-verificar tudo" de um episódio já executado (exec_json salvo); pula passos não executados
+    checks = [
+        (int(r["step_index"]), r["expects_cmd"])
+        for r in exec_records
+        if r.get("expects_cmd") and r.get("rc") not in (RC_SUDO_SKIPPED, RC_CANCELLED)
+    ]
+    return verify_expects(checks, cwd, mode=mode, max_workers=max_workers, timeout_s=timeout_s)
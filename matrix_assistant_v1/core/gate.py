@@ -1,6 +1,7 @@
 from __future__ import annotations
 import re
-from typing import List, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
 from .schemas import Patch, AuditReport
 
 BANNED_PATTERNS = [
@@ -12,11 +13,69 @@ BANNED_PATTERNS = [
 
 CRITICAL_PATH_PREFIXES = ("/etc", "/usr", "/var", "/bin", "/sbin", "/root")
 
+# nomes das regras não-regex (para os dados de hits do analyze_patches)
+RULE_ABSOLUTE_MANIFEST = "absolute_manifest"
+RULE_STEP_ORDER = "step_order"
+RULE_SUDO = "sudo"
+RULE_CRITICAL_PATH = "critical_path"
+RULE_OUTSIDE_WORKSPACE = "outside_workspace"
+RULE_DEPENDS_ON = "depends_on"
+
 def is_absolute_path(p: str) -> bool:
     return p.startswith("/")
 
-def analyze_patch(patch: Patch, workspace_root: str) -> AuditReport:
+class GateRuleset:
+    """Regras do gate compiladas uma única vez.
+
+    Os padrões banidos viram um único regex com grupos nomeados (b0, b1, ...): um comando
+    limpo (caso comum) custa uma só varredura, independente do número de regras.
+    """
+
+    def __init__(self, banned_patterns: Sequence[str] = BANNED_PATTERNS,
+                 critical_prefixes: Sequence[str] = CRITICAL_PATH_PREFIXES):
+        self.banned_patterns = list(banned_patterns)
+        self.critical_prefixes = tuple(critical_prefixes)
+        self._banned = [re.compile(p) for p in self.banned_patterns]
+        self._combined = re.compile("|".join(f"(?P<b{i}>{p})" for i, p in enumerate(self.banned_patterns))) if self.banned_patterns else None
+        self._critical = re.compile("|".join(re.escape(p) for p in self.critical_prefixes)) if self.critical_prefixes else None
+        self._abs_path = re.compile(r"(/[^\s]+)")
+
+    def banned_hits(self, cmd: str) -> List[str]:
+        # devolve os padrões que casam com cmd, na ordem de BANNED_PATTERNS
+        if self._combined is None:
+            return []
+        hit = {int(m.lastgroup[1:]) for m in self._combined.finditer(cmd)}
+        if not hit:
+            return []
+        # alternância só reporta um grupo por posição: confirma as demais regras individualmente
+        hit.update(i for i, rx in enumerate(self._banned) if i not in hit and rx.search(cmd))
+        return [self.banned_patterns[i] for i in sorted(hit)]
+
+    def touches_critical(self, cmd: str) -> bool:
+        return self._critical is not None and self._critical.search(cmd) is not None
+
+    def absolute_paths(self, cmd: str) -> List[str]:
+        return self._abs_path.findall(cmd)
+
+DEFAULT_RULESET = GateRuleset()
+
+@dataclass
+class RuleHit:
+    patch_index: int
+    step_index: Optional[int]
+    detail: str
+
+@dataclass
+class BatchAudit:
+    reports: List[AuditReport]
+    rule_hits: Dict[str, List[RuleHit]] = field(default_factory=dict)
+
+    def hit_counts(self) -> Dict[str, int]:
+        return {rule: len(hits) for rule, hits in self.rule_hits.items()}
+
+def _analyze(patch: Patch, workspace_root: str, ruleset: GateRuleset) -> Tuple[AuditReport, List[Tuple[str, Optional[int], str]]]:
     reasons: List[str] = []
+    hits: List[Tuple[str, Optional[int], str]] = []
     blocked = False
     needs_user_review = False
     needs_sudo_review = False
@@ -25,45 +84,78 @@ def analyze_patch(patch: Patch, workspace_root: str) -> AuditReport:
     for f in patch.manifest.files:
         if is_absolute_path(f):
             reasons.append(f"Arquivo no manifest é absoluto: {f}")
+            hits.append((RULE_ABSOLUTE_MANIFEST, None, f))
             needs_user_review = True
 
+    check_workspace = bool(workspace_root) and is_absolute_path(workspace_root)
+
     # commands checks
     last_idx = 0
+    earlier = set()
     for c in patch.commands:
         if c.step_index <= last_idx:
             reasons.append("step_index não é estritamente crescente")
+            hits.append((RULE_STEP_ORDER, c.step_index, str(c.step_index)))
             blocked = True
         last_idx = c.step_index
 
+        # DAG: dependências só podem apontar para passos anteriores (garante ausência de ciclos)
+        for d in c.depends_on or ():
+            if d not in earlier:
+                reasons.append(f"depends_on do passo {c.step_index} referencia passo inexistente ou posterior: {d}")
+                hits.append((RULE_DEPENDS_ON, c.step_index, str(d)))
+                blocked = True
+        earlier.add(c.step_index)
+
         cmd = c.cmd.strip()
         if c.privilege == "sudo" or cmd.startswith("sudo "):
             needs_sudo_review = True
+            hits.append((RULE_SUDO, c.step_index, cmd))
 
         # block dangerous patterns
-        for pat in BANNED_PATTERNS:
-            if re.search(pat, cmd):
-                blocked = True
-                reasons.append(f"Comando bloqueado por padrão perigoso: {pat}")
+        for pat in ruleset.banned_hits(cmd):
+            blocked = True
+            reasons.append(f"Comando bloqueado por padrão perigoso: {pat}")
+            hits.append((pat, c.step_index, cmd))
         # critical path writes hint
-        if any(cmd.find(pref) != -1 for pref in CRITICAL_PATH_PREFIXES):
+        if ruleset.touches_critical(cmd):
             needs_user_review = True
             reasons.append("Comando toca em caminho crítico do sistema (revisão obrigatória).")
+            hits.append((RULE_CRITICAL_PATH, c.step_index, cmd))
 
         # workspace hint: if writing outside workspace, review
-        if workspace_root and is_absolute_path(workspace_root):
+        if check_workspace and "/" in cmd:
             # heurística: se comando contém caminho absoluto fora do workspace
-            m = re.findall(r"(/[^\s]+)", cmd)
-            for path in m:
-                if path.startswith("/") and (not path.startswith(workspace_root)):
+            for path in ruleset.absolute_paths(cmd):
+                if not path.startswith(workspace_root):
                     # ignore common binaries like /usr/bin/...
-                    if path.startswith(CRITICAL_PATH_PREFIXES):
+                    if path.startswith(ruleset.critical_prefixes):
                         continue
                     needs_user_review = True
                     reasons.append(f"Comando referencia caminho fora do workspace: {path}")
+                    hits.append((RULE_OUTSIDE_WORKSPACE, c.step_index, path))
 
-    return AuditReport(
+    report = AuditReport(
         needs_user_review=needs_user_review,
         needs_sudo_review=needs_sudo_review,
         blocked=blocked,
         reasons=reasons,
     )
+    return report, hits
+
+def analyze_patch(patch: Patch, workspace_root: str, ruleset: Optional[GateRuleset] = None) -> AuditReport:
+    return _analyze(patch, workspace_root, ruleset or DEFAULT_RULESET)[0]
+
+def analyze_patches(patches: Iterable[Union[Patch, dict]], workspace_root: str,
+                    ruleset: Optional[GateRuleset] = None) -> BatchAudit:
+    """Reaudita muitos patches com o mesmo ruleset; devolve os relatórios e os hits por regra."""
+    ruleset = ruleset or DEFAULT_RULESET
+    batch = BatchAudit(reports=[])
+    for i, patch in enumerate(patches):
+        if not isinstance(patch, Patch):
+            patch = Patch.model_validate(patch)
+        report, hits = _analyze(patch, workspace_root, ruleset)
+        batch.reports.append(report)
+        for rule, step_index, detail in hits:
+            batch.rule_hits.setdefault(rule, []).append(RuleHit(i, step_index, detail))
+    return batch
@@ -0,0 +1,430 @@
+from __future__ import annotations
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, List, Optional
+
+from .cache import ResponseCache
+from .executor import execute_commands
+from .memory import EpisodeStore, get_store
+from .metrics import compute_sfc
+from .orchestrator import run_pipeline
+from .replay import ReplayIndex
+from .tracing import TRACE_ENABLED, merge_traces, tracing
+
+JOBS_SCHEMA_SQL = (
+    """CREATE TABLE IF NOT EXISTS jobs (
+  id TEXT PRIMARY KEY,
+  kind TEXT NOT NULL,
+  title TEXT,
+  owner TEXT,
+  pid INTEGER,
+  status TEXT NOT NULL,
+  stage TEXT,
+  progress REAL NOT NULL DEFAULT 0,
+  partial_json TEXT,
+  result_json TEXT,
+  error TEXT,
+  created_at REAL NOT NULL,
+  started_at REAL,
+  finished_at REAL
+)""",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_owner_created ON jobs(owner, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)",
+)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+
+JOB_COLUMNS = ("id", "kind", "title", "owner", "status", "stage", "progress", "partial_json", "result_json", "error",
+               "created_at", "started_at", "finished_at")
+
+# jobs terminados mantidos em memória com o resultado completo (o DB guarda só o resumo)
+FINISHED_KEEP = 64
+SUMMARY_STR_MAX = 200
+
+def result_summary(result: Any) -> Any:
+    """O que vai para result_json de um job terminado: episode_id e os valores simples do topo.
+
+    Plano, patch, saída e trace já estão no episódio (blobs comprimidos); repetir tudo em
+    cada linha de `jobs` fazia o DB crescer de novo. `load_result` remonta a partir do episódio.
+    """
+    def simple(v: Any) -> bool:
+        return v is None or isinstance(v, (bool, int, float)) or (isinstance(v, str) and len(v) <= SUMMARY_STR_MAX)
+
+    if not isinstance(result, dict):
+        return result if simple(result) else None
+    out = {k: v for k, v in result.items() if simple(v)}
+    if isinstance(result.get("audit"), dict) and "blocked" in result["audit"]:
+        out["blocked"] = bool(result["audit"]["blocked"])
+    if len(out) < len(result):
+        out["summary"] = True
+    return out
+
+def load_result(store: EpisodeStore, job: "Job") -> Optional[Dict[str, Any]]:
+    """Resultado completo de um job de pipeline/execução; do episódio se o DB só tem o resumo.
+
+    None quando não dá para remontar (PLANO+PATCH não bloqueado, de outro processo: nunca virou episódio).
+    """
+    result = job.result
+    if not isinstance(result, dict) or not result.get("summary"):
+        return result
+    ep = store.get(result["episode_id"]) if result.get("episode_id") else None
+    if ep is None:
+        return None
+    if job.kind == "exec":
+        return {"exec": ep.get("exec") or [], "success": bool(ep["success"]), "sfc": (ep.get("metrics") or {}).get("SFC"),
+                "episode_id": ep["id"], "trace": ep.get("trace")}
+    return {"plan": ep.get("plan"), "patch": ep.get("patch"), "audit": ep.get("audit"), "metrics": ep.get("metrics") or {},
+            "model_used": ep.get("model_used"), "trace": ep.get("trace"), "llm_calls": store.llm_calls(ep["id"]),
+            "episode_id": ep["id"]}
+
+def prune_jobs(con, finished_before: float, batch: int = 500) -> int:
+    """Apaga até `batch` jobs terminados antes de `finished_before` (epoch); ativos nunca."""
+    if con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='jobs'").fetchone() is None:
+        return 0
+    return con.execute(
+        "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status NOT IN (?,?) AND finished_at < ? LIMIT ?)",
+        (*ACTIVE, finished_before, batch),
+    ).rowcount
+
+def run_pipeline_recorded(db_path: str, base_url: str, api_key: str, model: str, objective: str, workspace_root: str,
+                          **kwargs: Any) -> Dict[str, Any]:
+    """run_pipeline; se o gate bloquear, o resultado também vira episódio (e ganha episode_id).
+
+    Com tracing ligado (MATRIX_TRACE) o resultado leva "trace": spans das etapas, que seguem
+    com o episódio (inclusive para execute_recorded, via episode["trace"]).
+    """
+    with (tracing() if TRACE_ENABLED else nullcontext()) as trace:
+        result = run_pipeline(base_url, api_key, model, objective, workspace_root, **kwargs)
+    if trace is not None:
+        result["trace"] = trace.to_dict()
+    if result["audit"]["blocked"]:
+        # bloqueios do gate também são episódios (taxa de bloqueio no painel de saúde)
+        result["episode_id"] = get_store(db_path).save({
+            "user_input": objective,
+            "plan": result["plan"],
+            "patch": result["patch"],
+            "audit": result["audit"],
+            "model_used": result.get("model_used"),
+            "metrics": result["metrics"],
+            "trace": result.get("trace"),
+            "llm_calls": result.get("llm_calls"),
+        })
+    return result
+
+def execute_recorded(db_path: str, commands, cwd: str, episode: Dict[str, Any], allow_sudo_exec: bool = False,
+                     verify: str = "inline", on_output=None) -> Dict[str, Any]:
+    """
+    Executa comandos já aprovados e grava o episódio. `episode` traz user_input/plan/patch/
+    audit/model_used/metrics/had_sudo (e trace/llm_calls da geração, se houver); devolve exec, success,
+    sfc, episode_id e o trace combinado geração + execução.
+    """
+    with (tracing() if TRACE_ENABLED else nullcontext()) as trace:
+        results = execute_commands(commands, cwd=cwd, allow_sudo_exec=allow_sudo_exec, on_output=on_output, verify=verify)
+    trace_data = merge_traces(episode.get("trace"), trace.to_dict() if trace is not None else None)
+    exec_data = [r.__dict__ for r in results]
+    success = bool(results) and all((r.rc == 0 and r.expects_rc == 0) for r in results)
+
+    # métricas simples
+    SS_local = 100.0 if success else 50.0
+    IEC = 50.0
+    IRO_total = 5.0 if success else 50.0
+    sfc = compute_sfc(SS_local, IEC, IRO_total)
+
+    episode_id = get_store(db_path).save({
+        **episode,
+        "exec": exec_data,
+        "approved": True,
+        "success": success,
+        "metrics": {**(episode.get("metrics") or {}), "SS_local": SS_local, "IEC": IEC,
+                    "IRO_total": IRO_total, "SFC": sfc},
+        "trace": trace_data,
+    })
+    return {"exec": exec_data, "success": success, "sfc": sfc, "episode_id": episode_id, "trace": trace_data}
+
+class JobCancelled(Exception):
+    """Levantada dentro do job quando alguém pediu o cancelamento."""
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    title: str
+    owner: Optional[str]
+    status: str
+    stage: str = ""
+    progress: float = 0.0
+    # saída parcial ao vivo (tokens do PLANO/PATCH, tail da execução)
+    partial: Dict[str, Any] = field(default_factory=dict)
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE
+
+def _job_from_row(row) -> Job:
+    d = dict(zip(JOB_COLUMNS, row))
+    partial, result = d.pop("partial_json"), d.pop("result_json")
+    return Job(**d, partial=json.loads(partial) if partial else {}, result=json.loads(result) if result else None)
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobContext:
+    """O que a função do job enxerga: progresso, saída parcial e o pedido de cancelamento."""
+
+    def __init__(self, manager: "JobManager", job: Job):
+        self._manager = manager
+        self._job = job
+        self._cancel = threading.Event()
+        self._last_flush = 0.0
+
+    @property
+    def job_id(self) -> str:
+        return self._job.id
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self) -> None:
+        if self._cancel.is_set():
+            raise JobCancelled(self._job.id)
+
+    def update(self, stage: Optional[str] = None, progress: Optional[float] = None, **partial: Any) -> None:
+        """Atualiza o estado ao vivo (leitura imediata no processo); no DB no máximo a cada flush_s."""
+        with self._manager._lock:
+            if stage is not None and stage != self._job.stage:
+                self._job.stage = stage
+                self._last_flush = 0.0  # troca de etapa vai logo para o DB
+            if progress is not None:
+                self._job.progress = max(0.0, min(1.0, progress))
+            self._job.partial.update(partial)
+        now = time.monotonic()
+        if now - self._last_flush >= self._manager.flush_s:
+            self._last_flush = now
+            self._manager._persist(self._job)
+
+class JobManager:
+    """Fila local de jobs (pipeline, execução) rodando num pool de threads.
+
+    Estado e progresso ficam na tabela `jobs` do DB de episódios (escritas pela thread
+    escritora do EpisodeStore), então a UI reconecta a um job pelo id depois de um rerun
+    ou de recarregar a página. Enquanto o job roda, a leitura vem da cópia em memória
+    (tokens ao vivo sem esperar o DB). Jobs de um processo que morreu viram `failed`.
+    Terminado, o job fica no DB só com o resumo do resultado (sem a saída parcial); os
+    FINISHED_KEEP últimos continuam completos em memória. `prune_jobs` (chamado pela
+    manutenção) apaga os antigos.
+    """
+
+    def __init__(self, store: EpisodeStore, max_workers: int = 2, flush_s: float = 0.5):
+        self.store = store
+        self.flush_s = flush_s
+        self._lock = threading.Lock()
+        self._live: Dict[str, Job] = {}
+        self._finished: "OrderedDict[str, Job]" = OrderedDict()
+        self._contexts: Dict[str, JobContext] = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        store.write(self._init_schema)
+
+    @staticmethod
+    def _init_schema(con) -> None:
+        for sql in JOBS_SCHEMA_SQL:
+            con.execute(sql)
+        # jobs ativos de processos que já morreram nunca vão terminar
+        orphans = [r[0] for r in con.execute("SELECT DISTINCT pid FROM jobs WHERE status IN (?,?)", ACTIVE)
+                   if r[0] != os.getpid() and not _pid_alive(r[0])]
+        for pid in orphans:
+            con.execute(
+                "UPDATE jobs SET status=?, error=?, finished_at=? WHERE pid=? AND status IN (?,?)",
+                (FAILED, "Interrompido: o processo que rodava o job terminou.", time.time(), pid, *ACTIVE),
+            )
+
+    # ---------------- submissão ----------------
+    def submit(self, kind: str, title: str, fn: Callable[[JobContext], Any], owner: Optional[str] = None) -> str:
+        """Enfileira fn(ctx); o retorno (serializável em JSON) vira o resultado do job. Devolve o id."""
+        job = Job(id=secrets.token_hex(8), kind=kind, title=title, owner=owner, status=QUEUED, created_at=time.time())
+        ctx = JobContext(self, job)
+        with self._lock:
+            self._live[job.id] = job
+            self._contexts[job.id] = ctx
+        self._persist(job, insert=True)
+        self._pool.submit(self._run, ctx, fn)
+        return job.id
+
+    def _run(self, ctx: JobContext, fn: Callable[[JobContext], Any]) -> None:
+        job = ctx._job
+        try:
+            with self._lock:
+                if ctx.cancelled:
+                    raise JobCancelled(job.id)
+                job.status, job.started_at = RUNNING, time.time()
+            self._persist(job)
+            result = fn(ctx)
+            with self._lock:
+                job.status, job.result, job.progress = DONE, result, 1.0
+        except JobCancelled:
+            with self._lock:
+                job.status = CANCELLED
+        except Exception as e:
+            with self._lock:
+                job.status, job.error = FAILED, f"{type(e).__name__}: {e}"
+        with self._lock:
+            job.finished_at = time.time()
+            self._finished[job.id] = job
+            while len(self._finished) > FINISHED_KEEP:
+                self._finished.popitem(last=False)
+        try:
+            self._persist(job)
+        finally:
+            with self._lock:
+                self._live.pop(job.id, None)
+                self._contexts.pop(job.id, None)
+
+    def _persist(self, job: Job, insert: bool = False) -> None:
+        with self._lock:
+            active = job.status in ACTIVE
+            # terminado: sem saída parcial e só o resumo do resultado (o conteúdo está no episódio)
+            partial = job.partial if active else None
+            result = job.result if active else result_summary(job.result)
+            row = (job.kind, job.title, job.owner, os.getpid(), job.status, job.stage, job.progress,
+                   json.dumps(partial, ensure_ascii=False) if partial else None,
+                   json.dumps(result, ensure_ascii=False) if result is not None else None,
+                   job.error, job.created_at, job.started_at, job.finished_at, job.id)
+        if insert:
+            sql = ("INSERT INTO jobs (kind, title, owner, pid, status, stage, progress, partial_json, result_json, error, "
+                   "created_at, started_at, finished_at, id) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)")
+        else:
+            sql = ("UPDATE jobs SET kind=?, title=?, owner=?, pid=?, status=?, stage=?, progress=?, partial_json=?, "
+                   "result_json=?, error=?, created_at=?, started_at=?, finished_at=? WHERE id=?")
+        # o job termina só depois do estado final gravado; as atualizações de progresso não esperam
+        fut = self.store.submit(lambda con: con.execute(sql, row))
+        if not active:
+            fut.result()
+
+    # ---------------- consulta ----------------
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._live.get(job_id) or self._finished.get(job_id)
+            if job is not None:
+                return replace(job, partial=dict(job.partial))
+        row = self.store.reader().execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id=?", (job_id,)
+        ).fetchone()
+        return _job_from_row(tuple(row)) if row else None
+
+    def list(self, owner: Optional[str] = None, active_only: bool = False, limit: int = 20) -> List[Job]:
+        """Jobs mais recentes primeiro (os em andamento deste processo com o estado ao vivo)."""
+        where, args = [], []
+        if owner is not None:
+            where.append("owner = ?")
+            args.append(owner)
+        if active_only:
+            where.append("status IN (?,?)")
+            args.extend(ACTIVE)
+        sql = f"SELECT id FROM jobs {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY created_at DESC LIMIT ?"
+        ids = [r[0] for r in self.store.reader().execute(sql, (*args, limit))]
+        return [job for job in map(self.get, ids) if job is not None]
+
+    def cancel(self, job_id: str) -> bool:
+        """Pede o cancelamento: na fila sai antes de rodar; rodando, para no próximo check_cancelled()."""
+        with self._lock:
+            ctx = self._contexts.get(job_id)
+            if ctx is None:
+                return False
+            ctx._cancel.set()
+            return True
+
+    def wait(self, job_id: str, timeout: Optional[float] = None, poll_s: float = 0.05) -> Optional[Job]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or not job.active or (deadline is not None and time.monotonic() >= deadline):
+                return job
+            time.sleep(poll_s)
+
+    def close(self, wait: bool = True) -> None:
+        for ctx in list(self._contexts.values()):
+            ctx._cancel.set()
+        self._pool.shutdown(wait=wait)
+
+    # ---------------- jobs prontos ----------------
+    def submit_pipeline(self, db_path: str, base_url: str, api_key: str, model: str, objective: str, workspace_root: str,
+                        stream: bool = True, cache: Optional[ResponseCache] = None, bypass_cache: bool = False,
+                        replay: Optional[ReplayIndex] = None, owner: Optional[str] = None) -> str:
+        """PLANO + PATCH + gate em segundo plano (run_pipeline_recorded)."""
+
+        def fn(ctx: JobContext) -> Dict[str, Any]:
+            bufs = {"plan": "", "patch": ""}
+            ctx.update(stage="plan", progress=0.05)
+
+            def on_token(stage: str, token: str) -> None:
+                ctx.check_cancelled()
+                bufs[stage] += token
+                ctx.update(stage=stage, progress=0.1 if stage == "plan" else 0.5, **{stage: bufs[stage]})
+
+            return run_pipeline_recorded(db_path, base_url, api_key, model, objective, workspace_root,
+                                         on_token=on_token if stream else None, cache=cache,
+                                         bypass_cache=bypass_cache, replay=replay)
+
+        return self.submit("pipeline", objective, fn, owner)
+
+    def submit_execution(self, db_path: str, commands, cwd: str, episode: Dict[str, Any],
+                         allow_sudo_exec: bool = False, verify: str = "inline", tail_lines: int = 40,
+                         owner: Optional[str] = None) -> str:
+        """
+        execute_recorded em segundo plano (o resultado é o dele). O cancelamento só vale enquanto
+        o job está na fila (comandos em andamento não são interrompidos).
+        """
+        commands = list(commands)
+
+        def fn(ctx: JobContext) -> Dict[str, Any]:
+            tail: deque = deque(maxlen=tail_lines)
+            started = set()
+            ctx.update(stage="exec", progress=0.0, tail=[])
+
+            def on_output(step_index: int, stream: str, line: str) -> None:
+                tail.append(f"[{step_index}{'!' if stream.endswith('stderr') else ''}] {line}")
+                started.add(step_index)
+                # aprox.: passos que já produziram saída
+                ctx.update(progress=len(started) / (len(commands) + 1), tail=list(tail))
+
+            return execute_recorded(db_path, commands, cwd, episode, allow_sudo_exec=allow_sudo_exec,
+                                    verify=verify, on_output=on_output)
+
+        return self.submit("exec", episode.get("user_input", ""), fn, owner)
+
+# um gerenciador por DB no processo (Streamlit: compartilhado entre reruns e sessões)
+_managers: Dict[str, JobManager] = {}
+_managers_lock = threading.Lock()
+
+def get_job_manager(db_path: str, max_workers: int = 2) -> JobManager:
+    key = os.path.realpath(db_path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = JobManager(get_store(db_path), max_workers=max_workers)
+        return manager
@@ -0,0 +1,162 @@
+from __future__ import annotations
+import bisect
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .schemas import Plan
+
+RISK = "risk"
+VAGUE = "vague"
+
+# conjuntos por idioma: palavras que indicam risco (mexe no sistema) e que indicam plano vago
+KEYWORD_SETS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "pt": {
+        RISK: ("sudo", "/etc", "firewall", "porta", "systemctl", "kernel", "driver"),
+        VAGUE: ("talvez", "aprox", "aproximadamente", "pode", "se necessário", "não aplicável", "not applicable"),
+    },
+    "en": {
+        RISK: ("sudo", "/etc", "firewall", "port", "systemctl", "kernel", "driver"),
+        VAGUE: ("maybe", "approx", "approximately", "might", "if needed", "if necessary", "not applicable", "tbd"),
+    },
+}
+
+@dataclass
+class KeywordHit:
+    keyword: str
+    kind: str
+    path: str
+    offset: int
+
+@dataclass
+class PlanScan:
+    hits: List[KeywordHit] = field(default_factory=list)
+    # índices das tarefas com termo vago em actions/success_criteria
+    ambiguous_tasks: Set[int] = field(default_factory=set)
+    # conjunto(s) de palavras-chave usados na varredura ("pt", "en", "pt+en")
+    locale: str = "pt"
+
+    def has(self, kind: str) -> bool:
+        return any(h.kind == kind for h in self.hits)
+
+    def keywords(self, kind: str) -> List[str]:
+        return sorted({h.keyword for h in self.hits if h.kind == kind})
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    # alternância em forma de trie (prefixos comuns fatorados): o regex testa um ramo por
+    # caractere em vez de todas as palavras em cada posição; o opcional guloso casa a mais longa
+    root: Dict[str, dict] = {}
+    for w in words:
+        node = root
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        alts = [re.escape(ch) + build(sub) for ch, sub in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(root)
+
+class KeywordScanner:
+    """Casamento de várias palavras-chave numa única varredura (regex compilado uma vez).
+
+    A busca recomeça uma posição após o início de cada ocorrência (sobrepostas também casam)
+    e as palavras que são prefixo da encontrada são reportadas junto (ex.: "aprox" dentro de
+    "aproximadamente").
+    """
+
+    def __init__(self, sets: Dict[str, Sequence[str]]):
+        self.kinds: Dict[str, List[str]] = {}
+        for kind, words in sets.items():
+            for w in words:
+                if not w:
+                    continue
+                kinds = self.kinds.setdefault(w.lower(), [])
+                if kind not in kinds:
+                    kinds.append(kind)
+        self._rx = re.compile(_trie_pattern(self.kinds)) if self.kinds else None
+        # palavra encontrada -> palavras que são prefixo dela (casam na mesma posição)
+        self._prefixes = {w: [p for p in self.kinds if w.startswith(p)] for w in self.kinds}
+
+    def scan(self, text: str) -> Iterable[Tuple[str, str, int]]:
+        """(palavra, tipo, posição) para cada ocorrência em text (já em minúsculas)."""
+        if self._rx is None:
+            return
+        search = self._rx.search
+        m = search(text)
+        while m is not None:
+            for word in self._prefixes[m.group()]:
+                for kind in self.kinds[word]:
+                    yield word, kind, m.start()
+            # recomeça logo após o início (não após o fim): pega ocorrências sobrepostas
+            m = search(text, m.start() + 1)
+
+_scanners: Dict[str, KeywordScanner] = {}
+
+def get_scanner(locale: str = "pt") -> KeywordScanner:
+    # locale pode combinar conjuntos: "pt+en"
+    scanner = _scanners.get(locale)
+    if scanner is None:
+        merged: Dict[str, List[str]] = {}
+        for loc in locale.split("+"):
+            if loc not in KEYWORD_SETS:
+                raise ValueError(f"Locale sem conjunto de palavras-chave: {loc}")
+            for kind, words in KEYWORD_SETS[loc].items():
+                merged.setdefault(kind, []).extend(words)
+        scanner = _scanners[locale] = KeywordScanner(merged)
+    return scanner
+
+# separa os campos no texto único; nenhuma palavra-chave contém este caractere
+_SEP = "\x00"
+
+def scan_plan(plan: Plan, locale: str = "pt", scanner: Optional[KeywordScanner] = None) -> PlanScan:
+    """Varre todos os campos de texto do plano numa só passada, sem serializar o plano.
+
+    Os campos são concatenados (minúsculos) com um separador e mapeados de volta por offset.
+    actions + success_criteria de cada tarefa formam um bloco único unido por espaço, onde
+    termos vagos contam (termos de várias palavras podem atravessar a fronteira entre ações).
+    """
+    scanner = scanner or get_scanner(locale)
+    chunks: List[str] = []
+    starts: List[int] = []
+    ends: List[int] = []
+    paths: List[str] = []
+    vague_task: List[Optional[int]] = []  # tarefa dona do bloco onde termos vagos contam
+    pos = 0
+
+    def add(text: str, path: str, task: Optional[int] = None, sep: str = _SEP) -> None:
+        nonlocal pos
+        chunks.append(text + sep)
+        starts.append(pos)
+        ends.append(pos + len(text))
+        paths.append(path)
+        vague_task.append(task)
+        pos += len(text) + 1
+
+    for i, t in enumerate(plan.tasks):
+        add(t.task_id.lower(), f"tasks[{i}].task_id")
+        add(t.objective.lower(), f"tasks[{i}].objective")
+        for j, a in enumerate(t.actions):
+            add(a.lower(), f"tasks[{i}].actions[{j}]", i, " ")
+        add(t.success_criteria.lower(), f"tasks[{i}].success_criteria", i)
+    for j, c in enumerate(plan.constraints):
+        add(c.lower(), f"constraints[{j}]")
+    for j, a in enumerate(plan.artifacts):
+        add(a.lower(), f"artifacts[{j}]")
+
+    result = PlanScan(locale=locale)
+    for word, kind, at in scanner.scan("".join(chunks)):
+        k = bisect.bisect_right(starts, at) - 1
+        if kind == VAGUE:
+            # vago só conta em actions/success_criteria
+            if vague_task[k] is None:
+                continue
+            result.ambiguous_tasks.add(vague_task[k])
+        elif at + len(word) > ends[k]:
+            continue  # risco é por campo: não atravessa o espaço entre ações
+        result.hits.append(KeywordHit(word, kind, paths[k], at - starts[k]))
+    return result
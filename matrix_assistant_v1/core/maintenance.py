@@ -0,0 +1,248 @@
+# Manutenção do DB de episódios: rollup diário, retenção, jobs antigos, GC de blobs e vacuum incremental.
+#
+#   python -m core.maintenance --db ~/assistant_workspace/matrix_assistant.db --retention-days 30
+#
+# Pode rodar com o app aberto: todo trabalho é feito em lotes pequenos, cada um numa
+# transação curta (WAL: leitores nunca são bloqueados; escritores esperam via busy_timeout).
+from __future__ import annotations
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from .blobs import decode_blob, encode_payload
+from .jobs import prune_jobs
+from .memory import HASH_COLUMNS, INSERT_BLOB_SQL, EpisodeStore, get_store
+
+ROLLUP_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS episode_daily (
+  day TEXT NOT NULL,
+  model_used TEXT NOT NULL,
+  episodes INTEGER NOT NULL DEFAULT 0,
+  approved INTEGER NOT NULL DEFAULT 0,
+  successes INTEGER NOT NULL DEFAULT 0,
+  sudo INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, model_used)
+) WITHOUT ROWID;
+"""
+
+ROLLUP_UPSERT_SQL = """INSERT INTO episode_daily (day, model_used, episodes, approved, successes, sudo)
+VALUES (?,?,?,?,?,?)
+ON CONFLICT(day, model_used) DO UPDATE SET
+  episodes = episodes + excluded.episodes,
+  approved = approved + excluded.approved,
+  successes = successes + excluded.successes,
+  sudo = sudo + excluded.sudo"""
+
+# episodes.rolled_up: 0 = pendente, 1 = contado no rollup, 2 = contado e com exec enxugado
+ROLLUP_PENDING = 0
+ROLLUP_DONE = 1
+ROLLUP_STRIPPED = 2
+
+# campos volumosos de cada passo do exec_json removidos no modo "strip"
+STRIPPED_EXEC_FIELDS = ("stdout", "stderr", "expects_stdout", "expects_stderr")
+
+@dataclass
+class MaintenanceReport:
+    rolled_up: int = 0
+    stripped: int = 0
+    dropped: int = 0
+    jobs_deleted: int = 0
+    blobs_deleted: int = 0
+    pages_before: int = 0
+    pages_after: int = 0
+    page_size: int = 0
+    freelist_after: int = 0
+    vacuum_mode: str = ""
+    elapsed_s: float = 0.0
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return max(0, self.pages_before - self.pages_after) * self.page_size
+
+    def to_dict(self) -> Dict[str, object]:
+        d = asdict(self)
+        d["bytes_reclaimed"] = self.bytes_reclaimed
+        return d
+
+def _rollup_batch(con: sqlite3.Connection, cutoff: str, batch: int) -> int:
+    rows = con.execute(
+        "SELECT id, substr(created_at, 1, 10), COALESCE(model_used, ''), approved, success, had_sudo "
+        "FROM episodes WHERE rolled_up = ? AND created_at < ? ORDER BY created_at LIMIT ?",
+        (ROLLUP_PENDING, cutoff, batch),
+    ).fetchall()
+    agg: Dict[Tuple[str, str], List[int]] = {}
+    for _, day, model, approved, success, sudo in rows:
+        a = agg.setdefault((day, model), [0, 0, 0, 0])
+        a[0] += 1
+        a[1] += 1 if approved else 0
+        a[2] += 1 if success else 0
+        a[3] += 1 if sudo else 0
+    con.executemany(ROLLUP_UPSERT_SQL, [(day, model, *a) for (day, model), a in agg.items()])
+    con.executemany("UPDATE episodes SET rolled_up = ? WHERE id = ?", [(ROLLUP_DONE, r[0]) for r in rows])
+    return len(rows)
+
+def _strip_exec(steps) -> object:
+    if not isinstance(steps, list):
+        return steps
+    out = []
+    for step in steps:
+        if isinstance(step, dict):
+            step = {k: v for k, v in step.items() if k not in STRIPPED_EXEC_FIELDS}
+            step["output_stripped"] = True
+        out.append(step)
+    return out
+
+def _strip_batch(con: sqlite3.Connection, cutoff: str, batch: int) -> int:
+    rows = con.execute(
+        "SELECT e.id, e.exec_json, b.codec, b.data FROM episodes e LEFT JOIN blobs b ON b.hash = e.exec_hash "
+        "WHERE e.rolled_up = ? AND e.created_at < ? LIMIT ?",
+        (ROLLUP_DONE, cutoff, batch),
+    ).fetchall()
+    for eid, legacy, codec, data in rows:
+        if data is not None:
+            steps = decode_blob(codec, data)
+        else:
+            steps = json.loads(legacy) if legacy else None
+        exec_hash = None
+        if steps:
+            blob = encode_payload(_strip_exec(steps))
+            con.execute(INSERT_BLOB_SQL, blob)
+            exec_hash = blob[0]
+        con.execute(
+            "UPDATE episodes SET exec_hash = ?, exec_json = NULL, rolled_up = ? WHERE id = ?",
+            (exec_hash, ROLLUP_STRIPPED, eid),
+        )
+    return len(rows)
+
+def _drop_batch(con: sqlite3.Connection, cutoff: str, batch: int) -> int:
+    return con.execute(
+        "DELETE FROM episodes WHERE id IN (SELECT id FROM episodes WHERE rolled_up >= ? AND created_at < ? LIMIT ?)",
+        (ROLLUP_DONE, cutoff, batch),
+    ).rowcount
+
+def _gc_blobs(con: sqlite3.Connection) -> int:
+    refs = " UNION ".join(f"SELECT {c} FROM episodes WHERE {c} IS NOT NULL" for c in HASH_COLUMNS)
+    return con.execute(f"DELETE FROM blobs WHERE hash NOT IN ({refs})").rowcount
+
+def _pages(con: sqlite3.Connection) -> Tuple[int, int, int]:
+    return (
+        con.execute("PRAGMA page_count").fetchone()[0],
+        con.execute("PRAGMA freelist_count").fetchone()[0],
+        con.execute("PRAGMA page_size").fetchone()[0],
+    )
+
+def incremental_vacuum(db_path: str, budget_s: float = 2.0, slice_pages: int = 256, full: bool = False) -> str:
+    """Devolve páginas livres ao SO em fatias curtas até esvaziar a freelist ou estourar `budget_s`.
+
+    Com auto_vacuum=NONE (DBs antigos) o incremental não existe: só `full=True` roda um VACUUM
+    completo, que bloqueia escritores durante a cópia e converte o DB para INCREMENTAL.
+    """
+    con = sqlite3.connect(db_path, timeout=10.0, isolation_level=None)
+    try:
+        con.execute("PRAGMA busy_timeout=10000")
+        if con.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            if not full:
+                return "skipped (auto_vacuum=NONE; use --full-vacuum uma vez)"
+            con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            con.execute("VACUUM")
+            return "full"
+        deadline = time.monotonic() + budget_s
+        while con.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+            if time.monotonic() >= deadline:
+                return "incremental (parcial: orçamento de tempo esgotado)"
+            # executescript roda o pragma até o fim (execute() libera só uma página por passo)
+            con.executescript(f"PRAGMA incremental_vacuum({int(slice_pages)});")
+        # devolve o espaço do WAL sem esperar leitores (PASSIVE nunca bloqueia)
+        con.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+        return "incremental"
+    finally:
+        con.close()
+
+def run_maintenance(
+    db_path: str,
+    retention_days: float = 30,
+    mode: str = "strip",
+    batch: int = 200,
+    vacuum_budget_s: float = 2.0,
+    slice_pages: int = 256,
+    full_vacuum: bool = False,
+    store: Optional[EpisodeStore] = None,
+    now: Optional[datetime] = None,
+    job_retention_days: float = 7,
+) -> MaintenanceReport:
+    """Rollup -> retenção (strip|drop) -> jobs terminados antigos -> GC de blobs -> vacuum incremental."""
+    if mode not in ("strip", "drop"):
+        raise ValueError(f"mode inválido: {mode} (use 'strip' ou 'drop')")
+    t0 = time.monotonic()
+    store = store or get_store(db_path)
+    now = now or datetime.utcnow()
+    cutoff = (now - timedelta(days=retention_days)).isoformat()
+    # jobs.finished_at é epoch (time.time())
+    jobs_cutoff = (now - timedelta(days=job_retention_days)).replace(tzinfo=timezone.utc).timestamp()
+    report = MaintenanceReport()
+    with closing(sqlite3.connect(db_path)) as con:
+        report.pages_before, _, report.page_size = _pages(con)
+    store.write(lambda con: con.execute(ROLLUP_SCHEMA_SQL))
+
+    # cada lote = uma transação curta na thread escritora do store
+    while True:
+        n = store.write(lambda con: _rollup_batch(con, cutoff, batch))
+        report.rolled_up += n
+        if n < batch:
+            break
+    if mode == "drop":
+        while True:
+            n = store.write(lambda con: _drop_batch(con, cutoff, batch))
+            report.dropped += n
+            if n < batch:
+                break
+    else:
+        while True:
+            n = store.write(lambda con: _strip_batch(con, cutoff, batch))
+            report.stripped += n
+            if n < batch:
+                break
+    while True:
+        n = store.write(lambda con: prune_jobs(con, jobs_cutoff, batch))
+        report.jobs_deleted += n
+        if n < batch:
+            break
+    report.blobs_deleted = store.write(_gc_blobs)
+
+    report.vacuum_mode = incremental_vacuum(db_path, vacuum_budget_s, slice_pages, full_vacuum)
+    with closing(sqlite3.connect(db_path)) as con:
+        report.pages_after, report.freelist_after, _ = _pages(con)
+    report.elapsed_s = round(time.monotonic() - t0, 3)
+    return report
+
+def main(argv: Optional[list] = None) -> int:
+    default_db = os.path.join(os.getenv("WORKSPACE_ROOT", os.path.expanduser("~/assistant_workspace")), "matrix_assistant.db")
+    ap = argparse.ArgumentParser(description="Manutenção do DB de episódios (seguro com o app rodando).")
+    ap.add_argument("--db", default=default_db)
+    ap.add_argument("--retention-days", type=float, default=30, help="episódios mais antigos entram no rollup e na retenção")
+    ap.add_argument("--mode", choices=["strip", "drop"], default="strip",
+                    help="strip: remove stdout/stderr do exec; drop: apaga o episódio (fica só no rollup)")
+    ap.add_argument("--job-retention-days", type=float, default=7, help="jobs terminados há mais tempo são apagados")
+    ap.add_argument("--batch", type=int, default=200)
+    ap.add_argument("--vacuum-budget-s", type=float, default=2.0)
+    ap.add_argument("--slice-pages", type=int, default=256)
+    ap.add_argument("--full-vacuum", action="store_true", help="VACUUM completo se o DB ainda não for incremental")
+    args = ap.parse_args(argv)
+    if not os.path.exists(args.db):
+        ap.error(f"DB não encontrado: {args.db}")
+    report = run_maintenance(
+        args.db, args.retention_days, args.mode, args.batch,
+        args.vacuum_budget_s, args.slice_pages, args.full_vacuum, job_retention_days=args.job_retention_days,
+    )
+    print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
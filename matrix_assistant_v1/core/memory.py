@@ -1,8 +1,16 @@
 from __future__ import annotations
+import atexit
+import os
+import queue
 import sqlite3
 import json
+import threading
+from concurrent.futures import Future
 from datetime import datetime
-from typing import Any, Dict, Optional, List
+from typing import Any, Callable, Dict, Optional, List, Sequence, Tuple, Union
+
+from .blobs import BLOB_SCHEMA_SQL, decode_blob, encode_payload
+from .usage import LATENCY_DIGITS, USAGE_FIELDS
 
 SCHEMA_SQL = """
 CREATE TABLE IF NOT EXISTS episodes (
@@ -13,49 +21,499 @@ CREATE TABLE IF NOT EXISTS episodes (
   patch_json TEXT,
   audit_json TEXT,
   exec_json TEXT,
+  plan_hash TEXT,
+  patch_hash TEXT,
+  audit_hash TEXT,
+  exec_hash TEXT,
+  trace_hash TEXT,
   model_used TEXT,
   approved INTEGER DEFAULT 0,
   had_sudo INTEGER DEFAULT 0,
   success INTEGER DEFAULT 0,
   score INTEGER,
   tags TEXT,
-  notes TEXT
+  notes TEXT,
+  rolled_up INTEGER DEFAULT 0
+);
+"""
+
+# filtros + ORDER BY id DESC (keyset) servidos pelo mesmo índice composto
+INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_episodes_created_at ON episodes(created_at);
+CREATE INDEX IF NOT EXISTS idx_episodes_model_id ON episodes(model_used, id);
+CREATE INDEX IF NOT EXISTS idx_episodes_success_id ON episodes(success, id);
+CREATE INDEX IF NOT EXISTS idx_episodes_sudo_id ON episodes(had_sudo, id);
+CREATE INDEX IF NOT EXISTS idx_episodes_pending_rollup ON episodes(created_at) WHERE rolled_up = 0;
+"""
+
+# uma linha por chamada ao LLM (core.usage.LLMCall). Não é apagada com o episódio na retenção:
+# é o livro-razão de tokens/bytes/latência por modelo
+LLM_CALLS_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS llm_calls (
+  id INTEGER PRIMARY KEY,
+  episode_id INTEGER,
+  created_at TEXT NOT NULL,
+  stage TEXT,
+  model TEXT,
+  prompt_tokens INTEGER,
+  completion_tokens INTEGER,
+  prompt_tokens_est INTEGER,
+  bytes_sent INTEGER,
+  bytes_received INTEGER,
+  latency_s REAL,
+  stream INTEGER,
+  cached INTEGER,
+  estimated INTEGER
 );
+CREATE INDEX IF NOT EXISTS idx_llm_calls_episode ON llm_calls(episode_id);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_model_created ON llm_calls(model, created_at);
 """
+LLM_CALL_COLUMNS = ("stage", "model", "prompt_tokens", "completion_tokens", "prompt_tokens_est", "bytes_sent",
+                    "bytes_received", "latency_s", "stream", "cached", "estimated")
+INSERT_LLM_CALL_SQL = (f"INSERT INTO llm_calls (episode_id,created_at,{','.join(LLM_CALL_COLUMNS)}) "
+                       f"VALUES (?,?,{','.join('?' * len(LLM_CALL_COLUMNS))})")
+# agrupamentos aceitos por EpisodeStore.llm_usage (nome -> expressão SQL)
+USAGE_GROUPS = {"model": "model", "stage": "stage", "episode_id": "episode_id", "day": "substr(created_at, 1, 10)"}
+
+# FTS5 com conteúdo externo (não duplica o texto); triggers mantêm o índice em dia
+FTS_SQL = """
+CREATE VIRTUAL TABLE episodes_fts USING fts5(user_input, notes, content='episodes', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS episodes_fts_ai AFTER INSERT ON episodes BEGIN
+  INSERT INTO episodes_fts(rowid, user_input, notes) VALUES (new.id, new.user_input, new.notes);
+END;
+CREATE TRIGGER IF NOT EXISTS episodes_fts_ad AFTER DELETE ON episodes BEGIN
+  INSERT INTO episodes_fts(episodes_fts, rowid, user_input, notes) VALUES ('delete', old.id, old.user_input, old.notes);
+END;
+CREATE TRIGGER IF NOT EXISTS episodes_fts_au AFTER UPDATE OF user_input, notes ON episodes BEGIN
+  INSERT INTO episodes_fts(episodes_fts, rowid, user_input, notes) VALUES ('delete', old.id, old.user_input, old.notes);
+  INSERT INTO episodes_fts(rowid, user_input, notes) VALUES (new.id, new.user_input, new.notes);
+END;
+INSERT INTO episodes_fts(episodes_fts) VALUES ('rebuild');
+"""
+
+SUMMARY_COLUMNS = ("id", "created_at", "user_input", "model_used", "approved", "had_sudo", "success", "blocked", "score", "tags", "notes")
+# payloads grandes vão para a tabela blobs (comprimidos, deduplicados por hash);
+# *_json só existe preenchido em episódios antigos (trace já nasceu em blob)
+INLINE_PAYLOADS = ("plan", "patch", "audit", "exec")
+PAYLOADS = INLINE_PAYLOADS + ("trace",)
+JSON_COLUMNS = tuple(f"{p}_json" for p in INLINE_PAYLOADS)
+HASH_COLUMNS = tuple(f"{p}_hash" for p in PAYLOADS)
+
+# métricas do episódio (coluna -> chave em data["metrics"]), para análises sem abrir blobs
+METRIC_COLUMNS = {
+    "c_score": "C", "u_score": "U", "risk": "R",
+    "n_tasks": "T", "n_deps": "D", "n_constraints": "K", "n_artifacts": "A",
+    "ss_local": "SS_local", "iec": "IEC", "iro_total": "IRO_total", "sfc": "SFC",
+}
+
+# colunas adicionadas depois da V1 (ALTER TABLE em DBs existentes)
+ADDED_COLUMNS = {
+    **{c: "TEXT" for c in HASH_COLUMNS},
+    "rolled_up": "INTEGER DEFAULT 0",
+    "blocked": "INTEGER DEFAULT 0",
+    **{c: ("TEXT" if c == "risk" else "REAL") for c in METRIC_COLUMNS},
+}
+
+# WAL: leitores não bloqueiam o escritor; synchronous=NORMAL é seguro com WAL
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=10000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+
+INSERT_EPISODE_SQL = f"""INSERT INTO episodes
+(created_at,user_input,{",".join(HASH_COLUMNS)},model_used,approved,had_sudo,success,score,tags,notes,
+ blocked,{",".join(METRIC_COLUMNS)})
+VALUES (?,?,{",".join("?" * len(HASH_COLUMNS))},?,?,?,?,?,?,?,?,{",".join("?" * len(METRIC_COLUMNS))})"""
+
+WriteOp = Callable[[sqlite3.Connection], Any]
+
+def _ts(value: Union[str, datetime, None]) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _fts_query(text: str) -> str:
+    # cada termo vira uma frase entre aspas: o texto do usuário não é interpretado como sintaxe FTS
+    return " ".join('"' + t.replace('"', '""') + '"' for t in text.split())
+
+INSERT_BLOB_SQL = "INSERT OR IGNORE INTO blobs (hash,codec,raw_size,data) VALUES (?,?,?,?)"
+
+def _connect(db_path: str, read_only: bool = False) -> sqlite3.Connection:
+    # leitores são por thread, mas close() do store fecha todos a partir da thread que chamou
+    con = sqlite3.connect(db_path, timeout=10.0, isolation_level=None, check_same_thread=not read_only)
+    if not read_only:
+        # só vale para DB novo (antes da 1ª tabela) ou após VACUUM; permite vacuum incremental
+        con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    for pragma in PRAGMAS:
+        con.execute(pragma)
+    if read_only:
+        con.execute("PRAGMA query_only=ON")
+    return con
+
+def _json_columns(payloads: Sequence[str]) -> Tuple[str, ...]:
+    return tuple(f"{p}_json" for p in payloads if p in INLINE_PAYLOADS)
+
+def _call_row(c: Dict[str, Any]) -> Tuple:
+    return (
+        str(c.get("stage") or ""), c.get("model"),
+        *[int(c.get(k) or 0) for k in ("prompt_tokens", "completion_tokens", "prompt_tokens_est", "bytes_sent", "bytes_received")],
+        float(c.get("latency_s") or 0.0),
+        *[1 if c.get(k) else 0 for k in ("stream", "cached", "estimated")],
+    )
+
+def _episode_row(data: Dict[str, Any]) -> Tuple[Tuple, List[Tuple], List[Tuple]]:
+    # compressão/hash acontecem na thread de quem salva; a escritora só insere
+    blobs = [encode_payload(data[p]) if data.get(p) else None for p in PAYLOADS]
+    calls = [_call_row(c) for c in data.get("llm_calls") or ()]
+    created_at = datetime.utcnow().isoformat()
+    row = (
+        created_at,
+        data.get("user_input",""),
+        *[b[0] if b else None for b in blobs],
+        data.get("model_used"),
+        1 if data.get("approved") else 0,
+        1 if data.get("had_sudo") else 0,
+        1 if data.get("success") else 0,
+        data.get("score"),
+        data.get("tags"),
+        data.get("notes"),
+        1 if (data.get("audit") or {}).get("blocked") else 0,
+        *[(data.get("metrics") or {}).get(k) for k in METRIC_COLUMNS.values()],
+    )
+    return row, [b for b in blobs if b], [(created_at, *c) for c in calls]
+
+class EpisodeStore:
+    """Acesso ao DB de episódios: uma conexão de escrita (WAL) dona de uma thread escritora.
+
+    Todas as escritas passam por uma fila; a thread junta o que estiver pendente (até
+    `batch_max` operações) numa única transação. Leitores usam conexões próprias por thread.
+    """
+
+    def __init__(self, db_path: str, batch_max: int = 256):
+        self.db_path = db_path
+        self.batch_max = batch_max
+        self._queue: "queue.Queue[Optional[Tuple[WriteOp, Future]]]" = queue.Queue()
+        self._local = threading.local()
+        # todas as conexões de leitura abertas (de qualquer thread), para o close()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._closed = False
+        self.has_fts = False
+        con = _connect(db_path)
+        try:
+            con.executescript(SCHEMA_SQL)
+            self._migrate(con)
+        finally:
+            con.close()
+        self._writer = threading.Thread(target=self._writer_loop, name=f"episode-writer:{os.path.basename(db_path)}", daemon=True)
+        self._writer.start()
+
+    def _migrate(self, con: sqlite3.Connection) -> None:
+        # ponto único para evoluções do schema (executado uma vez por processo e DB)
+        cols = {r[1] for r in con.execute("PRAGMA table_info(episodes)")}
+        for col, decl in ADDED_COLUMNS.items():
+            if col not in cols:
+                con.execute(f"ALTER TABLE episodes ADD COLUMN {col} {decl}")
+        con.executescript(BLOB_SCHEMA_SQL)
+        con.executescript(LLM_CALLS_SCHEMA_SQL)
+        con.executescript(INDEX_SQL)
+        self.has_fts = self._ensure_fts(con)
+
+    def _ensure_fts(self, con: sqlite3.Connection) -> bool:
+        if con.execute("SELECT 1 FROM sqlite_master WHERE name='episodes_fts'").fetchone():
+            return True
+        try:
+            # cria e indexa os episódios já existentes numa só transação
+            con.executescript("BEGIN;" + FTS_SQL + "COMMIT;")
+            return True
+        except sqlite3.OperationalError:
+            # SQLite sem FTS5: busca textual cai para LIKE
+            if con.in_transaction:
+                con.execute("ROLLBACK")
+            return False
+
+    # ---------------- escrita ----------------
+    def submit(self, op: WriteOp) -> Future:
+        """Enfileira op(con) para a thread escritora; roda dentro de uma transação em lote."""
+        if self._closed:
+            raise RuntimeError("EpisodeStore fechado.")
+        fut: Future = Future()
+        self._queue.put((op, fut))
+        return fut
+
+    def write(self, op: WriteOp) -> Any:
+        return self.submit(op).result()
+
+    def save_async(self, data: Dict[str, Any]) -> Future:
+        row, blobs, calls = _episode_row(data)
+
+        def op(con: sqlite3.Connection) -> int:
+            con.executemany(INSERT_BLOB_SQL, blobs)
+            episode_id = int(con.execute(INSERT_EPISODE_SQL, row).lastrowid)
+            con.executemany(INSERT_LLM_CALL_SQL, [(episode_id, *c) for c in calls])
+            return episode_id
+
+        return self.submit(op)
+
+    def save(self, data: Dict[str, Any]) -> int:
+        return self.save_async(data).result()
+
+    def _writer_loop(self) -> None:
+        con = _connect(self.db_path)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                batch = [item]
+                stop = False
+                while len(batch) < self.batch_max:
+                    try:
+                        nxt = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt is None:
+                        stop = True
+                        break
+                    batch.append(nxt)
+                self._run_batch(con, batch)
+                if stop:
+                    return
+        finally:
+            con.close()
+
+    def _run_batch(self, con: sqlite3.Connection, batch: List[Tuple[WriteOp, Future]]) -> None:
+        live = [(op, fut) for op, fut in batch if fut.set_running_or_notify_cancel()]
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            results = [op(con) for op, _ in live]
+            con.execute("COMMIT")
+        except Exception:
+            if con.in_transaction:
+                con.execute("ROLLBACK")
+            # isola a operação com erro: refaz uma a uma, cada qual na sua transação
+            for op, fut in live:
+                try:
+                    con.execute("BEGIN IMMEDIATE")
+                    res = op(con)
+                    con.execute("COMMIT")
+                    fut.set_result(res)
+                except Exception as e:
+                    if con.in_transaction:
+                        con.execute("ROLLBACK")
+                    fut.set_exception(e)
+            return
+        for (_, fut), res in zip(live, results):
+            fut.set_result(res)
+
+    # ---------------- leitura ----------------
+    def reader(self) -> sqlite3.Connection:
+        """Conexão somente-leitura da thread atual (WAL: não bloqueia nem é bloqueada pelo escritor)."""
+        if self._closed:
+            raise RuntimeError("EpisodeStore fechado.")
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = _connect(self.db_path, read_only=True)
+            con.row_factory = sqlite3.Row
+            with self._readers_lock:
+                self._readers.append(con)
+        return con
+
+    def query(
+        self,
+        since: Union[str, datetime, None] = None,
+        until: Union[str, datetime, None] = None,
+        model_used: Optional[str] = None,
+        success: Optional[bool] = None,
+        had_sudo: Optional[bool] = None,
+        text: Optional[str] = None,
+        before_id: Optional[int] = None,
+        limit: int = 50,
+        include_json: Union[bool, Sequence[str]] = False,
+    ) -> List[Dict[str, Any]]:
+        """Episódios mais recentes primeiro, filtrados; `until` é exclusivo.
+
+        Paginação por chave: passe `before_id` = id do último item da página anterior.
+        `text` busca em user_input/notes (FTS5; LIKE se indisponível).
+        `include_json`: True (todos os payloads) ou nomes de PAYLOADS a descomprimir.
+        """
+        where: List[str] = []
+        args: List[Any] = []
+        if since is not None:
+            where.append("e.created_at >= ?")
+            args.append(_ts(since))
+        if until is not None:
+            where.append("e.created_at < ?")
+            args.append(_ts(until))
+        if model_used is not None:
+            where.append("e.model_used = ?")
+            args.append(model_used)
+        if success is not None:
+            where.append("e.success = ?")
+            args.append(1 if success else 0)
+        if had_sudo is not None:
+            where.append("e.had_sudo = ?")
+            args.append(1 if had_sudo else 0)
+        if before_id is not None:
+            where.append("e.id < ?")
+            args.append(before_id)
+        if text and text.strip():
+            if self.has_fts:
+                where.append("e.id IN (SELECT rowid FROM episodes_fts WHERE episodes_fts MATCH ?)")
+                args.append(_fts_query(text))
+            else:
+                where.append("(e.user_input LIKE ? OR e.notes LIKE ?)")
+                args.extend([f"%{text.strip()}%"] * 2)
+        payloads = PAYLOADS if include_json is True else tuple(include_json or ())
+        cols = SUMMARY_COLUMNS + HASH_COLUMNS + _json_columns(payloads)
+        sql = f"SELECT {', '.join('e.' + c for c in cols)} FROM episodes e"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY e.id DESC LIMIT ?"
+        args.append(limit)
+        return [self._decode(dict(r), payloads) for r in self.reader().execute(sql, args).fetchall()]
+
+    def get(self, episode_id: int, payloads: Sequence[str] = PAYLOADS) -> Optional[Dict[str, Any]]:
+        """Um episódio; só os payloads pedidos são lidos e descomprimidos."""
+        cols = SUMMARY_COLUMNS + HASH_COLUMNS + _json_columns(payloads)
+        row = self.reader().execute(f"SELECT {', '.join(cols)} FROM episodes WHERE id=?", (episode_id,)).fetchone()
+        return self._decode(dict(row), payloads) if row else None
+
+    def llm_calls(self, episode_id: int) -> List[Dict[str, Any]]:
+        """Chamadas ao LLM de um episódio, na ordem em que aconteceram."""
+        rows = self.reader().execute(
+            f"SELECT {', '.join(LLM_CALL_COLUMNS)} FROM llm_calls WHERE episode_id=? ORDER BY id", (episode_id,)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def llm_usage(
+        self,
+        group_by: str = "model",
+        since: Union[str, datetime, None] = None,
+        until: Union[str, datetime, None] = None,
+        model: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Totais de uso do LLM agrupados por `group_by` (model, stage, episode_id ou day); `until` é exclusivo."""
+        if group_by not in USAGE_GROUPS:
+            raise ValueError(f"group_by inválido: {group_by} (use {', '.join(USAGE_GROUPS)})")
+        where: List[str] = []
+        args: List[Any] = []
+        if since is not None:
+            where.append("created_at >= ?")
+            args.append(_ts(since))
+        if until is not None:
+            where.append("created_at < ?")
+            args.append(_ts(until))
+        if model is not None:
+            where.append("model = ?")
+            args.append(model)
+        key = USAGE_GROUPS[group_by]
+        sums = ", ".join(f"COALESCE(SUM({f}), 0) AS {f}" for f in USAGE_FIELDS)
+        sql = f"SELECT {key} AS {group_by}, COUNT(*) AS calls, SUM(cached) AS cache_hits, {sums} FROM llm_calls"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" GROUP BY {key} ORDER BY prompt_tokens + completion_tokens DESC"
+        rows = [dict(r) for r in self.reader().execute(sql, args).fetchall()]
+        # mesmo arredondamento de summarize_calls (round do Python, não o ROUND do SQLite)
+        for r in rows:
+            r["latency_s"] = round(r["latency_s"], LATENCY_DIGITS)
+        return rows
+
+    def load_payload(self, digest: str) -> Any:
+        row = self.reader().execute("SELECT codec, data FROM blobs WHERE hash=?", (digest,)).fetchone()
+        if row is None:
+            raise KeyError(f"Blob não encontrado: {digest}")
+        return decode_blob(row[0], row[1])
+
+    def _decode(self, d: Dict[str, Any], payloads: Sequence[str]) -> Dict[str, Any]:
+        for p in payloads:
+            digest = d.get(f"{p}_hash")
+            legacy = d.pop(f"{p}_json", None)
+            if digest:
+                d[p] = self.load_payload(digest)
+            else:
+                d[p] = json.loads(legacy) if legacy else None
+        return d
+
+    def compact_inline(self, limit: int = 500) -> int:
+        """Move payloads inline de episódios antigos para blobs. Devolve quantos episódios migrou."""
+        cols = ", ".join(JSON_COLUMNS)
+        rows = self.reader().execute(
+            f"SELECT id, {cols} FROM episodes WHERE COALESCE({cols}) IS NOT NULL ORDER BY id LIMIT ?", (limit,)
+        ).fetchall()
+        if not rows:
+            return 0
+        updates: List[Tuple] = []
+        blobs: List[Tuple] = []
+        for row in rows:
+            hashes = []
+            for text in tuple(row)[1:]:
+                if text:
+                    b = encode_payload(json.loads(text))
+                    blobs.append(b)
+                    hashes.append(b[0])
+                else:
+                    hashes.append(None)
+            updates.append((*hashes, row[0]))
+
+        def op(con: sqlite3.Connection) -> int:
+            con.executemany(INSERT_BLOB_SQL, blobs)
+            set_sql = ", ".join(f"{p}_hash=COALESCE(?, {p}_hash)" for p in INLINE_PAYLOADS) + ", " + ", ".join(f"{j}=NULL" for j in JSON_COLUMNS)
+            con.executemany(f"UPDATE episodes SET {set_sql} WHERE id=?", updates)
+            return len(updates)
+
+        return self.write(op)
+
+    def blob_stats(self) -> Dict[str, int]:
+        n, raw, stored = self.reader().execute(
+            "SELECT COUNT(*), COALESCE(SUM(raw_size),0), COALESCE(SUM(LENGTH(data)),0) FROM blobs"
+        ).fetchone()
+        return {"blobs": n, "raw_bytes": raw, "stored_bytes": stored}
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for con in readers:
+            con.close()
+        # get_store não devolve mais este store: a próxima chamada abre outro
+        key = os.path.realpath(self.db_path)
+        with _stores_lock:
+            if _stores.get(key) is self:
+                del _stores[key]
+
+# um store (portanto uma conexão de escrita e uma thread) por arquivo de DB no processo
+_stores: Dict[str, EpisodeStore] = {}
+_stores_lock = threading.Lock()
+
+def get_store(db_path: str) -> EpisodeStore:
+    key = os.path.realpath(db_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = EpisodeStore(db_path)
+        return store
+
+@atexit.register
+def _close_stores() -> None:
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        store.close()
 
 def init_db(db_path: str) -> None:
-    con = sqlite3.connect(db_path)
-    try:
-        con.execute(SCHEMA_SQL)
-        con.commit()
-    finally:
-        con.close()
+    get_store(db_path)
 
 def save_episode(db_path: str, data: Dict[str, Any]) -> int:
-    con = sqlite3.connect(db_path)
-    try:
-        cur = con.cursor()
-        cur.execute(
-            """INSERT INTO episodes
-            (created_at,user_input,plan_json,patch_json,audit_json,exec_json,model_used,approved,had_sudo,success,score,tags,notes)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-            (
-                datetime.utcnow().isoformat(),
-                data.get("user_input","" պատվ),
-                json.dumps(data.get("plan"), ensure_ascii=False) if data.get("plan") else None,
-                json.dumps(data.get("patch"), ensure_ascii=False) if data.get("patch") else None,
-                json.dumps(data.get("audit"), ensure_ascii=False) if data.get("audit") else None,
-                json.dumps(data.get("exec"), ensure_ascii=False) if data.get("exec") else None,
-                data.get("model_used"),
-                1 if data.get("approved") else 0,
-                1 if data.get("had_sudo") else 0,
-                1 if data.get("success") else 0,
-                data.get("score"),
-                data.get("tags"),
-                data.get("notes"),
-            )
-        )
-        con.commit()
-        return int(cur.lastrowid)
-    finally:
-        con.close()
+    return get_store(db_path).save(data)
+
+def query_episodes(db_path: str, **filters: Any) -> List[Dict[str, Any]]:
+    return get_store(db_path).query(**filters)
+
+def get_episode(db_path: str, episode_id: int) -> Optional[Dict[str, Any]]:
+    return get_store(db_path).get(episode_id)
@@ -0,0 +1,61 @@
+# Métricas do histórico de episódios (DB) como arrays NumPy; core.metrics fica só com as fórmulas, sem I/O.
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .memory import get_store
+from .metrics import compute_complexity_batch, compute_sfc_batch
+
+# colunas numéricas de métricas em episodes (ver core.memory.METRIC_COLUMNS)
+NUMERIC_METRIC_COLUMNS = (
+    "c_score", "u_score", "n_tasks", "n_deps", "n_constraints", "n_artifacts",
+    "ss_local", "iec", "iro_total", "sfc", "success", "had_sudo", "approved",
+)
+
+def load_metric_arrays(db_path: str, columns: Sequence[str] = NUMERIC_METRIC_COLUMNS,
+                       since: Optional[str] = None, model_used: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """Colunas de métricas do DB de episódios como arrays float64 (NULL -> NaN), mais "id" (int64)."""
+    bad = [c for c in columns if c not in NUMERIC_METRIC_COLUMNS]
+    if bad:
+        raise ValueError(f"Colunas de métrica desconhecidas: {bad}")
+    where: List[str] = []
+    args: List[Any] = []
+    if since is not None:
+        where.append("created_at >= ?")
+        args.append(since)
+    if model_used is not None:
+        where.append("model_used = ?")
+        args.append(model_used)
+    sql = f"SELECT id, {', '.join(columns)} FROM episodes"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    rows = get_store(db_path).reader().execute(sql + " ORDER BY id", args).fetchall()
+    data = np.array([tuple(r) for r in rows], dtype=np.float64).reshape(len(rows), len(columns) + 1)
+    out = {"id": data[:, 0].astype(np.int64)}
+    for i, col in enumerate(columns, start=1):
+        out[col] = data[:, i]
+    return out
+
+def recompute_history(db_path: str) -> int:
+    """Recalcula c_score e sfc de todo o histórico (após mudança de fórmula). Devolve linhas atualizadas."""
+    m = load_metric_arrays(db_path, ("n_tasks", "n_deps", "n_constraints", "n_artifacts", "ss_local", "iec", "iro_total"))
+    has_counts = ~np.isnan(m["n_tasks"])
+    has_sfc = ~np.isnan(m["ss_local"]) & ~np.isnan(m["iec"]) & ~np.isnan(m["iro_total"])
+    C = compute_complexity_batch(*(np.nan_to_num(m[c]) for c in ("n_tasks", "n_deps", "n_constraints", "n_artifacts")))
+    sfc = compute_sfc_batch(np.nan_to_num(m["ss_local"]), np.nan_to_num(m["iec"]), np.nan_to_num(m["iro_total"]))
+    rows = [
+        (float(c) if hc else None, float(f) if hs else None, int(i))
+        for i, c, f, hc, hs in zip(m["id"], C, sfc, has_counts, has_sfc)
+        if hc or hs
+    ]
+    if not rows:
+        return 0
+
+    def op(con) -> int:
+        con.executemany(
+            "UPDATE episodes SET c_score = COALESCE(?, c_score), sfc = COALESCE(?, sfc) WHERE id = ?", rows
+        )
+        return len(rows)
+
+    return get_store(db_path).write(op)
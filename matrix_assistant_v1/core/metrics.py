@@ -1,7 +1,11 @@
 from __future__ import annotations
 import math
 from dataclasses import dataclass
-from typing import Tuple, List
+from typing import Sequence, Union
+
+import numpy as np
+
+ArrayLike = Union[float, Sequence[float], np.ndarray]
 
 def clamp(lo: float, hi: float, x: float) -> float:
     return max(lo, min(hi, x))
@@ -44,3 +48,49 @@ def compute_iec(distinct_approaches: int, n_solutions: int) -> float:
     if n_solutions <= 0:
         return 0.0
     return clamp(0.0, 100.0, (distinct_approaches/n_solutions)*100.0)
+
+# ---------------- versões vetorizadas (NumPy) ----------------
+# Mesma fórmula e mesma ordem de operações das escalares (resultados idênticos em float64);
+# aceitam escalares ou arrays e fazem broadcast.
+
+def _f64(x: ArrayLike) -> np.ndarray:
+    return np.asarray(x, dtype=np.float64)
+
+def clamp_batch(lo: float, hi: float, x: ArrayLike) -> np.ndarray:
+    return np.maximum(lo, np.minimum(hi, _f64(x)))
+
+def normalize_to_1_10_batch(x: ArrayLike, x_min: float = 0.0, x_max: float = 10.0) -> np.ndarray:
+    x = _f64(x)
+    if x_max <= x_min:
+        return np.ones_like(x)
+    t = (x - x_min) / (x_max - x_min)
+    return clamp_batch(1.0, 10.0, 1.0 + 9.0 * t)
+
+def compute_complexity_batch(T: ArrayLike, D: ArrayLike, K: ArrayLike, A: ArrayLike) -> np.ndarray:
+    C_raw = 0.4*_f64(T) + 0.2*_f64(D) + 0.2*_f64(K) + 0.2*_f64(A)
+    return normalize_to_1_10_batch(C_raw, 0.0, 20.0)
+
+def compute_uncertainty_batch(ambiguous_items: ArrayLike, total_steps: ArrayLike) -> np.ndarray:
+    a, t = np.broadcast_arrays(_f64(ambiguous_items), _f64(total_steps))
+    ratio = np.divide(a, t, out=np.ones_like(a), where=t > 0)
+    return np.where(t <= 0, 1.0, clamp_batch(0.0, 1.0, ratio))
+
+def compute_lmax_batch(C: ArrayLike) -> np.ndarray:
+    return np.minimum(np.ceil(1.5*_f64(C)), 20).astype(np.int64)
+
+def compute_sfc_batch(SS_local: ArrayLike, IEC: ArrayLike, IRO_total: ArrayLike) -> np.ndarray:
+    IRO_total = _f64(IRO_total)
+    IRO_n = clamp_batch(0.0, 1.0, IRO_total/100.0)
+    base = 0.7*clamp_batch(0, 100, SS_local) + 0.3*clamp_batch(0, 100, IEC)
+    sfc = base * (1 - IRO_n)
+    sfc = np.where(IRO_total > 40, sfc * 0.7, sfc)
+    return clamp_batch(0.0, 100.0, sfc)
+
+def compute_delta_batch(prev: ArrayLike, cur: ArrayLike) -> np.ndarray:
+    prev, cur = np.broadcast_arrays(_f64(prev), _f64(cur))
+    return np.divide(np.abs(cur-prev), np.abs(prev), out=np.ones_like(prev), where=prev != 0)
+
+def compute_iec_batch(distinct_approaches: ArrayLike, n_solutions: ArrayLike) -> np.ndarray:
+    d, n = np.broadcast_arrays(_f64(distinct_approaches), _f64(n_solutions))
+    ratio = np.divide(d, n, out=np.zeros_like(d), where=n > 0)
+    return np.where(n <= 0, 0.0, clamp_batch(0.0, 100.0, ratio*100.0))
@@ -1,33 +1,176 @@
-import psutil
+import math
+import os
+import threading
 import time
+from array import array
+from typing import Any, Dict, List, Optional
+
+import psutil
+
+# sample fields, each one a fixed-size ring buffer of doubles
+FIELDS = ("ts", "cpu", "mem", "load1", "read_bps", "write_bps")
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    # nearest-rank percentile over an already sorted list
+    if not sorted_values:
+        return 0.0
+    k = max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1)
+    return sorted_values[k]
 
 class SystemMonitor:
-    def __init__(self):
+    def __init__(self, interval_s: float = 2.0, capacity: int = 900):
         self.health_score = 100  # Setting initial health score to 100
+        self.interval_s = interval_s
+        self.capacity = capacity
+        self._buf = {f: array("d", bytes(8 * capacity)) for f in FIELDS}
+        self._count = 0  # total samples ever written; next slot = _count % capacity
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_cpu = None
+        self._last_io = None
+
+    # ---------------- sampling ----------------
+    def _cpu_percent(self) -> float:
+        # own delta over cpu_times (psutil.cpu_percent() shares state with every other caller)
+        t = psutil.cpu_times()
+        idle = t.idle + getattr(t, "iowait", 0.0)
+        total = sum(t) - getattr(t, "guest", 0.0) - getattr(t, "guest_nice", 0.0)  # guest is already in user
+        last, self._last_cpu = self._last_cpu, (idle, total)
+        if last is None or total <= last[1]:
+            return 0.0
+        return max(0.0, min(100.0, 100.0 * (1.0 - (idle - last[0]) / (total - last[1]))))
+
+    def _io_rates(self, now: float):
+        io = psutil.disk_io_counters()
+        if io is None:  # containers/VMs without disk stats
+            return 0.0, 0.0
+        last, self._last_io = self._last_io, (now, io.read_bytes, io.write_bytes)
+        if last is None or now <= last[0]:
+            return 0.0, 0.0
+        dt = now - last[0]
+        return max(0.0, (io.read_bytes - last[1]) / dt), max(0.0, (io.write_bytes - last[2]) / dt)
+
+    def sample_once(self) -> Dict[str, float]:
+        now = time.time()
+        read_bps, write_bps = self._io_rates(now)
+        sample = {
+            "ts": now,
+            "cpu": self._cpu_percent(),
+            "mem": psutil.virtual_memory().percent,
+            "load1": os.getloadavg()[0] if hasattr(os, "getloadavg") else 0.0,
+            "read_bps": read_bps,
+            "write_bps": write_bps,
+        }
+        with self._lock:
+            slot = self._count % self.capacity
+            for f in FIELDS:
+                self._buf[f][slot] = sample[f]
+            self._count += 1
+        return sample
 
-    def compute_health_score(self):
-        # Example logic to compute health score based on CPU and memory usage
-        cpu_usage = psutil.cpu_percent()
-        memory_info = psutil.virtual_memory()
-        memory_usage = memory_info.percent
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.sample_once()
+            except Exception:
+                pass  # a failed read must never kill the sampler
 
-        # Simple scoring: health score decreases based on usage
+    def start(self) -> "SystemMonitor":
+        if self.running:
+            return self
+        self._stop.clear()
+        self.sample_once()  # primes cpu/io deltas and gives the UI a first sample right away
+        self._thread = threading.Thread(target=self._run, name="system-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ---------------- reading (never blocks on psutil) ----------------
+    def samples(self, window_s: Optional[float] = None) -> Dict[str, List[float]]:
+        # copy of the buffered samples, oldest first, optionally only the last window_s seconds
+        with self._lock:
+            n = min(self._count, self.capacity)
+            start = self._count - n
+            idx = [(start + i) % self.capacity for i in range(n)]
+            out = {f: [self._buf[f][i] for i in idx] for f in FIELDS}
+        if window_s is not None and out["ts"]:
+            cutoff = out["ts"][-1] - window_s
+            first = next((i for i, t in enumerate(out["ts"]) if t >= cutoff), len(out["ts"]))
+            out = {f: v[first:] for f, v in out.items()}
+        return out
+
+    def snapshot(self) -> Dict[str, float]:
+        # latest sample ({} before the first one)
+        with self._lock:
+            if not self._count:
+                return {}
+            slot = (self._count - 1) % self.capacity
+            return {f: self._buf[f][slot] for f in FIELDS}
+
+    def aggregate(self, window_s: float = 60.0) -> Dict[str, Any]:
+        # {"samples": n, "cpu": {"avg", "p95", "max"}, "mem": {...}, ...} over the last window_s seconds
+        s = self.samples(window_s)
+        out: Dict[str, Any] = {"samples": len(s["ts"])}
+        for f in FIELDS[1:]:
+            values = sorted(s[f])
+            out[f] = {
+                "avg": sum(values) / len(values) if values else 0.0,
+                "p95": _percentile(values, 95),
+                "max": values[-1] if values else 0.0,
+            }
+        return out
+
+    def compute_health_score(self, window_s: float = 30.0):
+        # Simple scoring: health score decreases based on usage (averaged over the window)
+        agg = self.aggregate(window_s)
+        if agg["samples"]:
+            cpu_usage, memory_usage = agg["cpu"]["avg"], agg["mem"]["avg"]
+        else:
+            # no sampler running: one non-blocking reading instead of sleeping on cpu_percent
+            # (cpu is measured since the previous reading, so the very first one reports 0)
+            sample = self.sample_once()
+            cpu_usage, memory_usage = sample["cpu"], sample["mem"]
         self.health_score = 100 - (cpu_usage + memory_usage) / 2
         return self.health_score
 
     def track_system_metrics(self):
-        while True:
-            cpu_usage = psutil.cpu_percent()
-            memory_info = psutil.virtual_memory()
-            print(f"CPU Usage: {cpu_usage}% | Memory Usage: {memory_info.percent}%")
-            time.sleep(5)  # Track metrics every 5 seconds
+        # Blocking console tracker (CLI use); the UI should use start() + snapshot()/aggregate()
+        self.start()
+        try:
+            while True:
+                time.sleep(self.interval_s)
+                s = self.snapshot()
+                print(f"CPU Usage: {s['cpu']:.1f}% | Memory Usage: {s['mem']:.1f}% | Load: {s['load1']:.2f}")
+        finally:
+            self.stop()
 
     def analyze_episode(self, episode_data):
         # Example analysis function
         average_score = sum(episode_data) / len(episode_data)
         return average_score  # Returns average score from episode data
 
+# one sampler per process (Streamlit reruns and sessions share it)
+_monitor: Optional[SystemMonitor] = None
+_monitor_lock = threading.Lock()
+
+def get_monitor(interval_s: float = 2.0, capacity: int = 900) -> SystemMonitor:
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = SystemMonitor(interval_s, capacity)
+        return _monitor.start()
+
 if __name__ == '__main__':
     monitor = SystemMonitor()
     print(f'Health Score: {monitor.compute_health_score()}')
-    monitor.track_system_metrics() # This can be run in a separate thread for live tracking
+    monitor.track_system_metrics()
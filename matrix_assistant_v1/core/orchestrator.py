@@ -1,12 +1,19 @@
 from __future__ import annotations
-import os, json, re
-from typing import Any, Dict, Tuple, Optional, List
+import os, json, re, time
+from typing import Any, Callable, Dict, Tuple, Optional, List
 
-from .api_client import chat
+from pydantic import ValidationError
+
+from .api_client import chat_measured, chat_stream, DEFAULT_TEMPERATURE
+from .cache import ResponseCache, make_key
 from .schemas import Plan, Patch
 from .metrics import compute_complexity, compute_uncertainty, compute_sfc, compute_lmax, compute_delta
 from .gate import analyze_patch
 from .prompts import PLANNER_PROMPT, CODER_PROMPT
+from .replay import ReplayIndex
+from .keywords import RISK, PlanScan, get_scanner, scan_plan
+from .tracing import span
+from .usage import LLMCall, check_prompt_budget, summarize_calls
 
 def _extract_json(text: str) -> str:
     # tenta pegar o primeiro objeto JSON do texto
@@ -15,7 +22,59 @@ def _extract_json(text: str) -> str:
         raise ValueError("Nenhum JSON encontrado na resposta.")
     return m.group(0)
 
-def llm_plan(base_url: str, api_key: str, model: str, objective: str) -> Tuple[Plan, str]:
+def _complete(base_url: str, api_key: str, model: str, messages, schema: dict, parse: Callable[[str], Any],
+              on_token: Optional[Callable[[str], None]] = None,
+              cache: Optional[ResponseCache] = None, bypass_cache: bool = False, stage: str = "",
+              calls: Optional[List[Dict[str, Any]]] = None, prompt_budget: Optional[int] = None) -> Tuple[Any, str]:
+    # devolve (parse(content), model_used); com on_token usa streaming SSE e repassa cada token
+    # calls: recebe um LLMCall.to_dict() por chamada (tokens, bytes, latência; acerto de cache também)
+    # prompt_budget: tokens estimados do prompt; acima disso PromptTooLarge antes de enviar (None = padrão do .env)
+    key = make_key(base_url, model, messages, schema, DEFAULT_TEMPERATURE) if cache is not None else None
+    if key is not None:
+        with span("llm.cache") as sp:
+            hit = cache.get(key, bypass=bypass_cache)
+            sp.set(hit=hit is not None)
+        if hit is not None:
+            if calls is not None:
+                calls.append(LLMCall(stage, hit["model"], cached=True).to_dict())
+            if on_token is not None:
+                on_token(hit["content"])
+            with span("llm.parse"):
+                return parse(hit["content"]), hit["model"]
+    prompt_est = check_prompt_budget(messages, schema, prompt_budget, stage)
+    with span("llm.request", model=model, stream=on_token is not None, prompt_tokens_est=prompt_est) as sp:
+        t0 = time.perf_counter()
+        if on_token is None:
+            data, stats = chat_measured(base_url, api_key, model, messages, response_format=schema)
+            content, model_used = data["choices"][0]["message"]["content"], data.get("model") or model
+        else:
+            ttft = None
+            stream = chat_stream(base_url, api_key, model, messages, response_format=schema)
+            try:
+                for token in stream:
+                    if ttft is None:
+                        ttft = time.perf_counter() - t0
+                    on_token(token)
+            finally:
+                stream.close()
+            content, model_used, stats = stream.content, stream.model or model, stream.stats
+            sp.set(ttft_s=None if ttft is None else round(ttft, 6))
+        call = LLMCall.from_response(stage, model_used, stats.usage, prompt_est, content,
+                                     bytes_sent=stats.bytes_sent, bytes_received=stats.bytes_received,
+                                     latency_s=round(time.perf_counter() - t0, 6), stream=on_token is not None)
+        sp.set(chars=len(content), prompt_tokens=call.prompt_tokens, completion_tokens=call.completion_tokens)
+    if calls is not None:
+        calls.append(call.to_dict())
+    with span("llm.parse"):
+        parsed = parse(content)
+    # só entra no cache resposta que passou na validação
+    if key is not None:
+        cache.put(key, {"content": content, "model": model_used})
+    return parsed, model_used
+
+def llm_plan(base_url: str, api_key: str, model: str, objective: str, on_token: Optional[Callable[[str], None]] = None,
+             cache: Optional[ResponseCache] = None, bypass_cache: bool = False,
+             calls: Optional[List[Dict[str, Any]]] = None, prompt_budget: Optional[int] = None) -> Tuple[Plan, str]:
     # Schema para forçar JSON
     schema = {
         "type": "json_schema",
@@ -45,13 +104,14 @@ def llm_plan(base_url: str, api_key: str, model: str, objective: str) -> Tuple[P
         {"role":"system","content":PLANNER_PROMPT},
         {"role":"user","content":f"Objetivo do usuário: {objective}\nResponda SOMENTE no schema."}
     ]
-    data = chat(base_url, api_key, model, messages, response_format=schema)
-    model_used = data.get("model") or model
-    content = data["choices"][0]["message"]["content"]
-    plan = Plan.model_validate_json(_extract_json(content))
+    plan, model_used = _complete(base_url, api_key, model, messages, schema,
+                                 lambda content: Plan.model_validate_json(_extract_json(content)),
+                                 on_token, cache, bypass_cache, "plan", calls, prompt_budget)
     return plan, model_used
 
-def llm_patch(base_url: str, api_key: str, model: str, objective: str, plan: Plan) -> Tuple[Patch, str]:
+def llm_patch(base_url: str, api_key: str, model: str, objective: str, plan: Plan, on_token: Optional[Callable[[str], None]] = None,
+              cache: Optional[ResponseCache] = None, bypass_cache: bool = False,
+              calls: Optional[List[Dict[str, Any]]] = None, prompt_budget: Optional[int] = None) -> Tuple[Patch, str]:
     schema = {
         "type": "json_schema",
         "json_schema": {
@@ -71,7 +131,9 @@ def llm_patch(base_url: str, api_key: str, model: str, objective: str, plan: Pla
                             "cmd":{"type":"string"},
                             "why":{"type":"string"},
                             "expects_cmd":{"type":"string"},
-                            "privilege":{"type":"string","enum":["user","sudo"]}
+                            "privilege":{"type":"string","enum":["user","sudo"]},
+                            "depends_on":{"type":"array","items":{"type":"integer","minimum":1}},
+                            "parallel_group":{"type":"string"}
                         },
                         "required":["step_index","cmd","why","expects_cmd","privilege"]
                     }}
@@ -90,13 +152,15 @@ def llm_patch(base_url: str, api_key: str, model: str, objective: str, plan: Pla
             "Responda SOMENTE no schema."
         )}
     ]
-    data = chat(base_url, api_key, model, messages, response_format=schema)
-    model_used = data.get("model") or model
-    content = data["choices"][0]["message"]["content"]
-    patch = Patch.model_validate_json(_extract_json(content))
+    patch, model_used = _complete(base_url, api_key, model, messages, schema,
+                                  lambda content: Patch.model_validate_json(_extract_json(content)),
+                                  on_token, cache, bypass_cache, "patch", calls, prompt_budget)
     return patch, model_used
 
-def estimate_C_U_R(plan: Plan) -> Tuple[float,float,str,Dict[str,int]]:
+def estimate_C_U_R(plan: Plan, locale: Optional[str] = None, scan: Optional[PlanScan] = None) -> Tuple[float,float,str,Dict[str,int]]:
+    # scan já feito (scan_plan) evita a segunda varredura; locale omitido = o do scan (ou "pt")
+    if scan is not None and locale is not None and scan.locale != locale:
+        raise ValueError(f"scan feito com locale {scan.locale!r}, mas locale={locale!r}")
     T = len(plan.tasks)
     # heurísticas simples (podem evoluir depois)
     D = sum(1 for t in plan.tasks if any("dep" in a.lower() for a in t.actions))
@@ -104,33 +168,95 @@ def estimate_C_U_R(plan: Plan) -> Tuple[float,float,str,Dict[str,int]]:
     A = len(plan.artifacts)
     C = compute_complexity(T,D,K,A)
 
-    ambiguous = 0
+    # termos vagos e de risco: uma varredura dos campos do plano (core.keywords)
+    scan = scan or scan_plan(plan, locale or "pt")
+    ambiguous = len(scan.ambiguous_tasks)
     total_steps = sum(len(t.actions) for t in plan.tasks)
-    vague_tokens = ("talvez","aprox","aproximadamente","pode","se necessário","não aplicável","not applicable")
-    for t in plan.tasks:
-        txt = " ".join(t.actions+[t.success_criteria]).lower()
-        if any(v in txt for v in vague_tokens):
-            ambiguous += 1
     U = compute_uncertainty(ambiguous, max(1,total_steps))
 
     # risco determinístico (muito simples): constraints + palavras-chave
     risk = "Baixo"
-    alltxt = (json.dumps(plan.model_dump(), ensure_ascii=False)).lower()
-    if any(x in alltxt for x in ["sudo","/etc","firewall","porta","systemctl","kernel","driver"]):
+    if scan.has(RISK):
         risk = "Alto"
     elif C >= 7 or U > 0.6:
         risk = "Médio"
     return C,U,risk,{"T":T,"D":D,"K":K,"A":A,"ambiguous":ambiguous,"total_steps":total_steps}
 
-def run_pipeline(base_url: str, api_key: str, model: str, objective: str, workspace_root: str) -> Dict[str, Any]:
-    plan, model_plan = llm_plan(base_url, api_key, model, objective)
-    C,U,R,counts = estimate_C_U_R(plan)
-    patch, model_patch = llm_patch(base_url, api_key, model, objective, plan)
+def _replay_candidate(replay: ReplayIndex, objective: str, workspace_root: str,
+                      locale: str = "pt") -> Optional[Dict[str, Any]]:
+    # episódio passado bem-sucedido e parecido: reaproveita PLANO+PATCH sem chamar o LLM,
+    # mas sempre reauditando contra o workspace atual (bloqueado => segue para o LLM)
+    cand = replay.best(objective)
+    if cand is None:
+        return None
+    try:
+        plan = Plan.model_validate(cand.plan)
+        patch = Patch.model_validate(cand.patch)
+    except ValidationError:
+        # episódio antigo/editado que não cabe mais no schema atual: segue para o LLM
+        return None
     audit = analyze_patch(patch, workspace_root=workspace_root)
+    if audit.blocked:
+        return None
+    scan = scan_plan(plan, locale)
+    C,U,R,counts = estimate_C_U_R(plan, locale, scan)
+    return {
+        "plan": plan.model_dump(),
+        "patch": patch.model_dump(),
+        "audit": audit.model_dump(),
+        "metrics": {"C":C,"U":U,"R":R, **counts},
+        "keyword_hits": [h.__dict__ for h in scan.hits],
+        "model_used": cand.model_used,
+        "replayed_from": {"episode_id": cand.episode_id, "score": cand.score, "user_input": cand.user_input},
+    }
+
+def run_pipeline(base_url: str, api_key: str, model: str, objective: str, workspace_root: str,
+                 on_token: Optional[Callable[[str, str], None]] = None,
+                 cache: Optional[ResponseCache] = None, bypass_cache: bool = False,
+                 replay: Optional[ReplayIndex] = None, prompt_budget: Optional[int] = None,
+                 locale: str = "pt") -> Dict[str, Any]:
+    # on_token(stage, token): stage é "plan" ou "patch"; habilita streaming
+    # locale: conjunto(s) de palavras-chave de risco/termos vagos da estimativa (core.keywords), ex. "en", "pt+en"
+    # o resultado traz "llm_calls" (uma entrada por chamada) e "usage" (totais, core.usage.summarize_calls)
+    calls: List[Dict[str, Any]] = []
+    with span("pipeline", model=model, stream=on_token is not None) as sp:
+        result = _run_pipeline(base_url, api_key, model, objective, workspace_root, on_token, cache, bypass_cache, replay,
+                               calls, prompt_budget, locale)
+        sp.set(replayed="replayed_from" in result, blocked=result["audit"].get("blocked"))
+    result["llm_calls"] = calls
+    result["usage"] = summarize_calls(calls)
+    return result
+
+def _run_pipeline(base_url: str, api_key: str, model: str, objective: str, workspace_root: str,
+                  on_token: Optional[Callable[[str, str], None]], cache: Optional[ResponseCache], bypass_cache: bool,
+                  replay: Optional[ReplayIndex], calls: List[Dict[str, Any]], prompt_budget: Optional[int],
+                  locale: str) -> Dict[str, Any]:
+    get_scanner(locale)  # locale desconhecido falha antes de gastar chamadas ao LLM
+    if replay is not None:
+        with span("replay") as sp:
+            replayed = _replay_candidate(replay, objective, workspace_root, locale)
+            sp.set(hit=replayed is not None)
+        if replayed is not None:
+            return replayed
+    with span("plan"):
+        plan, model_plan = llm_plan(base_url, api_key, model, objective,
+                                    on_token=(lambda t: on_token("plan", t)) if on_token else None,
+                                    cache=cache, bypass_cache=bypass_cache, calls=calls, prompt_budget=prompt_budget)
+    with span("estimate", tasks=len(plan.tasks)):
+        scan = scan_plan(plan, locale)
+        C,U,R,counts = estimate_C_U_R(plan, locale, scan)
+    with span("patch"):
+        patch, model_patch = llm_patch(base_url, api_key, model, objective, plan,
+                                       on_token=(lambda t: on_token("patch", t)) if on_token else None,
+                                       cache=cache, bypass_cache=bypass_cache, calls=calls, prompt_budget=prompt_budget)
+    with span("gate", steps=len(patch.commands)) as sp:
+        audit = analyze_patch(patch, workspace_root=workspace_root)
+        sp.set(blocked=audit.blocked)
     return {
         "plan": plan.model_dump(),
         "patch": patch.model_dump(),
         "audit": audit.model_dump(),
         "metrics": {"C":C,"U":U,"R":R, **counts},
+        "keyword_hits": [h.__dict__ for h in scan.hits],
         "model_used": model_patch or model_plan or model
     }
@@ -15,6 +15,8 @@ Regras:
   - why (motivo real)
   - expects_cmd (UM comando verificável, não texto)
 - Se precisar de privilégio elevado, marque privilege="sudo" (não esconda).
+- Opcional: passos independentes podem declarar depends_on (lista de step_index ANTERIORES)
+  ou parallel_group (mesmo nome = podem rodar juntos). Sem isso, a execução é sequencial.
 """
 
 AUDIT_PROMPT = """Você é o AUDITOR.
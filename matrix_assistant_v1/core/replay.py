@@ -0,0 +1,131 @@
+from __future__ import annotations
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .memory import EpisodeStore, get_store
+
+# palavras sem conteúdo (pt/en), já sem acento
+STOPWORDS = frozenset(
+    "a o e de da do das dos em no na nos nas um uma uns umas para pra por com sem que se ao aos "
+    "meu minha the and of to in on for with an is it".split()
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9._+-]*")
+
+def normalize_tokens(text: str) -> List[str]:
+    # minúsculas, sem acentos; mantém tokens técnicos (python3.11, g++, docker-compose)
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [t.strip(".-") for t in _TOKEN_RE.findall(text) if t.strip(".-") and t not in STOPWORDS]
+
+@dataclass
+class ReplayCandidate:
+    episode_id: int
+    score: float
+    user_input: str
+    plan: Dict[str, Any]
+    patch: Dict[str, Any]
+    model_used: Optional[str]
+
+class ReplayIndex:
+    """Índice TF-IDF em memória sobre o user_input dos episódios bem-sucedidos.
+
+    Atualização incremental: cada busca lê só os episódios com id acima do último visto.
+    """
+
+    def __init__(self, store: EpisodeStore, min_score: float = 0.75):
+        self.store = store
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._hwm = 0
+        self._docs: Dict[int, Counter] = {}
+        self._text: Dict[int, str] = {}
+        self._df: Counter = Counter()
+        self._postings: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def refresh(self) -> int:
+        rows = self.store.reader().execute(
+            "SELECT id, user_input FROM episodes WHERE success = 1 AND id > ? "
+            "AND (patch_hash IS NOT NULL OR patch_json IS NOT NULL) ORDER BY id",
+            (self._hwm,),
+        ).fetchall()
+        with self._lock:
+            for eid, text in rows:
+                self._add(eid, text)
+                self._hwm = max(self._hwm, eid)
+        return len(rows)
+
+    def _add(self, eid: int, text: str) -> None:
+        tf = Counter(normalize_tokens(text))
+        if not tf or eid in self._docs:
+            return
+        self._docs[eid] = tf
+        self._text[eid] = text
+        for term in tf:
+            self._df[term] += 1
+            self._postings.setdefault(term, set()).add(eid)
+
+    def _forget(self, eid: int) -> None:
+        with self._lock:
+            tf = self._docs.pop(eid, None)
+            self._text.pop(eid, None)
+            for term in tf or ():
+                self._df[term] -= 1
+                self._postings[term].discard(eid)
+
+    def _weights(self, tf: Counter, n_docs: int) -> Dict[str, float]:
+        # idf suavizado: nunca zera, mesmo para termo presente em todos os documentos
+        return {t: (1 + math.log(c)) * (math.log((1 + n_docs) / (1 + self._df.get(t, 0))) + 1) for t, c in tf.items()}
+
+    def search(self, objective: str, k: int = 3) -> List[Tuple[int, float]]:
+        """(episode_id, cosseno) dos k mais parecidos; empate favorece o episódio mais recente."""
+        self.refresh()
+        q_tf = Counter(normalize_tokens(objective))
+        if not q_tf:
+            return []
+        with self._lock:
+            n = len(self._docs)
+            q = self._weights(q_tf, n)
+            q_norm = math.sqrt(sum(w * w for w in q.values()))
+            candidates = set().union(*(self._postings.get(t, ()) for t in q))
+            scored = []
+            for eid in candidates:
+                d = self._weights(self._docs[eid], n)
+                d_norm = math.sqrt(sum(w * w for w in d.values()))
+                dot = sum(w * d.get(t, 0.0) for t, w in q.items())
+                scored.append((eid, dot / (q_norm * d_norm)))
+        scored.sort(key=lambda x: (-x[1], -x[0]))
+        return scored[:k]
+
+    def best(self, objective: str, min_score: Optional[float] = None) -> Optional[ReplayCandidate]:
+        threshold = self.min_score if min_score is None else min_score
+        for eid, score in self.search(objective):
+            if score < threshold:
+                break
+            ep = self.store.get(eid, payloads=("plan", "patch"))
+            if ep is None or not ep.get("plan") or not ep.get("patch"):
+                self._forget(eid)  # apagado pela manutenção (ou sem payload)
+                continue
+            return ReplayCandidate(eid, round(score, 4), ep["user_input"], ep["plan"], ep["patch"], ep.get("model_used"))
+        return None
+
+# um índice por DB, compartilhado entre sessões
+_indexes: Dict[str, ReplayIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_replay_index(db_path: str) -> ReplayIndex:
+    key = os.path.realpath(db_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = ReplayIndex(get_store(db_path))
+        return index
@@ -13,6 +13,13 @@ class Plan(BaseModel):
     constraints: List[str] = []
     artifacts: List[str] = []
 
+class StepLimits(BaseModel):
+    # limites por passo (aplicados via ulimit/rlimit no processo do comando)
+    timeout_s: Optional[float] = Field(default=None, gt=0)
+    max_memory_mb: Optional[int] = Field(default=None, gt=0)
+    max_cpu_s: Optional[int] = Field(default=None, gt=0)
+    max_output_bytes: Optional[int] = Field(default=None, gt=0)
+
 class Command(BaseModel):
     step_index: int = Field(ge=1)
     cmd: str
@@ -20,6 +27,10 @@ class Command(BaseModel):
     expects_cmd: str  # SEMPRE um comando verificável (não texto)
 
     privilege: Literal["user","sudo"] = "user"
+    # opcional: execução em DAG (passos independentes rodam em paralelo)
+    depends_on: Optional[List[int]] = None
+    parallel_group: Optional[str] = None
+    limits: Optional[StepLimits] = None
 
     @field_validator("expects_cmd")
     @classmethod
@@ -0,0 +1,516 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from pydantic import ValidationError
+
+from .cache import get_cache
+from .gate import analyze_patch
+from .jobs import execute_recorded, run_pipeline_recorded
+from .memory import get_store
+from .replay import get_replay_index
+from .schemas import Patch
+from .usage import PromptTooLarge
+
+MAX_BODY_BYTES = 1024 * 1024
+MAX_HEADERS = 100
+MAX_PAGE = 200
+CONFIRM_PHRASE = "EXECUTAR"
+SUDO_PHRASE = "AUTORIZO_SUDO"
+# nomes aceitos no cabeçalho Host/Origin (além do host do bind): barra DNS rebinding e páginas de outros sites
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+WILDCARD_HOSTS = ("", "0.0.0.0", "::")
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, **extra: Any):
+        super().__init__(message)
+        self.status = status
+        self.body = {"error": message, **extra}
+
+class ClientGone(Exception):
+    """O cliente do stream desconectou: a geração em andamento é interrompida."""
+
+@dataclass
+class ServiceConfig:
+    base_url: str
+    api_key: str
+    model: str
+    workspace_root: str
+    db_path: str = ""  # vazio = <workspace_root>/matrix_assistant.db
+    cwd: str = ""  # onde /v1/execute roda os comandos; vazio = workspace_root
+    cache_path: str = ""  # vazio = sem cache de respostas LLM
+    replay: bool = False
+    allow_sudo_exec: bool = False
+    max_workers: int = 8
+    token: str = ""  # se definido, exige "Authorization: Bearer <token>"
+    # sem token, /v1/execute só roda com esta opção explícita (--insecure-no-auth)
+    insecure_no_auth: bool = False
+    allowed_hosts: Tuple[str, ...] = LOCAL_HOSTS  # Host/Origin aceitos (o host do bind entra sozinho)
+
+    def __post_init__(self) -> None:
+        self.db_path = self.db_path or os.path.join(self.workspace_root, "matrix_assistant.db")
+        self.cwd = self.cwd or self.workspace_root
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: Dict[str, str]
+    headers: Dict[str, str]
+    body: bytes = b""
+    _json: Any = field(default=None, repr=False)
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+
+    def json(self) -> Dict[str, Any]:
+        if self._json is None:
+            try:
+                self._json = json.loads(self.body or b"{}")
+            except ValueError as e:
+                raise HTTPError(400, f"JSON inválido: {e}")
+            if not isinstance(self._json, dict):
+                raise HTTPError(400, "O corpo deve ser um objeto JSON.")
+        return self._json
+
+    @property
+    def wants_stream(self) -> bool:
+        # SSE por ?stream=1, "stream": true no corpo ou Accept: text/event-stream
+        if self.query.get("stream") in ("1", "true") or "text/event-stream" in self.headers.get("accept", ""):
+            return True
+        return self.method == "POST" and bool(self.json().get("stream"))
+
+class _Conn:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.keep_alive = True
+        self.streaming = False
+
+    async def send_json(self, status: int, body: Any) -> None:
+        data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                + ("" if self.keep_alive else "Connection: close\r\n") + "\r\n")
+        self.writer.write(head.encode("latin-1") + data)
+        await self.writer.drain()
+
+    async def start_stream(self) -> None:
+        # SSE sem Content-Length: a conexão fecha no fim do stream
+        self.keep_alive = False
+        self.streaming = True
+        self.writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n"
+                          b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        await self.writer.drain()
+
+    async def event(self, name: str, data: Any) -> None:
+        payload = json.dumps(data, ensure_ascii=False, default=str)
+        self.writer.write(f"event: {name}\ndata: {payload}\n\n".encode("utf-8"))
+        await self.writer.drain()
+
+Emit = Callable[[str, Dict[str, Any]], None]
+Handler = Callable[[Request, _Conn], Awaitable[Optional[Dict[str, Any]]]]
+
+class AssistantService:
+    """Serviço HTTP local (asyncio) para orquestrador, gate, executor e episódios.
+
+    O laço de eventos só faz I/O de rede; LLM, shell e SQLite rodam num pool de threads
+    (`max_workers` chamadas simultâneas, as demais esperam na fila do pool). Todo pedido
+    precisa de Host local (ou de `allowed_hosts`), nenhum Origin de outro site e, com corpo,
+    Content-Type application/json: assim uma página aberta no navegador não consegue
+    disparar /v1/execute (POST text/plain não passa por CORS). Sem `token`, /v1/execute
+    recusa a menos que `insecure_no_auth` esteja ligado. Endpoints:
+
+      POST /v1/plan      {"objective", "bypass_cache"?, "stream"?}  PLANO + PATCH + gate
+      POST /v1/audit     {"patch"}                                  gate sobre um PATCH
+      POST /v1/execute   {"user_input", "patch", "confirm": "EXECUTAR", "approve_sudo"?, "sudo_confirm"?, ...}
+      GET  /v1/episodes  ?text=&model_used=&success=&before_id=&limit=
+      GET  /v1/episodes/<id>                                        episódio + chamadas ao LLM
+      GET  /v1/usage     ?group_by=model|stage|episode_id|day&since=&until=&model=
+      GET  /healthz
+
+    Com stream, /v1/plan envia eventos SSE "token" e /v1/execute eventos "output"; o fim é
+    um evento "result" (ou "error").
+    """
+
+    def __init__(self, config: ServiceConfig):
+        self.config = config
+        os.makedirs(config.workspace_root, exist_ok=True)
+        get_store(config.db_path)  # schema/migrações antes do primeiro pedido
+        self.pool = ThreadPoolExecutor(max_workers=config.max_workers, thread_name_prefix="service")
+        self.in_flight = 0
+        self._hosts = {h.lower().strip("[]") for h in config.allowed_hosts}
+        self._conns: set = set()  # tasks das conexões abertas (canceladas no stop)
+        self._routes: Dict[Tuple[str, str], Handler] = {
+            ("POST", "/v1/plan"): self.plan,
+            ("POST", "/v1/audit"): self.audit,
+            ("POST", "/v1/execute"): self.execute,
+            ("GET", "/v1/episodes"): self.episodes,
+            ("GET", "/v1/usage"): self.usage,
+            ("GET", "/healthz"): self.healthz,
+        }
+
+    # ---------------- infraestrutura ----------------
+    async def _offload(self, fn: Callable[..., Any], *args: Any) -> Any:
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def _run(self, req: Request, conn: _Conn, work: Callable[[Emit, threading.Event], Any]) -> Optional[Dict[str, Any]]:
+        """Roda work(emit, cancel) no pool; com stream, repassa cada emit como evento SSE."""
+        cancel = threading.Event()
+        if not req.wants_stream:
+            return await self._offload(work, lambda name, data: None, cancel)
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def emit(name: str, data: Dict[str, Any]) -> None:
+            if not cancel.is_set():
+                loop.call_soon_threadsafe(queue.put_nowait, (name, data))
+
+        task = asyncio.ensure_future(self._offload(work, emit, cancel))
+        # o fim do trabalho entra na fila depois de todos os eventos já emitidos
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        await conn.start_stream()
+        try:
+            while (item := await queue.get()) is not None:
+                await conn.event(*item)
+            try:
+                await conn.event("result", task.result())
+            except Exception as e:
+                status, body = self._error_body(e)
+                await conn.event("error", {"status": status, **body})
+        except (ConnectionError, asyncio.CancelledError):
+            cancel.set()  # cliente foi embora: o pipeline para no próximo token
+            raise
+        return None
+
+    @staticmethod
+    def _error_body(e: BaseException) -> Tuple[int, Dict[str, Any]]:
+        if isinstance(e, HTTPError):
+            return e.status, e.body
+        if isinstance(e, PromptTooLarge):
+            return 413, {"error": str(e), "estimated_tokens": e.estimated_tokens, "budget": e.budget}
+        if isinstance(e, ValidationError):
+            return 400, {"error": "Dados inválidos.", "details": json.loads(e.json())}
+        if isinstance(e, (ValueError, KeyError, TypeError)):
+            return 400, {"error": f"{type(e).__name__}: {e}"}
+        if isinstance(e, requests.RequestException):
+            return 502, {"error": f"Falha na API do LLM: {type(e).__name__}: {e}"}
+        return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "Linha de requisição inválida.")
+        headers: Dict[str, str] = {}
+        while True:
+            h = await reader.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HTTPError(431, "Cabeçalhos demais.")
+            name, _, value = h.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HTTPError(400, "Content-Length inválido.")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, f"Corpo acima de {MAX_BODY_BYTES} bytes.")
+        body = await reader.readexactly(length) if length else b""
+        url = urlsplit(target)
+        return Request(method.upper(), url.path.rstrip("/") or "/", dict(parse_qsl(url.query)), headers, body)
+
+    @staticmethod
+    def _hostname(value: str) -> str:
+        # "host:porta", "[::1]:porta" ou URL de Origin -> só o nome, minúsculo
+        netloc = urlsplit(value).netloc if "://" in value else value
+        if netloc.startswith("["):
+            return netloc[1:].partition("]")[0].lower()
+        return netloc.rpartition(":")[0].lower() if netloc.count(":") == 1 else netloc.lower()
+
+    def _check_origin(self, req: Request) -> None:
+        host = req.headers.get("host", "")
+        if not host or self._hostname(host) not in self._hosts:
+            raise HTTPError(403, f"Host não permitido: {host or '(vazio)'}.")
+        origin = req.headers.get("origin")
+        if origin is not None and self._hostname(origin) not in self._hosts:
+            raise HTTPError(403, f"Origin não permitido: {origin}.")
+        if (req.method == "POST" or req.body) and req.content_type != "application/json":
+            raise HTTPError(415, "Content-Type deve ser application/json.")
+
+    def _route(self, req: Request) -> Handler:
+        self._check_origin(req)
+        if self.config.token and req.path != "/healthz":
+            auth = req.headers.get("authorization", "")
+            if not hmac.compare_digest(auth, f"Bearer {self.config.token}"):
+                raise HTTPError(401, "Token inválido.")
+        handler = self._routes.get((req.method, req.path))
+        if handler is not None:
+            return handler
+        if req.path.startswith("/v1/episodes/"):
+            if req.method != "GET":
+                raise HTTPError(405, "Método não permitido.")
+            return self.episode
+        if any(path == req.path for _, path in self._routes):
+            raise HTTPError(405, "Método não permitido.")
+        raise HTTPError(404, f"Rota desconhecida: {req.path}")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        conn = _Conn(writer)
+        task = asyncio.current_task()
+        self._conns.add(task)
+        try:
+            while conn.keep_alive:
+                try:
+                    req = await self._read_request(reader)
+                except HTTPError as e:
+                    conn.keep_alive = False
+                    await conn.send_json(e.status, e.body)
+                    break
+                if req is None:
+                    break
+                if req.headers.get("connection", "").lower() == "close":
+                    conn.keep_alive = False
+                try:
+                    body = await self._route(req)(req, conn)
+                    if not conn.streaming:
+                        await conn.send_json(200, body)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as e:
+                    if conn.streaming:
+                        break
+                    status, err = self._error_body(e)
+                    await conn.send_json(status, err)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass  # cancelada no stop(): a task termina normalmente, sem traceback no laço
+        finally:
+            self._conns.discard(task)
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8787) -> asyncio.AbstractServer:
+        if host not in WILDCARD_HOSTS:
+            self._hosts.add(host.lower().strip("[]"))
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def close_connections(self) -> None:
+        """Cancela as conexões ainda abertas (keep-alive ociosas ou streams) e espera terminarem."""
+        tasks = [t for t in self._conns if not t.done()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def run_in_thread(self, host: str = "127.0.0.1", port: int = 0) -> Tuple[Tuple[str, int], Callable[[], None]]:
+        """Sobe o serviço num laço próprio em background (testes/benchmarks). Devolve (endereço, stop)."""
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name="assistant-service", daemon=True)
+        thread.start()
+        server = asyncio.run_coroutine_threadsafe(self.start(host, port), loop).result()
+
+        def stop() -> None:
+            async def shutdown() -> None:
+                server.close()
+                await self.close_connections()
+                await server.wait_closed()
+            asyncio.run_coroutine_threadsafe(shutdown(), loop).result(5)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(5)
+            self.pool.shutdown(wait=False)
+
+        return server.sockets[0].getsockname()[:2], stop
+
+    # ---------------- endpoints ----------------
+    async def healthz(self, req: Request, conn: _Conn) -> Dict[str, Any]:
+        return {"ok": True, "workers": self.config.max_workers, "in_flight": self.in_flight}
+
+    async def plan(self, req: Request, conn: _Conn) -> Optional[Dict[str, Any]]:
+        data = req.json()
+        objective = str(data.get("objective") or "").strip()
+        if not objective:
+            raise HTTPError(400, "Campo 'objective' obrigatório.")
+        cfg = self.config
+        bypass = bool(data.get("bypass_cache"))
+        cache = get_cache(cfg.cache_path) if cfg.cache_path else None
+        replay = get_replay_index(cfg.db_path) if cfg.replay and not bypass else None
+
+        def work(emit: Emit, cancel: threading.Event) -> Dict[str, Any]:
+            def on_token(stage: str, token: str) -> None:
+                if cancel.is_set():
+                    raise ClientGone()
+                emit("token", {"stage": stage, "token": token})
+
+            return run_pipeline_recorded(cfg.db_path, cfg.base_url, cfg.api_key, cfg.model, objective, cfg.workspace_root,
+                                         on_token=on_token if req.wants_stream else None, cache=cache,
+                                         bypass_cache=bypass, replay=replay)
+
+        return await self._run(req, conn, work)
+
+    async def audit(self, req: Request, conn: _Conn) -> Dict[str, Any]:
+        patch = Patch.model_validate(req.json().get("patch"))
+        return {"audit": analyze_patch(patch, workspace_root=self.config.workspace_root).model_dump()}
+
+    async def execute(self, req: Request, conn: _Conn) -> Optional[Dict[str, Any]]:
+        data = req.json()
+        cfg = self.config
+        if not cfg.token and not cfg.insecure_no_auth:
+            raise HTTPError(403, "Execução desabilitada sem token: inicie com --token (ou --insecure-no-auth).")
+        metrics = data.get("metrics")
+        if metrics is not None and not isinstance(metrics, dict):
+            raise HTTPError(400, "Campo 'metrics' deve ser um objeto.")
+        if data.get("plan") is not None and not isinstance(data["plan"], dict):
+            raise HTTPError(400, "Campo 'plan' deve ser um objeto ou null.")
+        if data.get("llm_calls") is not None and not isinstance(data["llm_calls"], list):
+            raise HTTPError(400, "Campo 'llm_calls' deve ser uma lista.")
+        patch = Patch.model_validate(data.get("patch"))
+        # o gate roda de novo aqui: nunca confia numa auditoria vinda do cliente
+        audit = analyze_patch(patch, workspace_root=cfg.workspace_root)
+        if audit.blocked:
+            raise HTTPError(409, "Execução bloqueada pelo gate.", audit=audit.model_dump())
+        if str(data.get("confirm", "")).strip() != CONFIRM_PHRASE:
+            raise HTTPError(403, f"Confirmação inválida. Envie confirm={CONFIRM_PHRASE}.")
+        approve_user = bool(data.get("approve_user", True))
+        approve_sudo = bool(data.get("approve_sudo", False))
+        if not approve_user and not approve_sudo:
+            raise HTTPError(400, "Nenhuma execução aprovada.")
+        if approve_sudo and str(data.get("sudo_confirm", "")).strip() != SUDO_PHRASE:
+            raise HTTPError(403, f"SUDO não autorizado. Envie sudo_confirm={SUDO_PHRASE}.")
+
+        is_sudo = [c.privilege == "sudo" or c.cmd.strip().startswith("sudo") for c in patch.commands]
+        cmds_user = [c for c, sudo in zip(patch.commands, is_sudo) if not sudo]
+        cmds_sudo = [c for c, sudo in zip(patch.commands, is_sudo) if sudo]
+        to_run = (cmds_user if approve_user else []) + (cmds_sudo if approve_sudo else [])
+        episode = {
+            "user_input": str(data.get("user_input") or ""),
+            "plan": data.get("plan"),
+            "patch": patch.model_dump(),
+            "audit": audit.model_dump(),
+            "model_used": data.get("model_used"),
+            "metrics": metrics or {},
+            "had_sudo": bool(cmds_sudo),
+            "trace": data.get("trace") if isinstance(data.get("trace"), dict) else None,
+            "llm_calls": [c for c in data.get("llm_calls") or () if isinstance(c, dict)],
+        }
+
+        def work(emit: Emit, cancel: threading.Event) -> Dict[str, Any]:
+            # comandos já iniciados não são interrompidos se o cliente sair: o episódio é gravado igual
+            def on_output(step_index: int, stream: str, line: str) -> None:
+                emit("output", {"step_index": step_index, "stream": stream, "line": line})
+
+            result = execute_recorded(cfg.db_path, to_run, cfg.cwd, episode, allow_sudo_exec=cfg.allow_sudo_exec,
+                                      verify=str(data.get("verify") or "inline"), on_output=on_output)
+            return {**result, "audit": episode["audit"]}
+
+        return await self._run(req, conn, work)
+
+    async def episodes(self, req: Request, conn: _Conn) -> Dict[str, Any]:
+        q = req.query
+        flag = {"1": True, "true": True, "0": False, "false": False}
+        try:
+            limit = min(int(q.get("limit", 50)), MAX_PAGE)
+            before_id = int(q["before_id"]) if q.get("before_id") else None
+        except ValueError:
+            raise HTTPError(400, "limit/before_id devem ser inteiros.")
+        filters = {
+            "since": q.get("since"),
+            "until": q.get("until"),
+            "model_used": q.get("model_used"),
+            "success": flag.get(q.get("success", "")),
+            "had_sudo": flag.get(q.get("had_sudo", "")),
+            "text": q.get("text"),
+            "before_id": before_id,
+            "limit": limit,
+        }
+        rows = await self._offload(lambda: get_store(self.config.db_path).query(**filters))
+        # paginação por chave: a próxima página começa antes do último id
+        return {"episodes": rows, "next_before_id": rows[-1]["id"] if len(rows) == limit else None}
+
+    async def episode(self, req: Request, conn: _Conn) -> Dict[str, Any]:
+        try:
+            episode_id = int(req.path.rsplit("/", 1)[1])
+        except ValueError:
+            raise HTTPError(404, f"Rota desconhecida: {req.path}")
+        store = get_store(self.config.db_path)
+        ep = await self._offload(store.get, episode_id)
+        if ep is None:
+            raise HTTPError(404, f"Episódio {episode_id} não encontrado.")
+        ep["llm_calls"] = await self._offload(store.llm_calls, episode_id)
+        return ep
+
+    async def usage(self, req: Request, conn: _Conn) -> Dict[str, Any]:
+        q = req.query
+        group_by = q.get("group_by", "model")
+        rows = await self._offload(lambda: get_store(self.config.db_path).llm_usage(
+            group_by, since=q.get("since"), until=q.get("until"), model=q.get("model")))
+        return {"group_by": group_by, "usage": rows}
+
+def main(argv: Optional[list] = None) -> int:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    ap = argparse.ArgumentParser(description="Serviço HTTP local: plan/audit/execute/episodes (UI: streamlit run app.py)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8787)
+    ap.add_argument("-w", "--workers", type=int, default=8, help="chamadas simultâneas (LLM/shell/DB)")
+    ap.add_argument("--base-url", default=os.getenv("LLM_BASE_URL", ""))
+    ap.add_argument("--api-key", default=os.getenv("LLM_API_KEY", ""))
+    ap.add_argument("--model", default=os.getenv("LLM_MODEL", ""))
+    ap.add_argument("--workspace-root", default=os.getenv("WORKSPACE_ROOT", os.path.expanduser("~/assistant_workspace")))
+    ap.add_argument("--db", default="", help="DB de episódios (padrão: <workspace>/matrix_assistant.db)")
+    ap.add_argument("--cache", default="", help="caminho do cache de respostas LLM (vazio = sem cache)")
+    ap.add_argument("--replay", action="store_true", help="reusa episódios bem-sucedidos parecidos")
+    ap.add_argument("--allow-sudo-exec", action="store_true", default=os.getenv("ALLOW_SUDO_EXEC", "0") == "1")
+    ap.add_argument("--token", default=os.getenv("SERVICE_TOKEN", ""), help="exige Authorization: Bearer <token>")
+    ap.add_argument("--insecure-no-auth", action="store_true",
+                    help="permite /v1/execute sem token (qualquer processo local pode executar comandos)")
+    ap.add_argument("--allow-host", action="append", default=[],
+                    help="nome extra aceito em Host/Origin (ex.: o IP da máquina com --host 0.0.0.0)")
+    args = ap.parse_args(argv)
+
+    if not args.base_url or not args.api_key or not args.model:
+        ap.error("Configure LLM_BASE_URL, LLM_API_KEY e LLM_MODEL (env/.env ou argumentos).")
+    if args.workers < 1:
+        ap.error("--workers deve ser >= 1")
+
+    service = AssistantService(ServiceConfig(
+        base_url=args.base_url, api_key=args.api_key, model=args.model, workspace_root=args.workspace_root,
+        db_path=args.db, cache_path=args.cache, replay=args.replay, allow_sudo_exec=args.allow_sudo_exec,
+        max_workers=args.workers, token=args.token, insecure_no_auth=args.insecure_no_auth,
+        allowed_hosts=LOCAL_HOSTS + tuple(args.allow_host),
+    ))
+
+    async def serve() -> None:
+        server = await service.start(args.host, args.port)
+        print(f"serviço em http://{args.host}:{args.port}", flush=True)
+        if not args.token and not args.insecure_no_auth:
+            print("sem --token: /v1/execute fica desabilitado", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,213 @@
+from __future__ import annotations
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# tracing ligado por padrão nos fluxos que gravam episódio (MATRIX_TRACE=0 desliga)
+TRACE_ENABLED = os.getenv("MATRIX_TRACE", "1") == "1"
+
+@dataclass
+class Span:
+    id: int
+    parent: Optional[int]
+    name: str
+    start: float  # segundos desde o início do trace (relógio monotônico)
+    thread: str
+    end: Optional[float] = None
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else self.start) - self.start
+
+class Trace:
+    """Spans de uma execução: início/fim monotônicos, atributos e aninhamento (parent)."""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.wall0 = time.time()
+        self.spans: List[Span] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _open(self, name: str, parent: Optional[int], attrs: Dict[str, Any]) -> Span:
+        s = Span(next(self._ids), parent, name, time.perf_counter() - self.t0, threading.current_thread().name, attrs=attrs)
+        with self._lock:
+            self.spans.append(s)
+        return s
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Forma persistida com o episódio: {"wall0": epoch, "spans": [...]}."""
+        with self._lock:
+            spans = list(self.spans)
+        return {"wall0": self.wall0, "spans": [_span_dict(s) for s in spans]}
+
+def _span_dict(s: Span) -> Dict[str, Any]:
+    d = {"id": s.id, "parent": s.parent, "name": s.name, "start": round(s.start, 6),
+         "dur": round(s.duration, 6), "thread": s.thread}
+    if s.attrs:
+        d["attrs"] = s.attrs
+    return d
+
+# trace ativo + span corrente (pai dos próximos); None = desligado
+_active: ContextVar[Optional[Tuple[Trace, Optional[int]]]] = ContextVar("matrix_trace", default=None)
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+_NOOP = _NoopSpan()
+
+class _LiveSpan:
+    __slots__ = ("_trace", "_parent", "_name", "_attrs", "_span", "_token")
+
+    def __init__(self, trace: Trace, parent: Optional[int], name: str, attrs: Dict[str, Any]):
+        self._trace, self._parent, self._name, self._attrs = trace, parent, name, attrs
+
+    def __enter__(self) -> "_LiveSpan":
+        self._span = self._trace._open(self._name, self._parent, self._attrs)
+        self._token = _active.set((self._trace, self._span.id))
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._span.end = time.perf_counter() - self._trace.t0
+        if exc_type is not None:
+            self._span.attrs["error"] = exc_type.__name__
+        _active.reset(self._token)
+        return False
+
+    def set(self, **attrs: Any) -> None:
+        self._span.attrs.update(attrs)
+
+def span(name: str, **attrs: Any):
+    """`with span("gate", steps=3) as sp: ...; sp.set(blocked=True)`. Sem trace ativo não grava nada."""
+    cur = _active.get()
+    if cur is None:
+        return _NOOP
+    return _LiveSpan(cur[0], cur[1], name, attrs)
+
+def enabled() -> bool:
+    # para não calcular atributos caros à toa
+    return _active.get() is not None
+
+@contextmanager
+def tracing(trace: Optional[Trace] = None) -> Iterator[Trace]:
+    """Ativa um trace para o bloco (e para o que ele chamar na mesma thread/contexto)."""
+    trace = trace or Trace()
+    token = _active.set((trace, None))
+    try:
+        yield trace
+    finally:
+        _active.reset(token)
+
+def bind(fn: Callable) -> Callable:
+    """fn para rodar em outra thread (pool) dentro do trace/span corrente de quem submete."""
+    cur = _active.get()
+    if cur is None:
+        return fn
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        token = _active.set(cur)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _active.reset(token)
+
+    return run
+
+# ---------------- traces persistidos (dicts) ----------------
+def merge_traces(*traces: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Junta traces (ex.: geração + execução do mesmo episódio) numa linha do tempo só."""
+    traces = tuple(t for t in traces if t and t.get("spans"))
+    if not traces:
+        return None
+    wall0 = min(t["wall0"] for t in traces)
+    spans: List[Dict[str, Any]] = []
+    offset = 0
+    for t in traces:
+        shift = t["wall0"] - wall0
+        for s in t["spans"]:
+            spans.append({**s, "id": s["id"] + offset, "parent": None if s["parent"] is None else s["parent"] + offset,
+                          "start": round(s["start"] + shift, 6)})
+        offset += max(s["id"] for s in t["spans"])
+    return {"wall0": wall0, "spans": spans}
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    k = max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+def stage_summary(traces: Iterable[Optional[Dict[str, Any]]]) -> Dict[str, Dict[str, float]]:
+    """Latência por etapa (nome do span) sobre um ou mais traces: count, total, p50, p95, max (s)."""
+    by_name: Dict[str, List[float]] = {}
+    for t in traces:
+        for s in (t or {}).get("spans", ()):
+            by_name.setdefault(s["name"], []).append(s["dur"])
+    out: Dict[str, Dict[str, float]] = {}
+    for name, durs in sorted(by_name.items(), key=lambda kv: -sum(kv[1])):
+        durs.sort()
+        out[name] = {"count": len(durs), "total_s": round(sum(durs), 6), "p50_s": _percentile(durs, 50),
+                     "p95_s": _percentile(durs, 95), "max_s": durs[-1]}
+    return out
+
+def to_chrome_trace(trace: Dict[str, Any], pid: int = 1) -> Dict[str, Any]:
+    """Formato trace-event do Chrome (chrome://tracing, Perfetto): eventos "X" em microssegundos."""
+    tids: Dict[str, int] = {}
+    events: List[Dict[str, Any]] = []
+    for s in trace.get("spans", ()):
+        tid = tids.setdefault(s.get("thread", "main"), len(tids) + 1)
+        events.append({"name": s["name"], "cat": s["name"].split(".", 1)[0], "ph": "X", "pid": pid, "tid": tid,
+                       "ts": round(s["start"] * 1e6, 3), "dur": round(s["dur"] * 1e6, 3), "args": s.get("attrs", {})})
+    for thread, tid in tids.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread}})
+    return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"wall0": trace.get("wall0")}}
+
+def main(argv: Optional[list] = None) -> int:
+    from .memory import get_store
+
+    ap = argparse.ArgumentParser(description="Traces dos episódios: exportar (Chrome) ou resumir por etapa")
+    ap.add_argument("--db", default=os.path.join(os.getenv("WORKSPACE_ROOT", os.path.expanduser("~/assistant_workspace")),
+                                                 "matrix_assistant.db"))
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="trace de um episódio em JSON trace-event")
+    ex.add_argument("episode_id", type=int)
+    ex.add_argument("-o", "--output", default="-")
+    sm = sub.add_parser("summary", help="latência por etapa dos últimos episódios")
+    sm.add_argument("--last", type=int, default=50)
+    args = ap.parse_args(argv)
+
+    store = get_store(args.db)
+    if args.cmd == "export":
+        ep = store.get(args.episode_id, payloads=("trace",))
+        if ep is None or not ep.get("trace"):
+            print(f"Episódio {args.episode_id} sem trace.", file=sys.stderr)
+            return 1
+        text = json.dumps(to_chrome_trace(ep["trace"]), ensure_ascii=False)
+        if args.output == "-":
+            print(text)
+        else:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(text)
+        return 0
+    rows = store.query(limit=args.last, include_json=("trace",))
+    print(json.dumps(stage_summary(r["trace"] for r in rows), ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
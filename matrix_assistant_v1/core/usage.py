@@ -0,0 +1,82 @@
+from __future__ import annotations
+import json
+import math
+import os
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+# estimativa sem tokenizer: ~4 caracteres por token (texto misto pt/en + JSON), arredondando para cima
+CHARS_PER_TOKEN = 4.0
+# tokens de "moldura" por mensagem (role, separadores) no formato chat
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# orçamento padrão de tokens do prompt (estimados) por chamada; 0 = sem limite
+DEFAULT_PROMPT_BUDGET = int(os.getenv("LLM_PROMPT_BUDGET_TOKENS", "0") or 0)
+
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "bytes_sent", "bytes_received", "latency_s")
+# somas de latência arredondadas (aqui e no rollup do DB) para as duas contas baterem
+LATENCY_DIGITS = 6
+
+class PromptTooLarge(ValueError):
+    """Prompt estimado acima do orçamento: a requisição nem chega a ser enviada."""
+
+    def __init__(self, estimated_tokens: int, budget: int, stage: str = ""):
+        self.estimated_tokens = estimated_tokens
+        self.budget = budget
+        self.stage = stage
+        where = f" ({stage})" if stage else ""
+        super().__init__(f"Prompt{where} estimado em {estimated_tokens} tokens, acima do orçamento de {budget}.")
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+def estimate_prompt_tokens(messages, response_format: Optional[dict] = None) -> int:
+    """Tokens do prompt antes do envio: conteúdo das mensagens + moldura + schema do response_format."""
+    total = sum(estimate_tokens(str(m.get("content") or "")) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+    if response_format:
+        total += estimate_tokens(json.dumps(response_format, ensure_ascii=False, separators=(",", ":")))
+    return total
+
+def check_prompt_budget(messages, response_format: Optional[dict] = None, budget: Optional[int] = None,
+                        stage: str = "") -> int:
+    """Devolve a estimativa; levanta PromptTooLarge se passar de `budget` (None = DEFAULT_PROMPT_BUDGET)."""
+    budget = DEFAULT_PROMPT_BUDGET if budget is None else budget
+    estimated = estimate_prompt_tokens(messages, response_format)
+    if budget and estimated > budget:
+        raise PromptTooLarge(estimated, budget, stage)
+    return estimated
+
+@dataclass
+class LLMCall:
+    """Uma chamada ao LLM (ou acerto de cache) como vai para o episódio e para a tabela llm_calls."""
+    stage: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    prompt_tokens_est: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    latency_s: float = 0.0
+    stream: bool = False
+    cached: bool = False
+    # True quando o servidor não mandou "usage" (ex.: stream) e os tokens são estimados
+    estimated: bool = False
+
+    @classmethod
+    def from_response(cls, stage: str, model: str, usage: Optional[Dict[str, Any]], prompt_tokens_est: int,
+                      content: str, **kwargs: Any) -> "LLMCall":
+        if usage and usage.get("prompt_tokens") is not None:
+            return cls(stage, model, int(usage["prompt_tokens"]), int(usage.get("completion_tokens") or 0),
+                       prompt_tokens_est, **kwargs)
+        return cls(stage, model, prompt_tokens_est, estimate_tokens(content), prompt_tokens_est, estimated=True, **kwargs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+def summarize_calls(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totais de uma lista de chamadas (as de um episódio): calls, cache_hits e USAGE_FIELDS."""
+    out: Dict[str, Any] = {"calls": len(calls), "cache_hits": sum(1 for c in calls if c.get("cached"))}
+    for f in USAGE_FIELDS:
+        out[f] = sum(c.get(f) or 0 for c in calls)
+    out["latency_s"] = round(out["latency_s"], LATENCY_DIGITS)
+    return out
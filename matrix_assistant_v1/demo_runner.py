@@ -1,2 +1,120 @@
-# Demo runner (CLI) - opcional
-print("Use: streamlit run app.py")
+# Demo runner (CLI) - execução em lote do pipeline (para a UI: streamlit run app.py)
+#
+# Lê objetivos em JSONL (arquivo ou stdin), roda run_pipeline com concorrência limitada
+# e escreve um resultado JSONL por objetivo, na ordem de conclusão, com o índice de entrada.
+#
+#   python demo_runner.py -i objetivos.jsonl -w 8 > resultados.jsonl
+#   echo '{"objective": "instalar git e verificar versão"}' | python demo_runner.py
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from core.orchestrator import run_pipeline
+from core.cache import get_cache
+from core.replay import get_replay_index
+
+def read_objectives(stream) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    # cada linha: {"objective": "...", "workspace_root": "..."} ou apenas "objetivo" (string JSON)
+    for idx, line in enumerate(stream):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            yield idx, {"error": f"JSON inválido: {e}"}
+            continue
+        if isinstance(item, str):
+            item = {"objective": item}
+        if not isinstance(item, dict) or not str(item.get("objective", "")).strip():
+            yield idx, {"error": "linha sem 'objective'"}
+            continue
+        yield idx, item
+
+def _run_one(idx: int, item: Dict[str, Any], args, cache, replay=None) -> Dict[str, Any]:
+    t0 = time.monotonic()
+    out: Dict[str, Any] = {"index": idx, "objective": item.get("objective")}
+    if "error" in item:
+        out.update(ok=False, error=item["error"])
+    else:
+        try:
+            result = run_pipeline(
+                args.base_url, args.api_key, item.get("model") or args.model,
+                str(item["objective"]).strip(),
+                item.get("workspace_root") or args.workspace_root,
+                cache=cache, bypass_cache=args.bypass_cache, replay=replay,
+            )
+            out.update(ok=True, result=result)
+        except Exception as e:
+            out.update(ok=False, error=f"{type(e).__name__}: {e}")
+    # toda linha de saída tem elapsed_s, inclusive as de entrada inválida
+    out["elapsed_s"] = round(time.monotonic() - t0, 3)
+    return out
+
+def run_batch(args, src, dst) -> int:
+    cache = get_cache(args.cache) if args.cache else None
+    replay = get_replay_index(args.replay_db) if args.replay_db else None
+    failures = 0
+    items = read_objectives(src)
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            # mantém no máximo 2*workers tarefas em voo (não carrega o arquivo inteiro)
+            while not exhausted and len(pending) < 2 * args.workers:
+                nxt = next(items, None)
+                if nxt is None:
+                    exhausted = True
+                    break
+                pending.add(pool.submit(_run_one, nxt[0], nxt[1], args, cache, replay))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                out = fut.result()
+                failures += 0 if out["ok"] else 1
+                dst.write(json.dumps(out, ensure_ascii=False) + "\n")
+                dst.flush()
+    return failures
+
+def main(argv: Optional[list] = None) -> int:
+    load_dotenv()
+    ap = argparse.ArgumentParser(description="Roda o pipeline (PLANO + PATCH + gate) em lote. UI: streamlit run app.py")
+    ap.add_argument("-i", "--input", default="-", help="arquivo JSONL de objetivos ('-' = stdin)")
+    ap.add_argument("-o", "--output", default="-", help="arquivo JSONL de saída ('-' = stdout)")
+    ap.add_argument("-w", "--workers", type=int, default=4, help="máximo de pipelines simultâneos")
+    ap.add_argument("--base-url", default=os.getenv("LLM_BASE_URL", ""))
+    ap.add_argument("--api-key", default=os.getenv("LLM_API_KEY", ""))
+    ap.add_argument("--model", default=os.getenv("LLM_MODEL", ""))
+    ap.add_argument("--workspace-root", default=os.getenv("WORKSPACE_ROOT", os.path.expanduser("~/assistant_workspace")))
+    ap.add_argument("--cache", default="", help="caminho do cache de respostas LLM (vazio = sem cache)")
+    ap.add_argument("--bypass-cache", action="store_true", help="ignora leituras do cache (ainda grava)")
+    ap.add_argument("--replay-db", default="", help="DB de episódios para replay de objetivos já resolvidos (vazio = desligado)")
+    args = ap.parse_args(argv)
+
+    if not args.base_url or not args.api_key or not args.model:
+        ap.error("Configure LLM_BASE_URL, LLM_API_KEY e LLM_MODEL (env/.env ou argumentos).")
+    if args.workers < 1:
+        ap.error("--workers deve ser >= 1")
+
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        failures = run_batch(args, src, dst)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,36 +3,214 @@
 """
 This module provides real-time health and status monitoring for the system.
 
+The figures come from the episodes DB through small summary tables that are refreshed
+incrementally: each refresh reads only episodes above a high-water-mark id, so opening the
+dashboard never scans the whole DB. They are combined with live SystemMonitor samples.
+
 Functions:
-- get_execution_history(): Retrieves the execution history of the system.
-- compute_health_scores(): Computes health scores based on various metrics.
+- refresh_summaries(): Folds new episodes into the summary tables.
+- maybe_refresh_summaries(): Same, at most once per interval per DB (for UI reruns).
+- get_execution_history(): Retrieves the most recent episodes (index lookup).
+- compute_health_scores(): Computes health scores from the summaries and system samples.
 - format_dashboard_data(): Formats the data for display on a health dashboard.
 """
 
+import bisect
 import datetime
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from core.memory import get_store, query_episodes
+from core.monitoring import SystemMonitor
+
+HEALTH_SCHEMA_SQL = (
+    "CREATE TABLE IF NOT EXISTS health_state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    """CREATE TABLE IF NOT EXISTS health_model (
+  model_used TEXT PRIMARY KEY,
+  episodes INTEGER NOT NULL DEFAULT 0,
+  executed INTEGER NOT NULL DEFAULT 0,
+  successes INTEGER NOT NULL DEFAULT 0,
+  blocked INTEGER NOT NULL DEFAULT 0,
+  sudo INTEGER NOT NULL DEFAULT 0,
+  steps INTEGER NOT NULL DEFAULT 0
+)""",
+    # histograma da latência dos passos (wall_s): o balde k cobre (edge[k-1], edge[k]]
+    "CREATE TABLE IF NOT EXISTS health_latency (bucket INTEGER PRIMARY KEY, count INTEGER NOT NULL)",
+)
+
+MODEL_UPSERT_SQL = """INSERT INTO health_model (model_used, episodes, executed, successes, blocked, sudo, steps)
+VALUES (?,?,?,?,?,?,?)
+ON CONFLICT(model_used) DO UPDATE SET
+  episodes = episodes + excluded.episodes,
+  executed = executed + excluded.executed,
+  successes = successes + excluded.successes,
+  blocked = blocked + excluded.blocked,
+  sudo = sudo + excluded.sudo,
+  steps = steps + excluded.steps"""
+
+HWM_KEY = "episodes_hwm"
+LATENCY_EDGES = tuple(0.01 * 2 ** k for k in range(21))  # 10 ms .. ~2.9 h (erro máx. de 2x)
+REFRESH_BATCH = 500
+
+# último refresh (time.monotonic) por db_path, para maybe_refresh_summaries
+_last_refresh: Dict[str, float] = {}
+_last_refresh_lock = threading.Lock()
+
+def _latency_bucket(wall_s: float) -> int:
+    return min(bisect.bisect_left(LATENCY_EDGES, wall_s), len(LATENCY_EDGES) - 1)
+
+def _hwm(con: sqlite3.Connection) -> int:
+    row = con.execute("SELECT value FROM health_state WHERE key=?", (HWM_KEY,)).fetchone()
+    return row[0] if row else 0
+
+def _ensure_schema(store) -> None:
+    def op(con: sqlite3.Connection) -> None:
+        for sql in HEALTH_SCHEMA_SQL:
+            con.execute(sql)
+    store.write(op)
+
+def refresh_summaries(db_path: str) -> int:
+    """
+    Folds episodes newer than the high-water mark into the summary tables.
+    Returns how many episodes were added.
+    """
+    store = get_store(db_path)
+    _ensure_schema(store)
+    added = 0
+    while True:
+        start = _hwm(store.reader())
+        rows = store.reader().execute(
+            "SELECT id, COALESCE(model_used, ''), approved, success, blocked, had_sudo, exec_hash, exec_json "
+            "FROM episodes WHERE id > ? ORDER BY id LIMIT ?",
+            (start, REFRESH_BATCH),
+        ).fetchall()
+        if not rows:
+            return added
+
+        # agregação (e descompressão do exec) fora da thread escritora; só os upserts passam por ela
+        per_model: Dict[str, List[int]] = {}
+        latency: Dict[int, int] = {}
+        for _, model, approved, success, blocked, sudo, exec_hash, exec_json in rows:
+            steps = store.load_payload(exec_hash) if exec_hash else (json.loads(exec_json) if exec_json else [])
+            m = per_model.setdefault(model, [0, 0, 0, 0, 0, 0])
+            m[0] += 1
+            m[1] += 1 if approved else 0
+            m[2] += 1 if success else 0
+            m[3] += 1 if blocked else 0
+            m[4] += 1 if sudo else 0
+            for step in steps or ():
+                if isinstance(step, dict) and step.get("wall_s"):
+                    m[5] += 1
+                    b = _latency_bucket(float(step["wall_s"]))
+                    latency[b] = latency.get(b, 0) + 1
+        end = rows[-1][0]
 
-# Placeholder for execution history
-execution_history = []
+        def op(con: sqlite3.Connection) -> bool:
+            # outra sessão pode ter avançado o hwm no meio-tempo: nesse caso descarta e relê
+            if _hwm(con) != start:
+                return False
+            con.executemany(MODEL_UPSERT_SQL, [(model, *m) for model, m in per_model.items()])
+            con.executemany(
+                "INSERT INTO health_latency (bucket, count) VALUES (?,?) "
+                "ON CONFLICT(bucket) DO UPDATE SET count = count + excluded.count",
+                list(latency.items()),
+            )
+            con.execute("INSERT OR REPLACE INTO health_state (key, value) VALUES (?,?)", (HWM_KEY, end))
+            return True
 
-def get_execution_history():
+        if store.write(op):
+            added += len(rows)
+
+def maybe_refresh_summaries(db_path: str, min_interval_s: float) -> Optional[int]:
     """
-    Retrieves the execution history of the system.
+    Calls refresh_summaries() unless it already ran for this DB in the last `min_interval_s`
+    seconds (the Streamlit app reruns the whole script on every interaction).
+    Returns how many episodes were added, or None when the refresh was skipped.
     """
-    return execution_history
+    now = time.monotonic()
+    with _last_refresh_lock:
+        last = _last_refresh.get(db_path)
+        if last is not None and now - last < min_interval_s:
+            return None
+        _last_refresh[db_path] = now
+    return refresh_summaries(db_path)
+
+def _latency_percentiles(histogram: Dict[int, int], qs=(50, 95, 99)) -> Dict[str, Optional[float]]:
+    # percentil pelo limite superior do balde onde ele cai
+    total = sum(histogram.values())
+    out: Dict[str, Optional[float]] = {}
+    for q in qs:
+        if not total:
+            out[f"p{q}"] = None
+            continue
+        rank = q / 100.0 * total
+        seen = 0
+        for bucket in sorted(histogram):
+            seen += histogram[bucket]
+            if seen >= rank:
+                out[f"p{q}"] = LATENCY_EDGES[bucket]
+                break
+    return out
 
+def _rate(num: int, den: int) -> Optional[float]:
+    return num / den if den else None
 
-def compute_health_scores():
+def get_execution_history(db_path: str, limit: int = 20) -> List[Dict[str, Any]]:
     """
-    Computes health scores based on various metrics. For demonstration,
-    we will return a dummy health score.
+    Retrieves the most recent episodes (summary columns only, served by the primary key).
     """
-    return {"health_score": 85}
+    return query_episodes(db_path, limit=limit)
+
+def compute_health_scores(db_path: str, monitor: Optional[SystemMonitor] = None, window_s: float = 300.0,
+                          refresh_interval_s: float = 0.0) -> Dict[str, Any]:
+    """
+    Computes health scores from the summary tables (refreshed first, at most once per
+    `refresh_interval_s`; 0 = always) and live system samples.
+
+    health_score = 70% success rate of executed episodes + 30% system health; without
+    executed episodes it is the system health alone.
+    """
+    maybe_refresh_summaries(db_path, refresh_interval_s)
+    con = get_store(db_path).reader()
+    models = {r[0]: tuple(r)[1:] for r in con.execute(
+        "SELECT model_used, episodes, executed, successes, blocked, sudo, steps FROM health_model"
+    )}
+    histogram = {r[0]: r[1] for r in con.execute("SELECT bucket, count FROM health_latency")}
+
+    episodes, executed, successes, blocked, sudo, steps = (sum(col) for col in zip(*models.values())) if models else (0,) * 6
+    scores: Dict[str, Any] = {
+        "episodes": episodes,
+        "executed": executed,
+        "steps": steps,
+        "success_rate": _rate(successes, executed),
+        "blocked_rate": _rate(blocked, episodes),
+        "sudo_rate": _rate(sudo, episodes),
+        "model_failure_rate": {
+            model or "?": _rate(m[1] - m[2], m[1]) for model, m in sorted(models.items())
+        },
+        "step_latency_s": _latency_percentiles(histogram),
+    }
 
+    system_health = None
+    if monitor is not None:
+        scores["system"] = monitor.aggregate(window_s)
+        system_health = monitor.compute_health_score(window_s)
+        scores["system_health"] = system_health
+    parts = []
+    if scores["success_rate"] is not None:
+        parts.append((0.7, 100.0 * scores["success_rate"]))
+    if system_health is not None:
+        parts.append((0.3, system_health))
+    scores["health_score"] = round(sum(w * v for w, v in parts) / sum(w for w, _ in parts), 1) if parts else None
+    return scores
 
-def format_dashboard_data():
+def format_dashboard_data(db_path: str, monitor: Optional[SystemMonitor] = None, history_limit: int = 20) -> Dict[str, Any]:
     """
     Formats the data for display on a health dashboard.
     """
-    health_scores = compute_health_scores()
+    health_scores = compute_health_scores(db_path, monitor)
     timestamp = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-    return {"timestamp": timestamp, "health_scores": health_scores, "execution_history": get_execution_history()}
\ No newline at end of file
+    return {"timestamp": timestamp, "health_scores": health_scores, "execution_history": get_execution_history(db_path, history_limit)}
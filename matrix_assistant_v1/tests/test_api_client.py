@@ -0,0 +1,109 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from core.api_client import LLMClient, RetryPolicy
+
+def _serve(statuses):
+    # responde com os status da lista (em ordem) e depois 200
+    seen = []
+
+    class H(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            seen.append(self.client_address[1])
+            status = statuses.pop(0) if statuses else 200
+            body = json.dumps({"model": "m", "choices": [{"message": {"content": "{}"}}]}).encode()
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", "0")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *a):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), H)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, seen
+
+def test_retry_on_429_and_5xx():
+    srv, seen = _serve([429, 503])
+    try:
+        client = LLMClient(f"http://127.0.0.1:{srv.server_port}", "k", retry=RetryPolicy(backoff_base_s=0.01))
+        data = client.chat("m", [{"role": "user", "content": "oi"}])
+        assert data["model"] == "m"
+        assert len(seen) == 3
+    finally:
+        srv.shutdown()
+
+def test_conflict_is_not_retried_and_stream_error_frees_connection():
+    srv, seen = _serve([409, 409])
+    try:
+        client = LLMClient(f"http://127.0.0.1:{srv.server_port}", "k", retry=RetryPolicy(backoff_base_s=0.01),
+                           pool_maxsize=1)
+        with pytest.raises(requests.HTTPError) as exc:
+            client.chat_stream("m", [{"role": "user", "content": "oi"}])
+        assert exc.value.response.status_code == 409 and len(seen) == 1
+        with pytest.raises(requests.HTTPError):
+            client.chat("m", [{"role": "user", "content": "oi"}])
+        # o pool (de 1) não ficou preso na resposta de erro do stream
+        assert client.chat("m", [{"role": "user", "content": "oi"}])["model"] == "m" and len(seen) == 3
+    finally:
+        srv.shutdown()
+
+def test_keep_alive_reuses_connection():
+    srv, seen = _serve([])
+    try:
+        client = LLMClient(f"http://127.0.0.1:{srv.server_port}", "k")
+        for _ in range(3):
+            client.chat("m", [{"role": "user", "content": "oi"}])
+        assert len(set(seen)) == 1
+    finally:
+        srv.shutdown()
+
+def test_chat_stream_sse():
+    class H(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            assert body["stream"] is True and body["stream_options"] == {"include_usage": True}
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for tok in ['{"a"', ': "ç"}']:
+                chunk = {"model": "m-stream", "choices": [{"delta": {"content": tok}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+
+        def log_message(self, *a):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), H)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        client = LLMClient(f"http://127.0.0.1:{srv.server_port}", "k")
+        stream = client.chat_stream("m", [{"role": "user", "content": "oi"}])
+        assert list(stream) == ['{"a"', ': "ç"}']
+        assert stream.content == '{"a": "ç"}'
+        assert stream.model == "m-stream"
+        assert stream.stats.usage is None  # servidor sem usage no stream: quem chama estima
+    finally:
+        srv.shutdown()
+
+def test_chat_stream_close_before_iterating_releases_response():
+    srv, _ = _serve([])
+    try:
+        client = LLMClient(f"http://127.0.0.1:{srv.server_port}", "k")
+        stream = client.chat_stream("m", [{"role": "user", "content": "oi"}])
+        stream.close()
+        assert stream.response.raw.closed
+        assert list(stream) == []
+    finally:
+        srv.shutdown()
@@ -0,0 +1,24 @@
+from tools.bench import BenchConfig, compare, run_bench
+
+def test_bench_report_shape_and_baseline_check(tmp_path):
+    cfg = BenchConfig(levels=(2,), ops=2, latency_ms=0.0, pad_bytes=500, steps=1, payload_bytes=200)
+    report = run_bench(cfg, workdir=str(tmp_path))
+    assert set(report["results"]) == {"pipeline", "executor", "store"}
+    for levels in report["results"].values():
+        r = levels["2"]
+        assert r["errors"] == 0, r["first_error"]
+        assert r["ops"] == 2 and r["throughput_ops_s"] > 0 and 0 < r["p50_ms"] <= r["p95_ms"] <= r["p99_ms"]
+    assert compare(report, report) == []
+
+def test_compare_flags_regressions_beyond_tolerance():
+    def rep(tput, p95, errors=0):
+        return {"results": {"pipeline": {"4": {"throughput_ops_s": tput, "p95_ms": p95, "ops": 20, "errors": errors,
+                                               "first_error": "HTTPError: 503" if errors else None}}}}
+    base = rep(100.0, 50.0)
+    assert compare(rep(80.0, 60.0), base, tolerance=0.3) == []
+    found = compare(rep(60.0, 80.0, errors=2), base, tolerance=0.3)
+    assert [f.split(":")[1].split()[0] for f in found] == ["vazão", "p95", "2"]
+    # p95 minúsculo: diferença relativa grande mas abaixo de min_delta_ms não conta
+    assert compare(rep(100.0, 0.9), rep(100.0, 0.3)) == []
+    # cenário/nível fora do baseline é ignorado
+    assert compare(rep(1.0, 999.0), {"results": {"store": {}}}) == []
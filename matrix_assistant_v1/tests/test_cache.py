@@ -0,0 +1,24 @@
+from core.cache import ResponseCache, make_key
+
+def test_key_is_content_addressed():
+    msgs = [{"role": "user", "content": "oi"}]
+    assert make_key("http://x/", "m", msgs, None, 0.2) == make_key("http://x", "m", list(msgs), None, 0.2)
+    assert make_key("http://x", "m", msgs, None, 0.2) != make_key("http://x", "m", msgs, None, 0.3)
+
+def test_hit_miss_bypass_and_lru(tmp_path):
+    cache = ResponseCache(str(tmp_path / "c.db"), max_entries=2)
+    assert cache.get("a") is None
+    cache.put("a", {"content": "A", "model": "m"})
+    cache.put("b", {"content": "B", "model": "m"})
+    assert cache.get("a")["content"] == "A"  # "a" vira o mais recente
+    assert cache.get("a", bypass=True) is None
+    cache.put("c", {"content": "C", "model": "m"})  # despeja "b"
+    assert cache.get("b") is None
+    assert cache.get("c")["content"] == "C"
+    st = cache.stats()
+    assert (st["hits"], st["misses"], st["bypassed"], st["entries"]) == (2, 2, 1, 2)
+
+def test_ttl_expires(tmp_path):
+    cache = ResponseCache(str(tmp_path / "c.db"), ttl_s=1e-9)
+    cache.put("a", {"content": "A", "model": "m"})
+    assert cache.get("a") is None
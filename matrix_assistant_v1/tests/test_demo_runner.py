@@ -0,0 +1,57 @@
+import argparse
+import io
+import json
+
+from demo_runner import run_batch
+from tools.stub_llm import serve
+
+def _args(server, tmp_path, workers):
+    return argparse.Namespace(base_url="http://%s:%d" % server.server_address, api_key="k", model="stub",
+                              workspace_root=str(tmp_path), workers=workers, cache="", bypass_cache=False,
+                              replay_db="")
+
+class _Out(io.StringIO):
+    # registra quantas linhas de entrada já tinham sido lidas a cada resultado escrito
+    def __init__(self, read):
+        super().__init__()
+        self.read = read
+        self.read_at_write = []
+
+    def write(self, s):
+        self.read_at_write.append(len(self.read))
+        return super().write(s)
+
+def _lines(objectives, read):
+    for line in objectives:
+        read.append(line)
+        yield line + "\n"
+
+def test_batch_outputs_in_completion_order_with_index(tmp_path):
+    server = serve(latency_s=0.2)
+    try:
+        src = ['{"objective": "criar a.txt"}', '"listar arquivos"', "{quebrado", '{"sem": "objetivo"}']
+        out = io.StringIO()
+        failures = run_batch(_args(server, tmp_path, workers=4), io.StringIO("\n".join(src) + "\n"), out)
+    finally:
+        server.shutdown()
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert failures == 2 and sorted(r["index"] for r in rows) == [0, 1, 2, 3]
+    # as linhas inválidas terminam antes das que esperam o LLM: a saída segue a ordem de conclusão
+    assert {r["index"] for r in rows[:2]} == {2, 3} and not any(r["ok"] for r in rows[:2])
+    assert all(r["ok"] and r["result"]["patch"] for r in rows[2:])
+    assert {r["index"]: r["objective"] for r in rows[2:]} == {0: "criar a.txt", 1: "listar arquivos"}
+    assert all("elapsed_s" in r for r in rows) and min(r["elapsed_s"] for r in rows[2:]) >= 0.2
+
+def test_batch_keeps_a_bounded_window_in_flight(tmp_path):
+    server = serve(latency_s=0.05)
+    try:
+        read = []
+        out = _Out(read)
+        objectives = ['{"objective": "objetivo %d"}' % i for i in range(8)]
+        assert run_batch(_args(server, tmp_path, workers=1), _lines(objectives, read), out) == 0
+    finally:
+        server.shutdown()
+    assert sorted(json.loads(line)["index"] for line in out.getvalue().splitlines()) == list(range(8))
+    # no máximo 2*workers objetivos lidos à frente: o k-ésimo resultado sai com até 2 + k - 1 linhas lidas
+    assert out.read_at_write[0] <= 2
+    assert all(n <= 2 + k for k, n in enumerate(out.read_at_write))
@@ -0,0 +1,137 @@
+import threading
+
+from core.executor import OutputBuffer, ShellSession, execute_commands, reverify_episode, run_shell
+from core.schemas import Command
+
+def _cmd(i, cmd, expects="true"):
+    return Command(step_index=i, cmd=cmd, why="w", expects_cmd=expects)
+
+def test_session_keeps_state_and_framing(tmp_path):
+    with ShellSession(str(tmp_path), login=False) as sh:
+        assert sh.run("mkdir d && cd d && export X=42") == (0, "", "")
+        rc, out, err = sh.run("pwd; echo $X; printf 'sem-nl'; echo erro >&2; exit_code() { return 3; }; exit_code")
+        assert rc == 3
+        assert out == f"{tmp_path}/d\n42\nsem-nl"
+        assert err == "erro\n"
+        tricky = "printf '%s|' \"it's\" 'back\\slash' $'tab\\there' 'ç'\nprintf fim"
+        assert sh.run(tricky)[:2] == run_shell(tricky, cwd=str(tmp_path))[:2]
+
+def test_session_survives_exit_and_timeout(tmp_path):
+    with ShellSession(str(tmp_path), login=False) as sh:
+        assert sh.run("exit 7")[0] == 7
+        assert sh.run("sleep 5", timeout_s=0.2)[0] == 124
+        assert sh.run("echo ok") == (0, "ok\n", "")
+
+def test_execute_commands_stops_on_failure(tmp_path):
+    cmds = [_cmd(1, "echo a > a.txt", "test -f a.txt"), _cmd(2, "false"), _cmd(3, "echo nunca")]
+    results = execute_commands(cmds, cwd=str(tmp_path))
+    assert [(r.step_index, r.rc, r.expects_rc) for r in results] == [(1, 0, 0), (2, 1, 0)]
+
+def test_output_buffer_keeps_head_and_tail():
+    lines = []
+    buf = OutputBuffer(max_bytes=8, on_line=lines.append)
+    for part in [b"ab", b"cd\nef", b"ghij\nklmnop"]:
+        buf.write(part)
+    buf.flush()
+    assert lines == ["abcd", "efghij", "klmnop"]
+    assert buf.total == 18 and buf.truncated == 10
+    assert buf.text() == "abcd\n...[saída truncada: 10 bytes omitidos]...\nmnop"
+
+def test_streaming_callback_and_bounded_output(tmp_path):
+    seen = []
+    cmds = [_cmd(1, "seq 1 3; seq 1 100000 >&2", "echo ok")]
+    results = execute_commands(cmds, cwd=str(tmp_path), max_output_bytes=1024,
+                               on_output=lambda i, stream, line: seen.append((i, stream, line)))
+    r = results[0]
+    assert r.stdout == "1\n2\n3\n"
+    assert len(r.stderr) < 1200 and "saída truncada" in r.stderr and r.stderr.endswith("100000\n")
+    assert [l for i, s, l in seen if s == "stdout"] == ["1", "2", "3"]
+    assert (1, "stderr", "100000") in seen and (1, "expects_stdout", "ok") in seen
+
+def test_dag_runs_parallel_and_cancels_dependents(tmp_path):
+    # 1 e 2 só terminam bem se rodarem ao mesmo tempo (cada um espera o arquivo do outro)
+    rendezvous = "touch {me}; for i in $(seq 100); do test -f {other} && break; sleep 0.05; done; test -f {other}"
+    cmds = [
+        Command(step_index=1, cmd=rendezvous.format(me="s1", other="s2"), why="w", expects_cmd="true", parallel_group="g"),
+        Command(step_index=2, cmd=rendezvous.format(me="s2", other="s1") + " && false", why="w", expects_cmd="true", parallel_group="g"),
+        Command(step_index=3, cmd="echo depois de 1", why="w", expects_cmd="true", depends_on=[1]),
+        Command(step_index=4, cmd="echo nunca", why="w", expects_cmd="true", depends_on=[2]),
+        Command(step_index=5, cmd="echo barreira", why="w", expects_cmd="true"),
+    ]
+    seen = []
+    results = execute_commands(cmds, cwd=str(tmp_path), on_output=lambda *a: seen.append(threading.get_ident()))
+    assert [(r.step_index, r.rc) for r in results] == [(1, 0), (2, 1), (3, 0), (4, 125), (5, 125)]
+    assert results[2].stdout == "depois de 1\n"
+    assert set(seen) == {threading.get_ident()}
+
+def test_dag_steps_do_not_inherit_state_from_other_steps(tmp_path):
+    # um worker só: os três passos rodam na mesma sessão, um depois do outro
+    cmds = [
+        Command(step_index=1, cmd="export LEAK=from_step1; mkdir d; cd d; set -e", why="w", expects_cmd="echo $LEAK",
+                parallel_group="g"),
+        Command(step_index=2, cmd='echo "LEAK=$LEAK"; pwd; false; echo vivo', why="w", expects_cmd="true", parallel_group="g"),
+        Command(step_index=3, cmd='echo "LEAK=$LEAK"', why="w", expects_cmd="true", depends_on=[1]),
+    ]
+    results = execute_commands(cmds, cwd=str(tmp_path), max_workers=1)
+    assert results[0].expects_stdout == "from_step1\n"
+    assert results[1].stdout == f"LEAK=\n{tmp_path}\nvivo\n" and results[2].stdout == "LEAK=\n"
+
+def test_deferred_verification_and_reverify(tmp_path):
+    cmds = [_cmd(1, "echo a > a.txt", "cat a.txt"), _cmd(2, "echo b > b.txt", "test -f nada.txt"), _cmd(3, "true", "pwd")]
+    results = execute_commands(cmds, cwd=str(tmp_path), verify="deferred")
+    assert [(r.rc, r.expects_rc) for r in results] == [(0, 0), (0, 1), (0, 0)]
+    assert results[0].expects_stdout == "a\n"
+    records = [r.__dict__ for r in results]
+    for mode in ("batch", "concurrent"):
+        checks = reverify_episode(records, cwd=str(tmp_path), mode=mode)
+        assert [(v.step_index, v.rc, v.stdout) for v in checks] == [(1, 0, "a\n"), (2, 1, ""), (3, 0, f"{tmp_path}\n")]
+
+def test_deferred_expects_see_the_state_each_step_left(tmp_path):
+    (tmp_path / "sub").mkdir()
+    cmds = [
+        _cmd(1, "cd sub && touch f.txt && export MARCA=1", "test -f f.txt && echo $MARCA"),
+        _cmd(2, "cd ..", "pwd"),
+    ]
+    for mode in ("batch", "concurrent"):
+        results = execute_commands(cmds, cwd=str(tmp_path), verify="deferred", verify_mode=mode)
+        assert [(r.rc, r.expects_rc) for r in results] == [(0, 0), (0, 0)], mode
+        assert results[0].expects_stdout == "1\n" and results[1].expects_stdout == f"{tmp_path}\n"
+        (tmp_path / "sub" / "f.txt").unlink()
+
+def test_resource_accounting_and_limits(tmp_path):
+    burn = "python3 -c 'x = 0\nwhile True: x += 1'"
+    hog = "python3 -c 'b = bytearray(512 * 1024 * 1024)'"
+    cmds = [
+        _cmd(1, "python3 -c 'sum(range(3_000_000))'"),
+        Command(step_index=2, cmd=burn, why="w", expects_cmd="true", limits={"max_cpu_s": 1, "timeout_s": 10}),
+        Command(step_index=3, cmd=hog, why="w", expects_cmd="true", limits={"max_memory_mb": 256}),
+    ]
+    for persistent in (True, False):
+        results = [execute_commands([c], cwd=str(tmp_path), persistent=persistent)[0] for c in cmds]
+        assert results[0].rc == 0 and results[0].wall_s > 0 and results[0].user_s > 0
+        assert results[0].max_rss_kb > 1000
+        assert results[1].rc != 0 and results[1].wall_s < 9  # morto pelo limite de CPU, não pelo timeout
+        assert results[2].rc != 0 and "MemoryError" in results[2].stderr
+
+def test_measured_steps_keep_cwd_and_exports_with_or_without_limits(tmp_path):
+    limited = {"max_cpu_s": 5}
+    cmds = [
+        Command(step_index=1, cmd="mkdir d && cd d && export X=1", why="w", expects_cmd="pwd", limits=limited),
+        _cmd(2, "export Y=\"$X 2\"; unset X; f() { :; }; set -e", "echo $Y"),
+        _cmd(3, "pwd; echo ${X:-sem}-$Y; type f >/dev/null 2>&1 || echo sem-f; false; echo vivo"),
+    ]
+    results = execute_commands(cmds, cwd=str(tmp_path))
+    assert results[0].expects_stdout == f"{tmp_path}/d\n" and results[1].expects_stdout == "1 2\n"
+    # cwd/exportadas passam adiante; funções e opções de set não
+    assert results[2].stdout == f"{tmp_path}/d\nsem-1 2\nsem-f\nvivo\n"
+    assert all(r.max_rss_kb for r in results)
+
+def test_measured_step_positional_args_do_not_touch_the_state(tmp_path):
+    (tmp_path / "sub").mkdir()
+    cmds = [
+        _cmd(1, 'echo "$#:$1"; set -- a; shift; cd sub; export X=1', "true"),
+        _cmd(2, "pwd; echo X=$X"),
+    ]
+    results = execute_commands(cmds, cwd=str(tmp_path))
+    assert results[0].stdout == "0:\n"  # o comando não vê o próprio texto nem o arquivo de estado
+    assert results[1].stdout == f"{tmp_path}/sub\nX=1\n"
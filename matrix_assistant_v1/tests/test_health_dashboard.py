@@ -0,0 +1,45 @@
+from core.memory import save_episode
+from core.monitoring import SystemMonitor
+from health_dashboard import compute_health_scores, format_dashboard_data, maybe_refresh_summaries, refresh_summaries
+
+def _exec(*walls):
+    return [{"cmd": "x", "rc": 0, "stdout": "", "wall_s": w} for w in walls]
+
+def test_summaries_are_incremental(tmp_path):
+    db = str(tmp_path / "ep.db")
+    save_episode(db, {"user_input": "a", "model_used": "m1", "approved": True, "success": True, "exec": _exec(0.05, 0.3)})
+    save_episode(db, {"user_input": "b", "model_used": "m1", "approved": True, "success": False, "had_sudo": True, "exec": _exec(2.0)})
+    save_episode(db, {"user_input": "c", "model_used": "m2", "audit": {"blocked": True}})
+    assert refresh_summaries(db) == 3
+    assert refresh_summaries(db) == 0  # nada novo: não relê o que já foi somado
+
+    s = compute_health_scores(db)
+    assert (s["episodes"], s["executed"], s["steps"]) == (3, 2, 3)
+    assert s["success_rate"] == 0.5 and s["blocked_rate"] == 1 / 3 and s["sudo_rate"] == 1 / 3
+    assert s["model_failure_rate"] == {"m1": 0.5, "m2": None}
+    assert s["step_latency_s"]["p50"] == 0.32 and s["step_latency_s"]["p99"] == 2.56
+    assert s["health_score"] == 50.0
+
+    save_episode(db, {"user_input": "d", "model_used": "m2", "approved": True, "success": True, "exec": _exec(0.01)})
+    s = compute_health_scores(db)
+    assert s["executed"] == 3 and s["model_failure_rate"]["m2"] == 0.0
+
+def test_refresh_is_throttled_between_reruns(tmp_path):
+    db = str(tmp_path / "ep.db")
+    save_episode(db, {"user_input": "a", "model_used": "m1", "approved": True, "success": True, "exec": _exec(0.05)})
+    assert compute_health_scores(db, refresh_interval_s=60)["episodes"] == 1
+    save_episode(db, {"user_input": "b", "model_used": "m1"})
+    # rerun logo em seguida: usa o resumo já gravado, sem ler episódios
+    assert compute_health_scores(db, refresh_interval_s=60)["episodes"] == 1
+    assert maybe_refresh_summaries(db, 60) is None
+    assert maybe_refresh_summaries(db, 0) == 1 and compute_health_scores(db, refresh_interval_s=60)["episodes"] == 2
+
+def test_dashboard_combines_system_samples(tmp_path):
+    db = str(tmp_path / "ep.db")
+    mon = SystemMonitor()
+    mon.sample_once()
+    mon.sample_once()
+    data = format_dashboard_data(db, mon)
+    hs = data["health_scores"]
+    assert hs["episodes"] == 0 and hs["health_score"] == round(hs["system_health"], 1)
+    assert hs["system"]["samples"] == 2 and data["execution_history"] == []
@@ -0,0 +1,83 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from core.jobs import CANCELLED, DONE, FAILED, JobManager, load_result
+from core.maintenance import run_maintenance
+from core.memory import EpisodeStore
+from core.schemas import Command
+
+def test_job_progress_is_live_and_result_persists(tmp_path):
+    store = EpisodeStore(str(tmp_path / "ep.db"))
+    jobs = JobManager(store, max_workers=1, flush_s=0.0)
+    gate = threading.Event()
+
+    def fn(ctx):
+        ctx.update(stage="plan", progress=0.3, plan='{"tasks"')
+        gate.wait(5)
+        return {"ok": True}
+
+    job_id = jobs.submit("pipeline", "objetivo", fn, owner="s1")
+    while jobs.get(job_id).stage != "plan":
+        pass
+    live = jobs.get(job_id)
+    assert live.active and live.progress == 0.3 and live.partial == {"plan": '{"tasks"'}
+    gate.set()
+
+    done = jobs.wait(job_id, timeout=5)
+    assert done.status == DONE and done.result == {"ok": True} and done.progress == 1.0
+    # outro gerenciador (ex.: depois de reiniciar o processo) lê o mesmo job do DB, já sem a saída parcial
+    again = JobManager(store).get(job_id)
+    assert (again.status, again.result, again.partial, again.owner) == (DONE, {"ok": True}, {}, "s1")
+    assert [j.id for j in jobs.list(owner="s1")] == [job_id] and jobs.list(active_only=True) == []
+
+def test_cancel_queued_job_and_failure(tmp_path):
+    jobs = JobManager(EpisodeStore(str(tmp_path / "ep.db")), max_workers=1)
+    gate = threading.Event()
+    first = jobs.submit("x", "lento", lambda ctx: gate.wait(5))
+    queued = jobs.submit("x", "na fila", lambda ctx: 1)
+    failing = jobs.submit("x", "quebra", lambda ctx: 1 / 0)
+    assert jobs.cancel(queued)
+    gate.set()
+    assert jobs.wait(first, timeout=5).status == DONE
+    assert jobs.wait(queued, timeout=5).status == CANCELLED
+    failed = jobs.wait(failing, timeout=5)
+    assert failed.status == FAILED and failed.error.startswith("ZeroDivisionError")
+
+def test_execution_job_saves_episode(tmp_path):
+    store = EpisodeStore(str(tmp_path / "ep.db"))
+    jobs = JobManager(store)
+    cmds = [Command(step_index=1, cmd="echo ola > a.txt && echo feito", why="w", expects_cmd="test -f a.txt")]
+    episode = {"user_input": "criar a.txt", "plan": {"tasks": []}, "patch": {"commands": []}, "audit": {"blocked": False},
+               "metrics": {"C": 1.0}}
+    job = jobs.wait(jobs.submit_execution(str(tmp_path / "ep.db"), cmds, str(tmp_path), episode), timeout=30)
+    assert job.status == DONE and job.result["success"] is True
+    assert job.partial["tail"] == ["[1] feito"]
+    saved = store.get(job.result["episode_id"])
+    assert saved["success"] == 1 and saved["exec"][0]["rc"] == 0 and saved["user_input"] == "criar a.txt"
+
+def test_finished_job_keeps_only_summary_in_db_and_is_pruned(tmp_path):
+    db = str(tmp_path / "ep.db")
+    store = EpisodeStore(db)
+    jobs = JobManager(store)
+    cmds = [Command(step_index=1, cmd="seq 1 2000", why="w", expects_cmd="true")]
+    episode = {"user_input": "muita saída", "plan": {"tasks": []}, "patch": {"commands": []}, "audit": {"blocked": False}}
+    job_id = jobs.submit_execution(db, cmds, str(tmp_path), episode)
+    full = jobs.wait(job_id, timeout=30)
+    assert full.result["exec"][0]["stdout"].endswith("2000\n")  # completo em memória neste processo
+
+    row = store.reader().execute("SELECT partial_json, result_json FROM jobs WHERE id=?", (job_id,)).fetchone()
+    assert row[0] is None and len(row[1]) < 200
+    stored = JobManager(store).get(job_id)
+    assert stored.result == {"success": True, "sfc": full.result["sfc"], "episode_id": full.result["episode_id"],
+                             "summary": True}
+    rebuilt = load_result(store, stored)
+    assert rebuilt["exec"] == full.result["exec"] and rebuilt["success"] is True
+
+    active = jobs.submit("x", "rodando", lambda ctx: time.sleep(1))
+    rep = run_maintenance(db, store=store, job_retention_days=1)
+    assert rep.jobs_deleted == 0
+    rep = run_maintenance(db, store=store, job_retention_days=1, now=datetime.utcnow() + timedelta(days=2))
+    assert rep.jobs_deleted == 1 and JobManager(store).get(job_id) is None
+    assert store.reader().execute("SELECT id FROM jobs").fetchall()[0][0] == active
+    jobs.wait(active, timeout=5)
@@ -0,0 +1,75 @@
+import json
+import random
+
+import pytest
+
+from core.keywords import KeywordScanner, scan_plan
+from core.metrics import compute_complexity, compute_uncertainty
+from core.orchestrator import estimate_C_U_R, run_pipeline
+from core.schemas import Plan
+from tools.stub_llm import serve
+
+def _reference_C_U_R(plan):
+    # implementação anterior (serializa o plano inteiro): referência de semântica
+    T = len(plan.tasks)
+    D = sum(1 for t in plan.tasks if any("dep" in a.lower() for a in t.actions))
+    C = compute_complexity(T, D, len(plan.constraints), len(plan.artifacts))
+    vague = ("talvez", "aprox", "aproximadamente", "pode", "se necessário", "não aplicável", "not applicable")
+    ambiguous = sum(1 for t in plan.tasks if any(v in " ".join(t.actions + [t.success_criteria]).lower() for v in vague))
+    U = compute_uncertainty(ambiguous, max(1, sum(len(t.actions) for t in plan.tasks)))
+    alltxt = json.dumps(plan.model_dump(), ensure_ascii=False).lower()
+    risk = "Baixo"
+    if any(x in alltxt for x in ["sudo", "/etc", "firewall", "porta", "systemctl", "kernel", "driver"]):
+        risk = "Alto"
+    elif C >= 7 or U > 0.6:
+        risk = "Médio"
+    return C, U, risk, ambiguous
+
+def test_matches_previous_semantics_on_random_plans():
+    rng = random.Random(7)
+    words = ["instalar", "git", "Pode", "se", "necessário", "SUDO", "portaprox", "/etc/hosts", "deps", "ok", "aproximadamente",
+             "não", "aplicável", "kernel", "x", "\"aspas\"", "linha\nnova", "driverS"]
+    def text():
+        return " ".join(rng.choice(words) for _ in range(rng.randint(0, 4)))
+    for _ in range(300):
+        plan = Plan.model_validate({
+            "tasks": [{"task_id": text() or "t", "objective": text(), "actions": [text() for _ in range(rng.randint(1, 3))],
+                       "success_criteria": text()} for _ in range(rng.randint(1, 4))],
+            "constraints": [text() for _ in range(rng.randint(0, 2))],
+            "artifacts": [text() for _ in range(rng.randint(0, 2))],
+        })
+        C, U, R, counts = estimate_C_U_R(plan)
+        assert (C, U, R, counts["ambiguous"]) == _reference_C_U_R(plan)
+
+def test_hits_report_paths_and_locale():
+    plan = Plan.model_validate({"tasks": [{"task_id": "t1", "objective": "abrir porta", "actions": ["se", "necessário reiniciar"],
+                                           "success_criteria": "ok"}], "constraints": ["sem sudo"]})
+    scan = scan_plan(plan)
+    hits = {(h.keyword, h.kind, h.path, h.offset) for h in scan.hits}
+    assert ("porta", "risk", "tasks[0].objective", 6) in hits
+    assert ("se necessário", "vague", "tasks[0].actions[0]", 0) in hits
+    assert ("sudo", "risk", "constraints[0]", 4) in hits
+    assert scan.ambiguous_tasks == {0}
+
+    en = Plan.model_validate({"tasks": [{"task_id": "t1", "objective": "open port", "actions": ["maybe restart"], "success_criteria": "ok"}]})
+    assert estimate_C_U_R(en, locale="en")[2] == "Alto" and estimate_C_U_R(en, locale="en")[3]["ambiguous"] == 1
+    assert estimate_C_U_R(en)[2] != "Alto"
+    assert estimate_C_U_R(en, scan=scan_plan(en, "en"))[2] == "Alto"  # locale vem do scan
+    with pytest.raises(ValueError, match="locale"):
+        estimate_C_U_R(en, locale="pt", scan=scan_plan(en, "en"))
+
+def test_run_pipeline_uses_locale_for_estimate(tmp_path):
+    server = serve()
+    try:
+        base_url = "http://%s:%d" % server.server_address[:2]
+        risky = {loc: run_pipeline(base_url, "k", "stub", "open port 22", str(tmp_path), locale=loc)["metrics"]["R"]
+                 for loc in ("pt", "en", "pt+en")}
+        with pytest.raises(ValueError, match="Locale"):
+            run_pipeline(base_url, "k", "stub", "x", str(tmp_path), locale="xx")
+    finally:
+        server.shutdown()
+    assert risky == {"pt": "Baixo", "en": "Alto", "pt+en": "Alto"}
+
+def test_scanner_finds_overlapping_and_prefix_matches():
+    sc = KeywordScanner({"a": ["aprox", "aproximadamente"], "b": ["porta"]})
+    assert sorted(sc.scan("portaproximadamente")) == [("aprox", "a", 4), ("aproximadamente", "a", 4), ("porta", "b", 0)]
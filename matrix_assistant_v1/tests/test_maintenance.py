@@ -0,0 +1,66 @@
+import threading
+from datetime import datetime, timedelta
+
+from core.maintenance import run_maintenance
+from core.memory import EpisodeStore
+
+def _seed_old(store, n, days_ago, model="m1"):
+    ts = (datetime.utcnow() - timedelta(days=days_ago)).isoformat()
+    out = []
+    for i in range(n):
+        eid = store.save({
+            "user_input": f"tarefa {days_ago}-{i}", "model_used": model, "success": i % 2 == 0, "had_sudo": i % 5 == 0,
+            "approved": True, "exec": [{"cmd": "echo", "rc": 0, "stdout": f"saida única {days_ago}-{i} " * 400, "stderr": ""}],
+        })
+        store.write(lambda con, eid=eid: con.execute("UPDATE episodes SET created_at=? WHERE id=?", (ts, eid)))
+        out.append(eid)
+    return out
+
+def test_rollup_strip_then_drop(tmp_path):
+    db = str(tmp_path / "ep.db")
+    store = EpisodeStore(db)
+    old = _seed_old(store, 20, days_ago=90)
+    recent = _seed_old(store, 5, days_ago=1, model="m2")
+
+    rep = run_maintenance(db, retention_days=30, batch=7, store=store)
+    assert (rep.rolled_up, rep.stripped, rep.dropped) == (20, 20, 0)
+    assert rep.blobs_deleted == 20 and rep.vacuum_mode == "incremental"
+    assert rep.bytes_reclaimed > 0 and rep.freelist_after == 0
+    con = store.reader()
+    day = (datetime.utcnow() - timedelta(days=90)).isoformat()[:10]
+    assert tuple(con.execute("SELECT episodes, approved, successes, sudo FROM episode_daily WHERE day=? AND model_used='m1'", (day,)).fetchone()) == (20, 20, 10, 4)
+    stripped = store.get(old[0])["exec"][0]
+    assert stripped["output_stripped"] and "stdout" not in stripped and stripped["rc"] == 0
+    assert "stdout" in store.get(recent[0])["exec"][0]
+
+    # idempotente: nada é contado duas vezes
+    rep = run_maintenance(db, retention_days=30, store=store)
+    assert (rep.rolled_up, rep.stripped) == (0, 0)
+    assert con.execute("SELECT SUM(episodes) FROM episode_daily").fetchone()[0] == 20
+
+    rep = run_maintenance(db, retention_days=30, mode="drop", store=store)
+    assert rep.dropped == 20
+    assert {e["id"] for e in store.query()} == set(recent)
+    assert con.execute("SELECT SUM(episodes) FROM episode_daily").fetchone()[0] == 20
+    store.close()
+
+def test_maintenance_while_app_writes(tmp_path):
+    db = str(tmp_path / "ep.db")
+    store = EpisodeStore(db)
+    _seed_old(store, 30, days_ago=60)
+    errors = []
+
+    def writer():
+        try:
+            for i in range(50):
+                store.save({"user_input": f"ao vivo {i}", "exec": [{"stdout": "x" * 1000}]})
+        except Exception as e:
+            errors.append(e)
+
+    t = threading.Thread(target=writer)
+    t.start()
+    rep = run_maintenance(db, retention_days=30, mode="drop", batch=5, store=store)
+    t.join()
+    assert not errors and rep.dropped == 30
+    assert len(store.query(limit=100)) == 50
+    store.close()
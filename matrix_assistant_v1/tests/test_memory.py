@@ -0,0 +1,154 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from core.memory import EpisodeStore, get_store, init_db, save_episode
+
+def test_concurrent_saves_are_batched_and_unique(tmp_path):
+    db = str(tmp_path / "ep.db")
+    store = EpisodeStore(db)
+    ids = []
+    lock = threading.Lock()
+
+    def worker(n):
+        for i in range(25):
+            eid = store.save({"user_input": f"t{n}-{i}", "plan": {"steps": [i]}, "success": i % 2 == 0})
+            with lock:
+                ids.append(eid)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(ids) == 200 and len(set(ids)) == 200
+    con = store.reader()
+    assert con.execute("SELECT COUNT(*) FROM episodes").fetchone()[0] == 200
+    assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    store.close()
+
+def test_failing_op_does_not_abort_batch(tmp_path):
+    store = EpisodeStore(str(tmp_path / "ep.db"))
+    bad = store.submit(lambda con: con.execute("INSERT INTO nope VALUES (1)"))
+    good = store.save_async({"user_input": "ok"})
+    assert good.result() >= 1
+    with pytest.raises(sqlite3.OperationalError):
+        bad.result()
+    store.close()
+
+def test_reader_is_read_only_and_wrappers_share_store(tmp_path):
+    db = str(tmp_path / "ep.db")
+    init_db(db)
+    eid = save_episode(db, {"user_input": "x"})
+    store = get_store(db)
+    assert store is get_store(db)
+    assert store.reader().execute("SELECT user_input FROM episodes WHERE id=?", (eid,)).fetchone()[0] == "x"
+    with pytest.raises(sqlite3.OperationalError):
+        store.reader().execute("DELETE FROM episodes")
+
+def _seed(store):
+    rows = [
+        ("instalar git", "m1", True, False, None),
+        ("configurar nginx", "m2", False, True, "porta 8080"),
+        ("instalar pytest no venv", "m1", True, False, None),
+        ("limpar cache do apt", "m2", True, True, "usar sudo"),
+        ("instalar docker", "m1", False, True, None),
+    ]
+    return [store.save({"user_input": u, "model_used": m, "success": s, "had_sudo": h, "notes": n, "plan": {"u": u}})
+            for u, m, s, h, n in rows]
+
+def test_query_filters_and_keyset_pagination(tmp_path):
+    store = EpisodeStore(str(tmp_path / "ep.db"))
+    ids = _seed(store)
+    assert [e["id"] for e in store.query()] == ids[::-1]
+    assert [e["user_input"] for e in store.query(model_used="m1", success=True)] == ["instalar pytest no venv", "instalar git"]
+    assert {e["id"] for e in store.query(had_sudo=True)} == {ids[1], ids[3], ids[4]}
+    page1 = store.query(limit=2)
+    page2 = store.query(limit=2, before_id=page1[-1]["id"])
+    assert [e["id"] for e in page1 + page2] == ids[::-1][:4]
+    assert store.query(since="2000-01-01", until="2000-01-02") == []
+    assert store.query(limit=1, include_json=True)[0]["plan"] == {"u": "instalar docker"}
+    plan = store.reader().execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM episodes e WHERE e.model_used=? ORDER BY e.id DESC LIMIT 10", ("m1",)
+    ).fetchall()
+    assert "idx_episodes_model_id" in " ".join(str(r[-1]) for r in plan)
+    store.close()
+
+def test_full_text_search_and_rebuild_on_legacy_db(tmp_path):
+    db = str(tmp_path / "legacy.db")
+    con = sqlite3.connect(db)
+    con.executescript("""CREATE TABLE episodes (id INTEGER PRIMARY KEY AUTOINCREMENT, created_at TEXT NOT NULL,
+        user_input TEXT NOT NULL, plan_json TEXT, patch_json TEXT, audit_json TEXT, exec_json TEXT, model_used TEXT,
+        approved INTEGER DEFAULT 0, had_sudo INTEGER DEFAULT 0, success INTEGER DEFAULT 0, score INTEGER, tags TEXT, notes TEXT);
+        INSERT INTO episodes (created_at, user_input) VALUES ('2024-01-01T00:00:00', 'antigo com nginx');""")
+    con.commit()
+    con.close()
+    store = EpisodeStore(db)
+    _seed(store)
+    if not store.has_fts:
+        pytest.skip("SQLite sem FTS5")
+    assert [e["user_input"] for e in store.query(text="nginx")] == ["configurar nginx", "antigo com nginx"]
+    assert [e["user_input"] for e in store.query(text="sudo")] == ["limpar cache do apt"]
+    assert [e["user_input"] for e in store.query(text='instalar "git', model_used="m1")] == ["instalar git"]
+    assert [e["user_input"] for e in store.query(text="instalar git")] == ["instalar git"]
+    assert [e["user_input"] for e in store.query(text="nginx", since="2024-06-01")] == ["configurar nginx"]
+    store.close()
+
+def test_payloads_are_deduplicated_and_compressed(tmp_path):
+    store = EpisodeStore(str(tmp_path / "ep.db"))
+    patch = {"commands": [{"step_index": 1, "cmd": "pip install -U pytest", "expects_cmd": "pytest --version"}]}
+    output = "Collecting pytest\n  Downloading pytest-8.0.0.whl\n" * 200
+    ids = [store.save({"user_input": f"t{i}", "patch": patch, "exec": [{"cmd": "x", "stdout": output, "rc": i % 2}]})
+           for i in range(10)]
+    # mesmo patch com as chaves em outra ordem (ex.: vindo de outro model_dump) cai no mesmo blob
+    reordered = {"commands": [{"expects_cmd": "pytest --version", "cmd": "pip install -U pytest", "step_index": 1}]}
+    other = store.save({"user_input": "t10", "patch": reordered})
+    assert store.get(other)["patch_hash"] == store.get(ids[0])["patch_hash"]
+    st = store.blob_stats()
+    assert st["blobs"] == 3  # um patch + dois exec distintos (rc 0/1)
+    assert st["stored_bytes"] * 10 < st["raw_bytes"]
+    ep = store.get(ids[3])
+    assert ep["patch"] == patch and ep["exec"][0]["stdout"] == output and ep["plan"] is None
+    only_patch = store.get(ids[3], payloads=("patch",))
+    assert "exec" not in only_patch and only_patch["exec_hash"] == ep["exec_hash"]
+    store.close()
+
+def test_compact_inline_migrates_legacy_rows(tmp_path):
+    db = str(tmp_path / "ep.db")
+    store = EpisodeStore(db)
+    plan = {"steps": ["a", "b"]}
+    store.write(lambda con: con.execute(
+        "INSERT INTO episodes (created_at, user_input, plan_json) VALUES ('2024-01-01', 'velho', ?)", (json.dumps(plan),)
+    ))
+    eid = store.query()[0]["id"]
+    assert store.get(eid)["plan"] == plan  # leitura direta do JSON inline
+    assert store.compact_inline() == 1
+    assert store.compact_inline() == 0
+    ep = store.get(eid)
+    assert ep["plan"] == plan and ep["plan_hash"]
+    store.close()
+
+def test_close_closes_readers_and_get_store_reopens(tmp_path):
+    db = str(tmp_path / "ep.db")
+    store = get_store(db)
+    episode_id = store.save({"user_input": "antes"})
+    other = []
+    t = threading.Thread(target=lambda: other.append(store.reader()))
+    t.start()
+    t.join()
+    mine = store.reader()
+    store.close()
+    # leitores de todas as threads fechados junto com o escritor
+    for con in (mine, other[0]):
+        with pytest.raises(sqlite3.ProgrammingError):
+            con.execute("SELECT 1")
+    with pytest.raises(RuntimeError):
+        store.reader()
+
+    again = get_store(db)
+    assert again is not store
+    assert again.get(episode_id)["user_input"] == "antes" and again.save({"user_input": "depois"}) > episode_id
+    again.close()
@@ -1,4 +1,12 @@
-from core.metrics import compute_sfc, compute_lmax, compute_delta
+import math
+
+import numpy as np
+
+from core.memory import save_episode
+from core.metric_history import load_metric_arrays, recompute_history
+from core.metrics import (compute_sfc, compute_lmax, compute_delta, compute_complexity, compute_complexity_batch,
+                          compute_sfc_batch, compute_delta_batch, compute_iec, compute_iec_batch, compute_uncertainty,
+                          compute_uncertainty_batch, compute_lmax_batch, normalize_to_1_10, normalize_to_1_10_batch)
 
 def test_sfc_range():
     assert 0 <= compute_sfc(0,0,100) <= 100
@@ -10,3 +18,30 @@ def test_lmax_bounds():
 
 def test_delta_zero_safe():
     assert compute_delta(0, 10) == 1.0
+
+def test_batch_versions_match_scalar():
+    rng = np.random.default_rng(0)
+    T, D, K, A = (rng.integers(0, 40, 500) for _ in range(4))
+    ss, iec, iro = rng.uniform(-20, 130, (3, 500))
+    prev = np.where(rng.random(500) < 0.1, 0.0, rng.normal(0, 10, 500))
+    cur = rng.normal(0, 10, 500)
+    n = rng.integers(-2, 10, 500)
+    d = rng.integers(0, 15, 500)
+
+    assert compute_complexity_batch(T, D, K, A).tolist() == [compute_complexity(*x) for x in zip(T.tolist(), D.tolist(), K.tolist(), A.tolist())]
+    assert compute_sfc_batch(ss, iec, iro).tolist() == [compute_sfc(*x) for x in zip(ss.tolist(), iec.tolist(), iro.tolist())]
+    assert compute_delta_batch(prev, cur).tolist() == [compute_delta(p, c) for p, c in zip(prev.tolist(), cur.tolist())]
+    assert compute_iec_batch(d, n).tolist() == [compute_iec(a, b) for a, b in zip(d.tolist(), n.tolist())]
+    assert compute_uncertainty_batch(d, n).tolist() == [compute_uncertainty(a, b) for a, b in zip(d.tolist(), n.tolist())]
+    assert compute_lmax_batch(ss / 10).tolist() == [compute_lmax(c) for c in (ss / 10).tolist()]
+    assert normalize_to_1_10_batch(ss, 5, 5).tolist() == [normalize_to_1_10(x, 5, 5) for x in ss.tolist()]
+
+def test_load_metric_arrays_and_recompute(tmp_path):
+    db = str(tmp_path / "ep.db")
+    save_episode(db, {"user_input": "a", "success": True, "metrics": {"T": 3, "D": 1, "K": 2, "A": 0, "SS_local": 100, "IEC": 50, "IRO_total": 5, "SFC": 1.0}})
+    save_episode(db, {"user_input": "b"})
+    m = load_metric_arrays(db, ("n_tasks", "sfc", "success"))
+    assert m["id"].tolist() == [1, 2] and m["n_tasks"][0] == 3 and math.isnan(m["n_tasks"][1])
+    assert recompute_history(db) == 1
+    m = load_metric_arrays(db, ("c_score", "sfc"))
+    assert m["c_score"][0] == compute_complexity(3, 1, 2, 0) and m["sfc"][0] == compute_sfc(100, 50, 5)
@@ -0,0 +1,29 @@
+import time
+
+from core.monitoring import FIELDS, SystemMonitor
+
+def test_ring_buffer_keeps_last_samples_in_order():
+    mon = SystemMonitor(capacity=5)
+    for _ in range(12):
+        mon.sample_once()
+    s = mon.samples()
+    assert len(s["ts"]) == 5 and s["ts"] == sorted(s["ts"])
+    assert mon.snapshot()["ts"] == s["ts"][-1]
+    assert set(mon.snapshot()) == set(FIELDS)
+
+def test_background_sampler_aggregates_and_stops():
+    mon = SystemMonitor(interval_s=0.02, capacity=100).start()
+    deadline = time.monotonic() + 5
+    while len(mon.samples()["ts"]) < 4 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    mon.stop(timeout=2)
+    assert not mon.running
+    agg = mon.aggregate(window_s=60)
+    assert agg["samples"] >= 4
+    for f in ("cpu", "mem"):
+        assert 0.0 <= agg[f]["avg"] <= agg[f]["max"] <= 100.0
+        assert agg[f]["p95"] <= agg[f]["max"]
+    n = len(mon.samples()["ts"])
+    time.sleep(0.1)
+    assert len(mon.samples()["ts"]) == n  # parado de verdade
+    assert 0 <= mon.compute_health_score() <= 100
@@ -0,0 +1,66 @@
+import pytest
+
+from core import orchestrator
+from core.memory import EpisodeStore
+from core.replay import ReplayIndex, normalize_tokens
+
+PLAN = {"tasks": [{"task_id": "t1", "objective": "git", "actions": ["instalar git"], "success_criteria": "git --version"}]}
+
+def _patch(cmd):
+    return {"manifest": {"files": ["x.txt"]}, "tasks_covered": ["t1"], "constraints_violated": False,
+            "commands": [{"step_index": 1, "cmd": cmd, "why": "w", "expects_cmd": "true", "privilege": "user"}]}
+
+def test_normalize_tokens():
+    assert normalize_tokens("Instalar o Git e verificar a VERSÃO") == ["instalar", "git", "verificar", "versao"]
+    assert normalize_tokens("criar venv python3.11.") == ["criar", "venv", "python3.11"]
+
+def test_index_is_incremental_and_ranks_similar(tmp_path):
+    store = EpisodeStore(str(tmp_path / "ep.db"))
+    index = ReplayIndex(store)
+    store.save({"user_input": "instalar git e verificar versão", "plan": PLAN, "patch": _patch("git --version"), "success": True})
+    store.save({"user_input": "criar projeto python com pytest", "plan": PLAN, "patch": _patch("pytest"), "success": True})
+    store.save({"user_input": "instalar git", "plan": PLAN, "patch": _patch("x"), "success": False})
+    assert index.refresh() == 2 and index.refresh() == 0
+
+    cand = index.best("Instalar o git e verificar a versão")
+    assert cand is not None and cand.score == pytest.approx(1.0) and cand.patch["commands"][0]["cmd"] == "git --version"
+    assert index.best("configurar firewall ufw") is None
+
+    store.save({"user_input": "configurar firewall ufw", "plan": PLAN, "patch": _patch("ufw status"), "success": True})
+    assert index.best("configurar firewall ufw").patch["commands"][0]["cmd"] == "ufw status"
+    assert len(index) == 3
+    store.close()
+
+def test_run_pipeline_replays_without_llm_and_regates(tmp_path, monkeypatch):
+    store = EpisodeStore(str(tmp_path / "ep.db"))
+    index = ReplayIndex(store)
+    eid = store.save({"user_input": "instalar git e verificar versão", "plan": PLAN, "patch": _patch("git --version"),
+                      "model_used": "m", "success": True})
+
+    def no_llm(*a, **kw):
+        raise AssertionError("LLM não deveria ser chamado")
+
+    monkeypatch.setattr(orchestrator, "llm_plan", no_llm)
+    out = orchestrator.run_pipeline("http://x", "k", "m", "instalar git e verificar versão", "/w", replay=index)
+    assert out["replayed_from"]["episode_id"] == eid and out["audit"]["blocked"] is False
+    assert out["patch"]["commands"][0]["cmd"] == "git --version"
+
+    # candidato que o gate atual bloqueia não é reaproveitado
+    store.save({"user_input": "limpar build antigo", "plan": PLAN, "patch": _patch("rm -rf build"), "success": True})
+    with pytest.raises(AssertionError, match="LLM"):
+        orchestrator.run_pipeline("http://x", "k", "m", "limpar build antigo", "/w", replay=index)
+    store.close()
+
+def test_replay_falls_back_to_llm_when_stored_episode_no_longer_validates(tmp_path, monkeypatch):
+    store = EpisodeStore(str(tmp_path / "ep.db"))
+    stale = _patch("git --version")
+    del stale["tasks_covered"]  # campo obrigatório no schema atual
+    store.save({"user_input": "instalar git e verificar versão", "plan": PLAN, "patch": stale, "success": True})
+
+    def llm_called(*a, **kw):
+        raise RuntimeError("LLM chamado")
+
+    monkeypatch.setattr(orchestrator, "llm_plan", llm_called)
+    with pytest.raises(RuntimeError, match="LLM chamado"):
+        orchestrator.run_pipeline("http://x", "k", "m", "instalar git e verificar versão", "/w", replay=ReplayIndex(store))
+    store.close()
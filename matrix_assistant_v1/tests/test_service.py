@@ -0,0 +1,115 @@
+import json
+
+import pytest
+import requests
+
+from core.service import AssistantService, ServiceConfig
+from tools.stub_llm import serve
+
+TOKEN = "segredo"
+
+@pytest.fixture
+def llm():
+    server = serve()
+    yield "http://%s:%d" % server.server_address[:2]
+    server.shutdown()
+
+def _start(llm, tmp_path, **kwargs):
+    svc = AssistantService(ServiceConfig(base_url=llm, api_key="x", model="stub",
+                                         workspace_root=str(tmp_path / "ws"), max_workers=4, **kwargs))
+    (h, p), stop = svc.run_in_thread()
+    return f"http://{h}:{p}", stop
+
+@pytest.fixture
+def service(llm, tmp_path):
+    url, stop = _start(llm, tmp_path, token=TOKEN)
+    yield url
+    stop()
+
+def _sse(resp):
+    events, name = [], None
+    for line in resp.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            name = line[7:]
+        elif line.startswith("data: "):
+            events.append((name, json.loads(line[6:])))
+    return events
+
+def test_plan_audit_execute_and_episodes(service):
+    with requests.Session() as http:  # keep-alive: todos os pedidos na mesma conexão
+        http.headers["Authorization"] = f"Bearer {TOKEN}"
+        result = http.post(f"{service}/v1/plan", json={"objective": "criar arquivo ok"}).json()
+        assert result["plan"]["tasks"][0]["objective"] == "criar arquivo ok" and result["audit"]["blocked"] is False
+
+        bad = {**result["patch"], "commands": [{"step_index": 1, "cmd": "rm -rf x", "why": "w", "expects_cmd": "true"}]}
+        assert http.post(f"{service}/v1/audit", json={"patch": bad}).json()["audit"]["blocked"] is True
+        r = http.post(f"{service}/v1/execute", json={"patch": bad, "confirm": "EXECUTAR"})
+        assert r.status_code == 409 and r.json()["audit"]["blocked"] is True
+
+        body = {"user_input": "criar arquivo ok", "plan": result["plan"], "patch": result["patch"],
+                "llm_calls": result["llm_calls"]}
+        assert http.post(f"{service}/v1/execute", json=body).status_code == 403
+        done = http.post(f"{service}/v1/execute", json={**body, "confirm": "EXECUTAR"}).json()
+        assert done["success"] is True and [s["rc"] for s in done["exec"]] == [0, 0]
+
+        ep = http.get(f"{service}/v1/episodes/{done['episode_id']}").json()
+        assert ep["success"] == 1 and ep["user_input"] == "criar arquivo ok"
+        assert [c["stage"] for c in ep["llm_calls"]] == ["plan", "patch"]
+        usage = http.get(f"{service}/v1/usage").json()["usage"]
+        assert [(u["model"], u["calls"]) for u in usage] == [("stub", 2)]
+        page = http.get(f"{service}/v1/episodes", params={"success": "1", "limit": 5}).json()
+        assert [e["id"] for e in page["episodes"]] == [done["episode_id"]] and page["next_before_id"] is None
+        assert http.get(f"{service}/v1/episodes/999").status_code == 404
+
+def test_plan_stream_and_errors(service):
+    auth = {"Authorization": f"Bearer {TOKEN}"}
+    with requests.post(f"{service}/v1/plan?stream=1", json={"objective": "x"}, headers=auth, stream=True) as r:
+        assert r.headers["Content-Type"].startswith("text/event-stream")
+        events = _sse(r)
+    name, result = events[-1]
+    assert name == "result"
+    plan_text = "".join(d["token"] for n, d in events if n == "token" and d["stage"] == "plan")
+    assert json.loads(plan_text) == result["plan"]
+
+    assert requests.post(f"{service}/v1/plan", json={"objective": "x"}).status_code == 401
+    r = requests.post(f"{service}/v1/plan", data="{", headers={**auth, "Content-Type": "application/json"})
+    assert r.status_code == 400
+    assert requests.post(f"{service}/v1/plan", json={}, headers=auth).json()["error"] == "Campo 'objective' obrigatório."
+    assert requests.get(f"{service}/v1/nada", headers=auth).status_code == 404
+    assert requests.get(f"{service}/v1/plan", headers=auth).status_code == 405
+
+def test_cross_origin_and_unauthenticated_execute_are_refused(llm, tmp_path):
+    url, stop = _start(llm, tmp_path)  # sem token
+    try:
+        port = url.rsplit(":", 1)[1]
+        patch = requests.post(f"{url}/v1/plan", json={"objective": "x"}).json()["patch"]
+        patch["commands"] = [{"step_index": 1, "cmd": "echo pwned > pwned.txt", "why": "w", "expects_cmd": "true"}]
+        body = json.dumps({"patch": patch, "confirm": "EXECUTAR"})
+        # o "simple request" de uma página qualquer: text/plain, sem preflight de CORS
+        r = requests.post(f"{url}/v1/execute", data=body, headers={"Content-Type": "text/plain"})
+        assert r.status_code == 415
+        r = requests.post(f"{url}/v1/execute", data=body,
+                          headers={"Content-Type": "application/json", "Origin": "https://evil.example"})
+        assert r.status_code == 403 and "Origin" in r.json()["error"]
+        # DNS rebinding: evil.example resolvendo para 127.0.0.1 chega com o Host do atacante
+        assert requests.get(f"{url}/healthz", headers={"Host": f"evil.example:{port}"}).status_code == 403
+        assert requests.get(f"{url}/healthz", headers={"Host": f"localhost:{port}"}).status_code == 200
+        assert requests.get(f"{url}/healthz", headers={"Origin": f"http://localhost:{port}"}).status_code == 200
+        # sem token, /v1/execute fica desligado mesmo com pedido local válido
+        r = requests.post(f"{url}/v1/execute", json={"patch": patch, "confirm": "EXECUTAR"})
+        assert r.status_code == 403 and "token" in r.json()["error"]
+        assert not (tmp_path / "ws" / "pwned.txt").exists()
+    finally:
+        stop()
+
+    url, stop = _start(llm, tmp_path, insecure_no_auth=True)
+    try:
+        # campos do episódio com tipo errado: 400, não 500
+        for bad in ({"metrics": []}, {"plan": "x"}, {"llm_calls": 3}):
+            r = requests.post(f"{url}/v1/execute", json={"patch": patch, "confirm": "EXECUTAR", **bad})
+            assert r.status_code == 400 and next(iter(bad)) in r.json()["error"]
+        assert not (tmp_path / "ws" / "pwned.txt").exists()
+        r = requests.post(f"{url}/v1/execute", json={"patch": patch, "confirm": "EXECUTAR"})
+        assert r.status_code == 200 and r.json()["success"] is True
+    finally:
+        stop()
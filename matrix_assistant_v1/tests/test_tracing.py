@@ -0,0 +1,74 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core.jobs import execute_recorded, run_pipeline_recorded
+from core.memory import EpisodeStore
+from core.schemas import Patch
+from core.tracing import _NOOP, bind, merge_traces, span, stage_summary, to_chrome_trace, tracing
+from tools.stub_llm import serve
+
+def test_spans_nest_across_threads_and_are_noop_when_disabled():
+    def child(i):
+        with span("filho", i=i):
+            pass
+
+    assert span("fora") is _NOOP
+    with tracing() as trace:
+        with span("pai", n=1) as sp:
+            sp.set(ok=True)
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                list(pool.map(bind(child), range(2)))
+        try:
+            with span("erro"):
+                raise KeyError("x")
+        except KeyError:
+            pass
+    assert span("depois") is _NOOP
+    data = trace.to_dict()
+    by_name = {}
+    for s in data["spans"]:
+        by_name.setdefault(s["name"], []).append(s)
+    pai = by_name["pai"][0]
+    assert pai["parent"] is None and pai["attrs"] == {"n": 1, "ok": True}
+    assert [s["parent"] for s in by_name["filho"]] == [pai["id"]] * 2
+    assert all(s["thread"] != threading.current_thread().name for s in by_name["filho"])
+    assert by_name["erro"][0]["attrs"] == {"error": "KeyError"}
+
+    chrome = to_chrome_trace(data)
+    complete = [e for e in chrome["traceEvents"] if e["ph"] == "X"]
+    assert len(complete) == 4 and all(e["dur"] >= 0 for e in complete)
+    assert {e["args"]["name"] for e in chrome["traceEvents"] if e["ph"] == "M"} >= {threading.current_thread().name}
+    summary = stage_summary([data, data])
+    assert summary["filho"]["count"] == 4 and summary["pai"]["p95_s"] == pai["dur"]
+
+def test_merge_traces_keeps_ids_unique_and_timeline():
+    a = {"wall0": 100.0, "spans": [{"id": 1, "parent": None, "name": "pipeline", "start": 0.0, "dur": 1.0, "thread": "t"}]}
+    b = {"wall0": 102.5, "spans": [{"id": 1, "parent": None, "name": "execute", "start": 0.1, "dur": 0.5, "thread": "t"},
+                                   {"id": 2, "parent": 1, "name": "exec.step", "start": 0.2, "dur": 0.1, "thread": "t"}]}
+    merged = merge_traces(a, None, b)
+    assert merged["wall0"] == 100.0
+    assert [(s["id"], s["parent"], s["start"]) for s in merged["spans"]] == [(1, None, 0.0), (2, None, 2.6), (3, 2, 2.7)]
+    assert merge_traces(None, {"wall0": 1.0, "spans": []}) is None
+
+def test_pipeline_and_execution_trace_persist_with_episode(tmp_path):
+    server = serve()
+    try:
+        base_url = "http://%s:%d" % server.server_address
+        db = str(tmp_path / "ep.db")
+        result = run_pipeline_recorded(db, base_url, "x", "stub", "criar arquivo de prova", str(tmp_path))
+    finally:
+        server.shutdown()
+    names = [s["name"] for s in result["trace"]["spans"]]
+    assert names[0] == "pipeline" and {"plan", "patch", "gate", "llm.request", "llm.parse"} <= set(names)
+
+    patch = Patch.model_validate(result["patch"])
+    episode = {"user_input": "criar arquivo de prova", "plan": result["plan"], "patch": result["patch"],
+               "audit": result["audit"], "metrics": result["metrics"], "trace": result["trace"]}
+    done = execute_recorded(db, patch.commands, str(tmp_path), episode)
+    assert done["success"] is True
+
+    saved = EpisodeStore(db).get(done["episode_id"], payloads=("trace",))
+    assert "plan" not in saved and saved["trace"] == done["trace"]
+    summary = stage_summary([saved["trace"]])
+    assert summary["exec.step"]["count"] == 2 and summary["exec.expects"]["count"] == 2
+    assert {"pipeline", "execute", "shell.start"} <= summary.keys()
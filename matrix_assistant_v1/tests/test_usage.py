@@ -0,0 +1,56 @@
+import pytest
+
+from core.cache import ResponseCache
+from core.memory import EpisodeStore
+from core.orchestrator import llm_plan, run_pipeline
+from core.usage import LLMCall, PromptTooLarge, check_prompt_budget, estimate_prompt_tokens, summarize_calls
+from tools.stub_llm import serve
+
+def test_prompt_budget_rejects_before_sending():
+    messages = [{"role": "user", "content": "x" * 400}]
+    assert estimate_prompt_tokens(messages) == 104
+    assert check_prompt_budget(messages, budget=0) == 104  # 0 = sem limite
+    with pytest.raises(PromptTooLarge) as exc:
+        # porta fechada: se a requisição saísse, o erro seria de conexão
+        llm_plan("http://127.0.0.1:9", "k", "m", "objetivo " * 50, prompt_budget=50)
+    assert isinstance(exc.value, ValueError) and exc.value.budget == 50 and exc.value.estimated_tokens > 50
+    # servidor sem usage (ex.: stream sem stream_options): estimativa como reserva
+    call = LLMCall.from_response("plan", "m", None, 104, "x" * 40, stream=True)
+    assert call.estimated and (call.prompt_tokens, call.completion_tokens) == (104, 10)
+
+def test_calls_record_usage_bytes_latency_and_aggregate_in_db(tmp_path):
+    server = serve(pad_bytes=1000)
+    try:
+        base_url = "http://%s:%d" % server.server_address
+        cache = ResponseCache(str(tmp_path / "cache.db"))
+        first = run_pipeline(base_url, "k", "stub", "criar arquivo de prova", str(tmp_path), cache=cache)
+        streamed = run_pipeline(base_url, "k", "stub", "outro objetivo", str(tmp_path), on_token=lambda s, t: None)
+        cached = run_pipeline(base_url, "k", "stub", "criar arquivo de prova", str(tmp_path), cache=cache)
+    finally:
+        server.shutdown()
+
+    plan_call, patch_call = first["llm_calls"]
+    assert (plan_call["stage"], patch_call["stage"]) == ("plan", "patch")
+    assert plan_call["estimated"] is False and plan_call["prompt_tokens"] > 0 and plan_call["completion_tokens"] > 250
+    assert plan_call["bytes_sent"] > 0 and plan_call["bytes_received"] > 1000 and plan_call["latency_s"] > 0
+    # stream com stream_options.include_usage: tokens do servidor, como na chamada sem stream
+    assert all(c["stream"] and not c["estimated"] and c["bytes_received"] > 1000 for c in streamed["llm_calls"])
+    assert streamed["llm_calls"][0]["completion_tokens"] > 250
+    assert [c["cached"] for c in cached["llm_calls"]] == [True, True] and cached["usage"]["prompt_tokens"] == 0
+    assert first["usage"] == summarize_calls(first["llm_calls"]) and first["usage"]["calls"] == 2
+
+    store = EpisodeStore(str(tmp_path / "ep.db"))
+    ids = [store.save({"user_input": r["plan"]["tasks"][0]["objective"], "model_used": "stub",
+                       "llm_calls": r["llm_calls"]}) for r in (first, streamed, cached)]
+    old = store.save({"user_input": "episódio antigo"})
+    assert [c["stage"] for c in store.llm_calls(ids[1])] == ["plan", "patch"] and store.llm_calls(old) == []
+
+    (by_model,) = store.llm_usage(group_by="model")
+    assert by_model["model"] == "stub" and by_model["calls"] == 6 and by_model["cache_hits"] == 2
+    assert by_model["completion_tokens"] == sum(r["usage"]["completion_tokens"] for r in (first, streamed, cached))
+    by_episode = {r["episode_id"]: r for r in store.llm_usage(group_by="episode_id")}
+    assert set(by_episode) == set(ids) and by_episode[ids[2]]["prompt_tokens"] == 0
+    assert {k: by_episode[ids[0]][k] for k in first["usage"]} == first["usage"]
+    with pytest.raises(ValueError):
+        store.llm_usage(group_by="user_input")
+    store.close()
@@ -0,0 +1,237 @@
+# Benchmark ponta a ponta (sem LLM real): pipeline contra o stub LLM, executor e DB de episódios,
+# em níveis crescentes de concorrência. Saída em JSON (vazão e latência p50/p95/p99 por nível).
+#
+#   python -m tools.bench                                   # imprime o relatório
+#   python -m tools.bench --check tools/bench_baseline.json # exit 1 se regrediu além da tolerância
+#   python -m tools.bench --save-baseline tools/bench_baseline.json
+#   python -m tools.bench --latency-ms 150 --pad-bytes 20000 --failure-rate 0.05 --levels 1,8,32
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.executor import execute_commands
+from core.memory import EpisodeStore
+from core.orchestrator import run_pipeline
+from core.schemas import Command
+
+from tools.stub_llm import serve
+
+SCENARIOS = ("pipeline", "executor", "store")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+@dataclass
+class BenchConfig:
+    scenarios: Tuple[str, ...] = SCENARIOS
+    levels: Tuple[int, ...] = (1, 4, 8)
+    ops: int = 24  # operações por nível de concorrência
+    latency_ms: float = 20.0  # stub LLM: atraso antes de cada resposta
+    pad_bytes: int = 2000  # stub LLM: texto extra em cada PLANO/PATCH
+    failure_rate: float = 0.0  # stub LLM: fração de 503 (o cliente faz retry)
+    steps: int = 3  # executor: passos por execução
+    payload_bytes: int = 4000  # store: tamanho aproximado do exec salvo em cada episódio
+
+@dataclass
+class LevelResult:
+    concurrency: int
+    ops: int
+    errors: int
+    wall_s: float
+    throughput_ops_s: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    first_error: Optional[str] = None
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+def run_level(op: Callable[[int], Any], concurrency: int, ops: int) -> LevelResult:
+    """Roda `ops` chamadas op(i) com `concurrency` threads; latência medida por chamada."""
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def one(i: int) -> None:
+        t0 = time.perf_counter()
+        try:
+            op(i)
+        except Exception as e:
+            with lock:
+                errors.append(f"{type(e).__name__}: {e}")
+            return
+        dt = time.perf_counter() - t0
+        with lock:
+            latencies.append(dt)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(ops)))
+    wall = time.perf_counter() - t0
+    latencies.sort()
+    ms = lambda s: round(s * 1000.0, 3)
+    return LevelResult(
+        concurrency=concurrency,
+        ops=ops,
+        errors=len(errors),
+        wall_s=round(wall, 4),
+        throughput_ops_s=round(len(latencies) / wall, 3) if wall > 0 else 0.0,
+        p50_ms=ms(_percentile(latencies, 50)),
+        p95_ms=ms(_percentile(latencies, 95)),
+        p99_ms=ms(_percentile(latencies, 99)),
+        max_ms=ms(latencies[-1]) if latencies else 0.0,
+        first_error=errors[0] if errors else None,
+    )
+
+# ---------------- cenários: cada um devolve op(i) pronto para run_level ----------------
+def _pipeline_op(base_url: str, workdir: str) -> Callable[[int], Any]:
+    def op(i: int) -> Any:
+        return run_pipeline(base_url, "bench", "stub", f"objetivo de benchmark {i}", workdir)
+    return op
+
+def _executor_op(cfg: BenchConfig, workdir: str) -> Callable[[int], Any]:
+    commands = [
+        Command(step_index=k, cmd=f"echo passo{k} > p{k}.txt", why="bench", expects_cmd=f"test -s p{k}.txt")
+        for k in range(1, cfg.steps + 1)
+    ]
+
+    def op(i: int) -> Any:
+        cwd = os.path.join(workdir, f"run{i}")
+        os.makedirs(cwd, exist_ok=True)
+        results = execute_commands(commands, cwd=cwd)
+        if len(results) != len(commands) or any(r.rc != 0 or r.expects_rc != 0 for r in results):
+            raise RuntimeError(f"execução falhou: {[(r.step_index, r.rc, r.expects_rc) for r in results]}")
+        return results
+    return op
+
+def _store_op(cfg: BenchConfig, store: EpisodeStore) -> Callable[[int], Any]:
+    line = "x" * 80
+
+    def op(i: int) -> Any:
+        # payload distinto por episódio (sem dedup de blob), salvo e relido como o app faz
+        exec_data = [{"step_index": 1, "rc": 0, "stdout": f"{i}\n" + "\n".join([line] * max(1, cfg.payload_bytes // 81))}]
+        episode_id = store.save({
+            "user_input": f"objetivo de benchmark {i}", "plan": {"tasks": [{"task_id": "t1"}]},
+            "patch": {"commands": []}, "audit": {"blocked": False}, "exec": exec_data,
+            "model_used": "stub", "approved": True, "success": True, "metrics": {"C": 1.0, "SFC": 90.0},
+        })
+        if store.get(episode_id, payloads=("exec",)) is None:
+            raise RuntimeError(f"episódio {episode_id} não encontrado")
+        return episode_id
+    return op
+
+def run_bench(cfg: BenchConfig, workdir: Optional[str] = None) -> Dict[str, Any]:
+    """Relatório JSON: {"config", "env", "results": {cenário: {concorrência: LevelResult}}}."""
+    unknown = set(cfg.scenarios) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"cenário desconhecido: {', '.join(sorted(unknown))} (use {', '.join(SCENARIOS)})")
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory(prefix="matrix_bench_", dir=workdir) as tmp:
+        server = serve(latency_s=cfg.latency_ms / 1000.0, pad_bytes=cfg.pad_bytes, failure_rate=cfg.failure_rate)
+        store = EpisodeStore(os.path.join(tmp, "bench.db"))
+        try:
+            base_url = "http://%s:%d" % server.server_address[:2]
+            for name in cfg.scenarios:
+                results[name] = {}
+                for level in cfg.levels:
+                    sub = os.path.join(tmp, f"{name}_{level}")
+                    os.makedirs(sub)
+                    if name == "pipeline":
+                        op = _pipeline_op(base_url, sub)
+                    elif name == "executor":
+                        op = _executor_op(cfg, sub)
+                    else:
+                        op = _store_op(cfg, store)
+                    results[name][str(level)] = asdict(run_level(op, level, cfg.ops))
+        finally:
+            server.shutdown()
+            server.server_close()
+            store.close()
+    return {
+        "config": asdict(cfg),
+        "env": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.30,
+            min_delta_ms: float = 5.0) -> List[str]:
+    """
+    Regressões do relatório frente ao baseline (mesmo cenário e concorrência):
+    vazão abaixo de (1 - tolerance) x baseline, p95 acima de (1 + tolerance) x baseline
+    (e pelo menos min_delta_ms a mais, para não acusar ruído de poucos ms) ou mais erros.
+    """
+    out: List[str] = []
+    for name, levels in report.get("results", {}).items():
+        for level, cur in levels.items():
+            base = (baseline.get("results", {}).get(name) or {}).get(level)
+            if base is None:
+                continue
+            tag = f"{name}@{level}"
+            if cur["throughput_ops_s"] < base["throughput_ops_s"] * (1 - tolerance):
+                out.append(f"{tag}: vazão {cur['throughput_ops_s']:.2f} ops/s < baseline {base['throughput_ops_s']:.2f}")
+            if cur["p95_ms"] > base["p95_ms"] * (1 + tolerance) and cur["p95_ms"] - base["p95_ms"] >= min_delta_ms:
+                out.append(f"{tag}: p95 {cur['p95_ms']:.1f} ms > baseline {base['p95_ms']:.1f} ms")
+            if cur["errors"] / max(1, cur["ops"]) > base["errors"] / max(1, base["ops"]) + 0.02:
+                out.append(f"{tag}: {cur['errors']} erros em {cur['ops']} (baseline {base['errors']}): {cur['first_error']}")
+    return out
+
+def _ints(text: str) -> Tuple[int, ...]:
+    return tuple(int(x) for x in text.split(",") if x.strip())
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark ponta a ponta (stub LLM, executor, DB de episódios)")
+    d = BenchConfig()
+    ap.add_argument("--scenarios", default=",".join(d.scenarios), help=f"subconjunto de {','.join(SCENARIOS)}")
+    ap.add_argument("--levels", default=",".join(map(str, d.levels)), help="níveis de concorrência, ex.: 1,4,16")
+    ap.add_argument("--ops", type=int, default=d.ops, help="operações por nível")
+    ap.add_argument("--latency-ms", type=float, default=d.latency_ms)
+    ap.add_argument("--pad-bytes", type=int, default=d.pad_bytes)
+    ap.add_argument("--failure-rate", type=float, default=d.failure_rate)
+    ap.add_argument("--steps", type=int, default=d.steps)
+    ap.add_argument("--payload-bytes", type=int, default=d.payload_bytes)
+    ap.add_argument("-o", "--output", help="grava o relatório JSON (além de imprimir)")
+    ap.add_argument("--check", nargs="?", const=DEFAULT_BASELINE, help="compara com o baseline (exit 1 se regrediu)")
+    ap.add_argument("--tolerance", type=float, default=0.30)
+    ap.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="grava o relatório como novo baseline")
+    args = ap.parse_args(argv)
+
+    cfg = BenchConfig(
+        scenarios=tuple(s.strip() for s in args.scenarios.split(",") if s.strip()),
+        levels=_ints(args.levels), ops=args.ops, latency_ms=args.latency_ms, pad_bytes=args.pad_bytes,
+        failure_rate=args.failure_rate, steps=args.steps, payload_bytes=args.payload_bytes,
+    )
+    report = run_bench(cfg)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+    if args.check:
+        with open(args.check, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != json.loads(text)["config"]:
+            print("Aviso: configuração diferente da do baseline; comparando mesmo assim.", file=sys.stderr)
+        regressions = compare(report, baseline, tolerance=args.tolerance)
+        for r in regressions:
+            print(f"REGRESSÃO {r}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
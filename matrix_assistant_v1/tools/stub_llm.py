@@ -0,0 +1,182 @@
+# Stub LLM (OpenAI-compatible) para testes e benchmarks locais, sem rede nem chave real.
+#
+# POST /chat/completions (ou /v1/chat/completions) devolve um PLANO ou PATCH válido conforme
+# response_format.json_schema.name, com ou sem "stream": true (SSE em pedaços de `chunk` caracteres).
+# Para benchmarks: latência fixa por resposta, tamanho extra do payload e taxa de falhas (503).
+#
+#   python tools/stub_llm.py --port 8901 --token-delay-ms 5
+#   python tools/stub_llm.py --latency-ms 200 --pad-bytes 20000 --failure-rate 0.05
+#   LLM_BASE_URL=http://127.0.0.1:8901 LLM_API_KEY=x LLM_MODEL=stub python -m core.service
+from __future__ import annotations
+
+import argparse
+import ast
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+STUB_MODEL = "stub-llm"
+
+def _padding(pad_bytes: int) -> List[str]:
+    # texto neutro (sem termos de risco/ambíguos) só para aumentar a resposta
+    return ["nota " + "x" * (pad_bytes - 5)] if pad_bytes > 5 else []
+
+def stub_plan(objective: str, pad_bytes: int = 0) -> Dict[str, Any]:
+    return {
+        "tasks": [{
+            "task_id": "t1",
+            "objective": objective[:200] or "objetivo",
+            "actions": ["criar o diretório stub_out", "gravar stub_out/ok.txt"],
+            "success_criteria": "stub_out/ok.txt existe",
+        }],
+        "constraints": ["usar caminhos relativos", *_padding(pad_bytes)],
+        "artifacts": ["stub_out/ok.txt"],
+    }
+
+def stub_patch(task_ids: List[str], pad_bytes: int = 0) -> Dict[str, Any]:
+    return {
+        "manifest": {"files": ["stub_out/ok.txt"]},
+        "tasks_covered": task_ids or ["t1"],
+        "constraints_violated": False,
+        "commands": [
+            {"step_index": 1, "cmd": "mkdir -p stub_out", "why": " ".join(["diretório de saída", *_padding(pad_bytes)]),
+             "expects_cmd": "test -d stub_out", "privilege": "user"},
+            {"step_index": 2, "cmd": "echo ok > stub_out/ok.txt", "why": "arquivo de prova",
+             "expects_cmd": "grep -q ok stub_out/ok.txt", "privilege": "user"},
+        ],
+    }
+
+_OBJECTIVE_RE = re.compile(r"Objetivo(?: do usuário)?:\s*(.*)")
+_TASK_IDS_RE = re.compile(r"task_ids:\s*(\[.*?\])")
+
+def respond(payload: Dict[str, Any], pad_bytes: int = 0) -> str:
+    """Conteúdo da resposta para um payload de chat/completions (`pad_bytes`: texto extra no JSON)."""
+    user = next((m.get("content", "") for m in reversed(payload.get("messages") or []) if m.get("role") == "user"), "")
+    name = ((payload.get("response_format") or {}).get("json_schema") or {}).get("name")
+    if name == "Patch":
+        m = _TASK_IDS_RE.search(user)
+        try:
+            task_ids = [str(t) for t in ast.literal_eval(m.group(1))] if m else []
+        except (ValueError, SyntaxError):
+            task_ids = []
+        return json.dumps(stub_patch(task_ids, pad_bytes), ensure_ascii=False)
+    m = _OBJECTIVE_RE.search(user)
+    return json.dumps(stub_plan(m.group(1).strip() if m else "", pad_bytes), ensure_ascii=False)
+
+def stub_usage(payload: Dict[str, Any], content: str) -> Dict[str, int]:
+    # contagem aproximada (~4 caracteres por token), no formato "usage" da API
+    prompt = sum(len(str(m.get("content") or "")) for m in payload.get("messages") or []) // 4 + 1
+    completion = len(content) // 4 + 1
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    token_delay_s = 0.0
+    chunk = 16
+    latency_s = 0.0  # antes do primeiro byte de cada resposta
+    pad_bytes = 0
+    failure_rate = 0.0  # fração das requisições respondidas com 503 (Retry-After: 0)
+    rng = random.Random(0)
+    rng_lock = threading.Lock()
+
+    def log_message(self, fmt, *args) -> None:  # silencioso (benchmarks)
+        pass
+
+    def _json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        if self.path.rstrip("/") not in ("/chat/completions", "/v1/chat/completions"):
+            self._json(404, {"error": {"message": f"rota desconhecida: {self.path}"}})
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        except ValueError as e:
+            self._json(400, {"error": {"message": f"JSON inválido: {e}"}})
+            return
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        if self.failure_rate:
+            with self.rng_lock:
+                fail = self.rng.random() < self.failure_rate
+            if fail:
+                self._json(503, {"error": {"message": "falha simulada"}}, {"Retry-After": "0"})
+                return
+        content = respond(payload, self.pad_bytes)
+        model = payload.get("model") or STUB_MODEL
+        if not payload.get("stream"):
+            time.sleep(self.token_delay_s * (len(content) // self.chunk + 1))
+            self._json(200, {
+                "id": "stub", "object": "chat.completion", "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": stub_usage(payload, content),
+            })
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for i in range(0, len(content), self.chunk):
+                if self.token_delay_s:
+                    time.sleep(self.token_delay_s)
+                self._event({"model": model, "choices": [{"index": 0, "delta": {"content": content[i:i + self.chunk]}}]})
+            self._event({"model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                self._event({"model": model, "choices": [], "usage": stub_usage(payload, content)})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # cliente cancelou o stream
+
+    def _event(self, chunk: Dict[str, Any]) -> None:
+        self.wfile.write(b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n")
+        self.wfile.flush()
+
+def serve(host: str = "127.0.0.1", port: int = 0, token_delay_s: float = 0.0, chunk: int = 16,
+          latency_s: float = 0.0, pad_bytes: int = 0, failure_rate: float = 0.0, seed: int = 0) -> ThreadingHTTPServer:
+    """Sobe o stub numa thread daemon; port=0 escolhe uma porta livre (server.server_address)."""
+    handler = type("Handler", (StubLLMHandler,), {
+        "token_delay_s": token_delay_s, "chunk": chunk, "latency_s": latency_s, "pad_bytes": pad_bytes,
+        "failure_rate": failure_rate, "rng": random.Random(seed), "rng_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description="LLM falso (OpenAI-compatible) para testes locais")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8901)
+    ap.add_argument("--token-delay-ms", type=float, default=0.0, help="atraso por pedaço do stream")
+    ap.add_argument("--chunk", type=int, default=16, help="caracteres por pedaço do stream")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="atraso antes de cada resposta")
+    ap.add_argument("--pad-bytes", type=int, default=0, help="texto extra em cada PLANO/PATCH")
+    ap.add_argument("--failure-rate", type=float, default=0.0, help="fração de respostas 503 (0..1)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+    server = serve(args.host, args.port, args.token_delay_ms / 1000.0, args.chunk, args.latency_ms / 1000.0,
+                   args.pad_bytes, args.failure_rate, args.seed)
+    print(f"stub LLM em http://{server.server_address[0]}:{server.server_address[1]}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())